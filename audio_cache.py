@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from ffmpeg_supervisor import get_supervisor
+
+logger = logging.getLogger(__name__)
+
+class AudioCache:
+    """Size-bounded on-disk cache of frequently played tracks as Ogg/Opus files.
+
+    Files are named after the YouTube video ID, so the index is rebuilt on
+    startup by scanning the directory; file mtimes carry the recency order
+    across restarts. A track is stored once it has been played min_plays
+    times, and the least recently (or, with policy='lfu', least often) played
+    files are evicted when the total size exceeds max_bytes. Download ffmpeg
+    processes count against the ffmpeg supervisor's process cap.
+    """
+
+    def __init__(self, directory='cache/audio', max_bytes=2 * 1024 ** 3, min_plays=2,
+                 bitrate='128k', max_downloads=2, policy='lru', supervisor=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_bytes // 10  # One long mix must not flush the whole cache
+        self.min_plays = max(1, min_plays)
+        self.bitrate = bitrate
+        self.policy = policy
+        self.download_slots = None
+        self.max_downloads = max_downloads
+        self.supervisor = supervisor  # FFmpegSupervisor; the process-wide one if not given
+
+        self.entries = OrderedDict()  # Video ID -> {'size', 'hits'}, least recently played first
+        self.plays = OrderedDict()  # Video ID -> plays seen while not cached
+        self.max_tracked_plays = 10000
+        self.downloads = {}  # Video ID -> in-flight download task
+        self.total_bytes = 0
+
+        self.lookups = 0
+        self.hits = 0
+        self.bytes_served = 0
+        self.stored = 0
+        self.evictions = 0
+        self.download_failures = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.rebuild_index()
+
+    def path_for(self, video_id):
+        """Get the file path for a video ID"""
+        return os.path.join(self.directory, f"{video_id}.opus")
+
+    def rebuild_index(self):
+        """Rebuild the index from the files on disk, dropping partial downloads"""
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.part'):
+                os.remove(path)
+                continue
+            if not name.endswith('.opus'):
+                continue
+            stat = os.stat(path)
+            files.append((stat.st_mtime, name[:-len('.opus')], stat.st_size))
+
+        self.entries.clear()
+        self.total_bytes = 0
+        for _, video_id, size in sorted(files):
+            self.entries[video_id] = {'size': size, 'hits': 0}
+            self.total_bytes += size
+
+        logger.info(f"Audio cache index rebuilt: {len(self.entries)} tracks, {self.total_bytes / 1024 ** 2:.1f} MiB")
+        self.evict()
+
+    def contains(self, video_id):
+        """Check whether a track is cached, without counting a lookup"""
+        return video_id in self.entries
+
+    def get(self, video_id):
+        """Get the local file for a cached track, or None"""
+        self.lookups += 1
+        entry = self.entries.get(video_id)
+        path = self.path_for(video_id)
+        if entry is None:
+            return None
+        if not os.path.exists(path):
+            self.discard(video_id)
+            return None
+
+        self.entries.move_to_end(video_id)
+        entry['hits'] += 1
+        self.hits += 1
+        self.bytes_served += entry['size']
+        try:
+            os.utime(path)  # Keeps the recency order for the next rebuild
+        except OSError:
+            pass
+        return path
+
+    def record_play(self, video_id, stream_url):
+        """Count a streamed play and start caching the track once it is popular enough"""
+        if not video_id or video_id in self.entries or video_id in self.downloads:
+            return
+
+        self.plays[video_id] = self.plays.get(video_id, 0) + 1
+        self.plays.move_to_end(video_id)
+        if len(self.plays) > self.max_tracked_plays:
+            self.plays.popitem(last=False)
+
+        if self.plays[video_id] >= self.min_plays:
+            task = asyncio.ensure_future(self.download(video_id, stream_url))
+            self.downloads[video_id] = task
+
+    async def download(self, video_id, stream_url):
+        """Transcode a stream to an Ogg/Opus file and add it to the cache"""
+        if self.download_slots is None:
+            self.download_slots = asyncio.Semaphore(self.max_downloads)
+
+        path = self.path_for(video_id)
+        temp_path = f"{path}.part"
+        process = None
+        supervisor = self.supervisor or get_supervisor()
+        try:
+            async with self.download_slots:
+                await supervisor.acquire()
+                try:
+                    process = await asyncio.create_subprocess_exec(
+                        'ffmpeg', '-nostdin', '-loglevel', 'error',
+                        '-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5',
+                        '-i', stream_url, '-vn', '-map', '0:a:0',
+                        '-c:a', 'libopus', '-b:a', self.bitrate, '-f', 'ogg', '-y', temp_path,
+                        stdin=asyncio.subprocess.DEVNULL,
+                        stdout=asyncio.subprocess.DEVNULL,
+                        stderr=asyncio.subprocess.PIPE
+                    )
+                    _, stderr = await process.communicate()
+                finally:
+                    if process and process.returncode is None:
+                        process.kill()
+                        await process.wait()
+                    supervisor.release()
+
+            if process.returncode != 0:
+                raise Exception(stderr.decode(errors='replace').strip() or f"ffmpeg exited with {process.returncode}")
+
+            size = os.path.getsize(temp_path)
+            if size > self.max_file_bytes:
+                logger.info(f"Not caching {video_id}: {size / 1024 ** 2:.1f} MiB is over the per-track limit")
+                os.remove(temp_path)
+                return
+
+            os.replace(temp_path, path)
+            self.add(video_id, size)
+            logger.info(f"Cached audio for {video_id} ({size / 1024:.0f} KiB)")
+        except Exception as e:
+            self.download_failures += 1
+            logger.warning(f"Failed to cache audio for {video_id}: {e}")
+        finally:
+            self.downloads.pop(video_id, None)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def add(self, video_id, size):
+        """Register a stored file and evict until the cache fits its budget"""
+        if video_id in self.entries:
+            self.total_bytes -= self.entries[video_id]['size']
+        self.entries[video_id] = {'size': size, 'hits': 0}
+        self.entries.move_to_end(video_id)
+        self.total_bytes += size
+        self.plays.pop(video_id, None)
+        self.stored += 1
+        self.evict(keep=video_id)
+
+    def evict(self, keep=None):
+        """Remove files until the total size is within max_bytes"""
+        while self.total_bytes > self.max_bytes and len(self.entries) > (1 if keep else 0):
+            candidates = (video_id for video_id in self.entries if video_id != keep)
+            if self.policy == 'lfu':
+                victim = min(candidates, key=lambda video_id: self.entries[video_id]['hits'])
+            else:
+                victim = next(candidates)
+            self.discard(victim)
+            self.evictions += 1
+
+    def discard(self, video_id):
+        """Drop a track from the cache, e.g. because its file is unplayable"""
+        entry = self.entries.pop(video_id, None)
+        if entry:
+            self.total_bytes -= entry['size']
+        try:
+            os.remove(self.path_for(video_id))
+        except FileNotFoundError:
+            pass
+
+    def cancel(self):
+        """Cancel in-flight downloads"""
+        for task in list(self.downloads.values()):
+            task.cancel()
+
+    def stats(self):
+        """Get hit ratio, bytes served and size of the cache"""
+        return {
+            'entries': len(self.entries),
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'lookups': self.lookups,
+            'hit_rate': self.hits / self.lookups if self.lookups else 0.0,
+            'bytes_served': self.bytes_served,
+            'stored': self.stored,
+            'evictions': self.evictions,
+            'downloading': len(self.downloads),
+            'download_failures': self.download_failures
+        }
@@ -0,0 +1,128 @@
+import threading
+import numpy as np
+import discord
+
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE  # 3840 bytes: 20 ms of 48 kHz stereo s16le
+CHANNELS = 2
+INT16_MIN = np.float32(-32768)
+INT16_MAX = np.float32(32767)
+
+class AudioProcessor:
+    """Per-guild gain and bass boost applied to 20 ms PCM frames with NumPy.
+
+    Frames are viewed in place with np.frombuffer and processed in buffers
+    allocated once, so the only copy per frame is the bytes handed back to
+    discord.py. Settings can be changed from the event loop while the player
+    thread is reading; a gain change is ramped over one frame to avoid clicks.
+    """
+
+    def __init__(self, volume=1.0, bass_boost=0.0, bass_window=96):
+        self.lock = threading.Lock()
+        self.volume = volume
+        self.applied_volume = volume
+        self.bass_boost = bass_boost  # Extra gain for low frequencies, 0 disables the filter
+        self.bass_window = bass_window  # Moving-average length; 96 samples puts the first null at 500 Hz
+
+        samples = FRAME_SIZE // 2
+        self.work = np.empty(samples, dtype=np.float32)
+        self.out = np.empty(samples, dtype=np.int16)
+        self.ramp = np.linspace(0.0, 1.0, samples // CHANNELS, dtype=np.float32).repeat(CHANNELS)
+        # The filter's input is the previous bass_window samples followed by the frame
+        self.padded = np.zeros((bass_window + samples // CHANNELS, CHANNELS), dtype=np.float32)
+        self.sums = np.empty_like(self.padded)
+        self.low = np.empty((samples // CHANNELS, CHANNELS), dtype=np.float32)
+        self.history = self.padded[:bass_window]
+
+    def set_volume(self, volume):
+        """Set the gain; takes effect on the next frame"""
+        with self.lock:
+            self.volume = max(0.0, volume)
+
+    def set_bass_boost(self, boost):
+        """Set the low-frequency gain added on top of the signal (0 turns it off)"""
+        with self.lock:
+            self.bass_boost = max(0.0, boost)
+            if not self.bass_boost:
+                self.history.fill(0.0)
+
+    def is_neutral(self):
+        """Check whether processing would leave frames unchanged"""
+        return self.volume == 1.0 and self.applied_volume == 1.0 and not self.bass_boost
+
+    def reset(self):
+        """Forget filter state, e.g. between tracks"""
+        with self.lock:
+            self.history.fill(0.0)
+            self.applied_volume = self.volume
+
+    def lowpass(self, frame):
+        """Moving average over the last bass_window samples per channel, carrying state across frames"""
+        window = self.bass_window
+        count = len(frame)
+        padded = self.padded[:window + count]
+        sums = self.sums[:window + count]
+        low = self.low[:count]
+        padded[window:] = frame
+        np.cumsum(padded, axis=0, out=sums)
+        np.subtract(sums[window:], sums[:count], out=low)
+        low /= window
+        self.history[:] = padded[count:]  # numpy copies through a temporary if the ranges overlap
+        return low
+
+    def process(self, data):
+        """Apply gain and effects to one frame of s16le stereo PCM"""
+        if not data:
+            return data
+
+        with self.lock:
+            if self.is_neutral():
+                return data
+
+            samples = np.frombuffer(data, dtype=np.int16)
+            count = samples.size
+            work = self.work[:count]
+            out = self.out[:count]
+
+            # A changed gain is ramped over the frame so live changes do not click
+            start, end = self.applied_volume, self.volume
+            gain = np.float32(end) if start == end else start + (end - start) * self.ramp[:count]
+            self.applied_volume = end
+
+            if self.bass_boost:
+                np.copyto(work, samples)
+                frames = work.reshape(-1, CHANNELS)
+                low = self.lowpass(frames)
+                low *= self.bass_boost
+                frames += low
+                np.multiply(work, gain, out=work)
+            else:
+                np.multiply(samples, gain, out=work)
+
+            # Attenuation alone cannot overflow, so clamping is only needed when boosting
+            if self.bass_boost or max(start, end) > 1.0:
+                np.minimum(work, INT16_MAX, out=work)
+                np.maximum(work, INT16_MIN, out=work)
+            np.copyto(out, work, casting='unsafe')
+            return out.tobytes()
+
+
+class ProcessedAudio(discord.AudioSource):
+    """Wraps a PCM source and runs every frame through a guild's AudioProcessor"""
+
+    def __init__(self, original, processor):
+        if original.is_opus():
+            raise ValueError("ProcessedAudio needs a PCM source")
+        self.original = original
+        self.processor = processor
+        processor.reset()
+
+    @property
+    def _current_error(self):
+        # AudioPlayer looks for an ffmpeg failure on the source it plays
+        return getattr(self.original, '_current_error', None)
+
+    def read(self):
+        return self.processor.process(self.original.read())
+
+    def cleanup(self):
+        self.original.cleanup()
@@ -1,7 +1,9 @@
 import discord
-import yt_dlp
 import asyncio
 import logging
+from extraction_scheduler import PRIORITY_STREAM
+from ytdl_pool import extract_source
+from ffmpeg_supervisor import SupervisedPCMAudio, get_supervisor
 
 logger = logging.getLogger(__name__)
 
@@ -13,34 +15,18 @@ class YTDLSource(discord.PCMVolumeTransformer):
         self.url = data.get('url')
 
     @classmethod
-    async def from_url(cls, url, *, loop=None, stream=False):
+    async def from_url(cls, url, *, loop=None, stream=False, scheduler=None, guild_id=None):
         loop = loop or asyncio.get_event_loop()
         
-        ytdl_format_options = {
-            'format': 'bestaudio/best',
-            'outtmpl': '%(extractor)s-%(id)s-%(title)s.%(ext)s',
-            'restrictfilenames': True,
-            'noplaylist': True,
-            'nocheckcertificate': True,
-            'ignoreerrors': False,
-            'logtostderr': False,
-            'quiet': True,
-            'no_warnings': True,
-            'default_search': 'auto',
-            'source_address': '0.0.0.0'
-        }
-
         ffmpeg_options = {
             'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
             'options': '-vn'
         }
 
-        ytdl = yt_dlp.YoutubeDL(ytdl_format_options)
-
-        data = await loop.run_in_executor(None, lambda: ytdl.extract_info(url, download=not stream))
-        
-        if 'entries' in data:
-            data = data['entries'][0]
-
-        filename = data['url'] if stream else ytdl.prepare_filename(data)
-        return cls(discord.FFmpegPCMAudio(filename, **ffmpeg_options), data=data)
\ No newline at end of file
+        if scheduler:
+            data, filename = await scheduler.run(
+                extract_source, 'stream', url, not stream, priority=PRIORITY_STREAM, guild_id=guild_id
+            )
+        else:
+            data, filename = await loop.run_in_executor(None, extract_source, 'stream', url, not stream)
+        return await get_supervisor().open(lambda: cls(SupervisedPCMAudio(filename, **ffmpeg_options), data=data))
\ No newline at end of file
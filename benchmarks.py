@@ -0,0 +1,1254 @@
+"""Performance benchmarks for the music bot.
+
+Run all benchmarks with `python benchmarks.py`, or pick some by name:
+`python benchmarks.py spotify_paging`. Network-free stubs stand in for
+yt-dlp and Spotify so results are repeatable.
+"""
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from aiohttp import web
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from extraction_scheduler import ExtractionScheduler, PRIORITY_BULK, PRIORITY_SEARCH
+from indexed_queue import IndexedQueue
+from ingest import PlaylistIngestor
+from playlist_resolver import PlaylistResolver, iter_spotify_placeholders, spotify_placeholder
+from queue_journal import QueueJournal
+from queue_manager import QueueManager
+from spotify_client import SpotifyClient
+from spotify_handler import SpotifyHandler
+from track import Track
+
+BENCHMARKS = {}
+
+def benchmark(func):
+    """Register a benchmark under its name without the bench_ prefix"""
+    BENCHMARKS[func.__name__[len('bench_'):]] = func
+    return func
+
+class FakeSpotifyServer:
+    """Local stand-in for the Spotify accounts and Web API endpoints"""
+
+    def __init__(self, playlist_size=1000, page_size=100, latency=0.02):
+        self.playlist_size = playlist_size
+        self.page_size = page_size
+        self.latency = latency
+        self.requests = 0
+        self.token_requests = 0
+        self.runner = None
+        self.base_url = None
+
+    def track(self, index):
+        return {
+            'type': 'track',
+            'id': f"track{index}",
+            'name': f"Song {index}",
+            'artists': [{'name': f"Artist {index % 17}"}],
+            'album': {'name': f"Album {index % 5}"},
+            'duration_ms': 180000 + index,
+            'external_urls': {'spotify': f"https://open.spotify.com/track/track{index}"}
+        }
+
+    def page(self, playlist_id, offset, limit):
+        items = [{'track': self.track(i)} for i in range(offset, min(offset + limit, self.playlist_size))]
+        has_next = offset + limit < self.playlist_size
+        return {
+            'items': items,
+            'offset': offset,
+            'limit': limit,
+            'total': self.playlist_size,
+            'next': f"{self.base_url}/v1/playlists/{playlist_id}/tracks?offset={offset + limit}" if has_next else None
+        }
+
+    async def handle_token(self, request):
+        self.token_requests += 1
+        return web.json_response({'access_token': 'fake-token', 'expires_in': 3600})
+
+    async def handle_playlist(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        playlist_id = request.match_info['playlist_id']
+        return web.json_response({
+            'name': f"Playlist {playlist_id}",
+            'description': '',
+            'snapshot_id': 'snapshot-1',
+            'tracks': self.page(playlist_id, 0, self.page_size)
+        })
+
+    async def handle_playlist_tracks(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        offset = int(request.query.get('offset', 0))
+        limit = int(request.query.get('limit', self.page_size))
+        return web.json_response(self.page(request.match_info['playlist_id'], offset, limit))
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/api/token', self.handle_token)
+        app.router.add_get('/v1/playlists/{playlist_id}', self.handle_playlist)
+        app.router.add_get('/v1/playlists/{playlist_id}/tracks', self.handle_playlist_tracks)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+
+    def client(self, **options):
+        return SpotifyClient(
+            'id', 'secret', api_base=f"{self.base_url}/v1",
+            token_url=f"{self.base_url}/api/token", **options
+        )
+
+    def handler(self, **options):
+        return SpotifyHandler(
+            'id', 'secret', api_base=f"{self.base_url}/v1",
+            token_url=f"{self.base_url}/api/token", **options
+        )
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+@benchmark
+def bench_spotify_paging(playlist_size=1000, latency=0.02):
+    """Compare serial and parallel page fetching against a local fake Spotify API"""
+
+    async def fetch(page_concurrency):
+        server = FakeSpotifyServer(playlist_size=playlist_size, latency=latency)
+        await server.start()
+        client = server.client(page_concurrency=page_concurrency)
+        try:
+            start = time.perf_counter()
+            playlist = await client.get('/playlists/demo')
+            items = await client.get_all_items('/playlists/demo/tracks', playlist['tracks'])
+            return time.perf_counter() - start, len(items), server.token_requests
+        finally:
+            await client.close()
+            await server.stop()
+
+    print(f"spotify_paging: {playlist_size} tracks, {latency * 1000:.0f} ms per page")
+    for concurrency in (1, 8):
+        elapsed, count, tokens = asyncio.run(fetch(concurrency))
+        label = 'serial:' if concurrency == 1 else f"parallel x{concurrency}:"
+        print(f"  {label:<16}{elapsed:6.3f}s ({count} tracks, {tokens} token request)")
+
+class StubExtractorPlayer:
+    """Stands in for MusicPlayer, matching placeholders with a fixed blocking extraction cost"""
+
+    def __init__(self, latency=0.05, fail_every=10, workers=16):
+        self.latency = latency
+        self.fail_every = fail_every  # Every nth track has no YouTube match
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.calls = 0
+
+    def extract(self, query):
+        time.sleep(self.latency)
+        self.calls += 1
+        if self.calls % self.fail_every == 0:
+            return None
+        return {'title': query, 'webpage_url': f"https://example.invalid/{self.calls}"}
+
+    async def resolve_placeholder(self, song, priority=PRIORITY_SEARCH):
+        if not song.get('lazy'):
+            return True
+        loop = asyncio.get_running_loop()
+        song_info = await loop.run_in_executor(self.executor, self.extract, song['query'])
+        if not song_info:
+            song['failed'] = True
+            return False
+        song.update(song_info)
+        song['lazy'] = False
+        return True
+
+def fake_spotify_tracks(count):
+    """Build Spotify track dicts like SpotifyHandler returns"""
+    return [
+        {
+            'name': f"Song {i}",
+            'artist': f"Artist {i % 17}",
+            'album': f"Album {i % 5}",
+            'duration': 180 + i % 60,
+            'external_url': f"https://open.spotify.com/track/{i}"
+        }
+        for i in range(count)
+    ]
+
+@benchmark
+def bench_spotify_ingest(track_count=100, latency=0.05):
+    """Compare matching a playlist one track at a time with bounded-parallel PlaylistResolver"""
+    tracks = fake_spotify_tracks(track_count)
+
+    async def sequential():
+        player = StubExtractorPlayer(latency)
+        songs = [spotify_placeholder(track) for track in tracks]
+        for song in songs:
+            await player.resolve_placeholder(song)
+        failed = sum(1 for song in songs if song.get('failed'))
+        return songs, len(songs) - failed, failed, 0
+
+    async def parallel(concurrency, deadline):
+        player = StubExtractorPlayer(latency)
+        songs = [spotify_placeholder(track) for track in tracks]
+        resolver = PlaylistResolver(player, concurrency=concurrency, deadline=deadline)
+        resolver.add(songs)
+        report = await resolver.finish()
+        return songs, len(report['resolved']), len(report['failed']), len(report['timed_out'])
+
+    print(f"spotify_ingest: {track_count} tracks, {latency * 1000:.0f} ms per extraction")
+    expected = [spotify_placeholder(track)['query'] for track in tracks]
+    for label, run in (
+        ('sequential:', sequential),
+        ('parallel x4:', lambda: parallel(4, 120)),
+        ('parallel x8:', lambda: parallel(8, 120)),
+        ('parallel x16:', lambda: parallel(16, 120)),
+        ('x8, 0.25s limit:', lambda: parallel(8, 0.25)),
+    ):
+        start = time.perf_counter()
+        songs, resolved, failed, timed_out = asyncio.run(run())
+        elapsed = time.perf_counter() - start
+        in_order = [song['query'] for song in songs] == expected
+        print(f"  {label:<18}{elapsed:6.2f}s ({resolved} matched, {failed} failed, "
+              f"{timed_out} timed out, order kept: {in_order})")
+        assert in_order
+
+@benchmark
+def bench_playlist_first_track(playlist_size=2000, latency=0.05):
+    """Compare time to the first queued track when collecting a playlist vs streaming it"""
+    url = 'https://open.spotify.com/playlist/demo'
+
+    async def collect():
+        server = FakeSpotifyServer(playlist_size=playlist_size, latency=latency)
+        await server.start()
+        handler = server.handler()
+        queue_manager = QueueManager()
+        try:
+            start = time.perf_counter()
+            playlist = await handler.get_track_info(url)
+            for track in playlist['tracks']:
+                queue_manager.add_song(spotify_placeholder(track))
+            elapsed = time.perf_counter() - start
+            return elapsed, elapsed, len(queue_manager.queue)
+        finally:
+            await handler.close()
+            await server.stop()
+
+    async def stream():
+        server = FakeSpotifyServer(playlist_size=playlist_size, latency=latency)
+        await server.start()
+        handler = server.handler()
+        queue_manager = QueueManager()
+        first = asyncio.Event()
+
+        async def on_first():
+            first.set()
+
+        try:
+            start = time.perf_counter()
+            task = PlaylistIngestor(queue_manager).start(iter_spotify_placeholders(handler, url), on_first)
+            await first.wait()
+            first_track = time.perf_counter() - start
+            await task
+            return first_track, time.perf_counter() - start, len(queue_manager.queue)
+        finally:
+            await handler.close()
+            await server.stop()
+
+    print(f"playlist_first_track: {playlist_size} tracks, {latency * 1000:.0f} ms per page")
+    for label, run in (('collect all:', collect), ('streamed:', stream)):
+        first_track, total, count = asyncio.run(run())
+        print(f"  {label:<16}{first_track:6.3f}s to first track, {total:6.3f}s total ({count} queued)")
+
+@benchmark
+def bench_extraction_priority(bulk_jobs=50, workers=4, latency=0.05):
+    """Measure an interactive search's wait while another guild ingests a playlist"""
+
+    async def shared_pool():
+        loop = asyncio.get_event_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=workers))
+        bulk = [loop.run_in_executor(None, time.sleep, latency) for _ in range(bulk_jobs)]
+        start = time.perf_counter()
+        await loop.run_in_executor(None, time.sleep, latency)
+        elapsed = time.perf_counter() - start
+        await asyncio.gather(*bulk)
+        return elapsed
+
+    async def scheduled():
+        scheduler = ExtractionScheduler(workers=workers)
+        bulk = [
+            asyncio.ensure_future(scheduler.run(time.sleep, latency, priority=PRIORITY_BULK, guild_id=1))
+            for _ in range(bulk_jobs)
+        ]
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+        await scheduler.run(time.sleep, latency, priority=PRIORITY_SEARCH, guild_id=2)
+        elapsed = time.perf_counter() - start
+        await asyncio.gather(*bulk)
+        scheduler.shutdown()
+        return elapsed
+
+    print(f"extraction_priority: {bulk_jobs} bulk jobs ahead, {workers} workers")
+    print(f"  {'default executor:':<20}{asyncio.run(shared_pool()) * 1000:7.1f} ms for one search")
+    print(f"  {'scheduler:':<20}{asyncio.run(scheduled()) * 1000:7.1f} ms for one search")
+
+@benchmark
+def bench_ytdl_setup(calls=20):
+    """Compare per-call YoutubeDL construction with pooled checkouts, plus per-guild memory"""
+    import yt_dlp
+    from music_player import MusicPlayer
+    from ytdl_pool import PROFILES, YTDLPool
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        yt_dlp.YoutubeDL(dict(PROFILES['stream']))
+    fresh = (time.perf_counter() - start) / calls
+
+    pool = YTDLPool(size=1)
+    pool.warm(['stream'])
+    start = time.perf_counter()
+    for _ in range(calls):
+        with pool.checkout('stream'):
+            pass
+    pooled = (time.perf_counter() - start) / calls
+
+    # Before: every MusicPlayer owned its own YoutubeDL instance
+    tracemalloc.start()
+    snapshot = tracemalloc.take_snapshot()
+    owned = [yt_dlp.YoutubeDL(dict(PROFILES['search'])) for _ in range(calls)]
+    before = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(snapshot, 'filename')) / calls
+
+    snapshot = tracemalloc.take_snapshot()
+    players = [MusicPlayer(None, guild_id=i) for i in range(calls)]
+    after = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(snapshot, 'filename')) / calls
+    tracemalloc.stop()
+
+    print(f"ytdl_setup: {calls} calls")
+    print(f"  {'setup per call:':<20}{fresh * 1000:8.2f} ms fresh, {pooled * 1000:8.3f} ms pooled")
+    print(f"  {'memory per guild:':<20}{before / 1024:8.1f} KiB before, {after / 1024:8.1f} KiB after")
+    del owned, players
+
+@benchmark
+def bench_playback_cpu(streams=4, seconds=30):
+    """Measure CPU per concurrent stream for PCM and Opus passthrough playback.
+
+    Each stream is read as fast as the source allows, doing the same work as
+    discord.py's player thread (PCM frames are also Opus-encoded), so the
+    result is CPU seconds spent per second of audio, i.e. cores per stream.
+    Needs ffmpeg and libopus.
+    """
+    import resource
+    import shutil
+    import tempfile
+    import threading
+    import discord
+    from music_player import MusicPlayer
+
+    if not shutil.which('ffmpeg'):
+        print("playback_cpu: skipped, ffmpeg is not installed")
+        return
+    if not discord.opus.is_loaded():
+        try:
+            discord.opus._load_default()
+        except Exception:
+            pass
+    if not discord.opus.is_loaded():
+        print("playback_cpu: skipped, libopus could not be loaded")
+        return
+
+    # Opus in WebM, like most YouTube audio
+    sample = os.path.join(tempfile.mkdtemp(), 'sample.webm')
+    subprocess.run(
+        ['ffmpeg', '-loglevel', 'error', '-f', 'lavfi', '-i', f"sine=frequency=440:duration={seconds}",
+         '-ac', '2', '-c:a', 'libopus', '-b:a', '128k', sample],
+        check=True
+    )
+
+    def play(source):
+        encoder = None if source.is_opus() else discord.opus.Encoder()
+        while True:
+            data = source.read()
+            if not data:
+                break
+            if encoder:
+                encoder.encode(data, encoder.SAMPLES_PER_FRAME)
+        source.cleanup()
+
+    def measure(mode):
+        player = MusicPlayer(None, playback_mode=mode)
+        cpu_start = time.process_time()
+        child_start = resource.getrusage(resource.RUSAGE_CHILDREN)
+        threads = [
+            threading.Thread(target=play, args=(player.build_source(sample, codec='opus'),))
+            for _ in range(streams)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        child_end = resource.getrusage(resource.RUSAGE_CHILDREN)
+        python_cpu = time.process_time() - cpu_start
+        ffmpeg_cpu = (child_end.ru_utime + child_end.ru_stime) - (child_start.ru_utime + child_start.ru_stime)
+        return python_cpu / (streams * seconds), ffmpeg_cpu / (streams * seconds)
+
+    print(f"playback_cpu: {streams} concurrent streams of {seconds}s Opus/WebM audio")
+    for mode in ('pcm', 'passthrough'):
+        python_cpu, ffmpeg_cpu = measure(mode)
+        print(f"  {mode + ':':<14}{python_cpu * 100:6.2f}% bot + {ffmpeg_cpu * 100:6.2f}% ffmpeg "
+              f"= {(python_cpu + ffmpeg_cpu) * 100:6.2f}% of a core per stream")
+    os.remove(sample)
+
+@benchmark
+def bench_dsp_frame(frames=20000):
+    """Report ns per 20 ms frame for PCMVolumeTransformer and the NumPy DSP stage"""
+    import discord
+    import numpy as np
+    from audio_dsp import AudioProcessor, ProcessedAudio, FRAME_SIZE
+
+    samples = (np.sin(np.arange(FRAME_SIZE // 2) * 0.05) * 12000).astype(np.int16).tobytes()
+
+    class FrameSource(discord.AudioSource):
+        def read(self):
+            return samples
+
+    def per_frame(source):
+        source.read()
+        start = time.perf_counter_ns()
+        for _ in range(frames):
+            source.read()
+        return (time.perf_counter_ns() - start) / frames
+
+    results = [
+        ('transformer', per_frame(discord.PCMVolumeTransformer(FrameSource(), volume=0.5))),
+        ('dsp gain', per_frame(ProcessedAudio(FrameSource(), AudioProcessor(volume=0.5)))),
+        ('dsp gain+bass', per_frame(ProcessedAudio(FrameSource(), AudioProcessor(volume=0.5, bass_boost=1.0)))),
+        ('dsp neutral', per_frame(ProcessedAudio(FrameSource(), AudioProcessor(volume=1.0))))
+    ]
+
+    print(f"dsp_frame: {frames} frames of {FRAME_SIZE} bytes")
+    for label, ns in results:
+        print(f"  {label + ':':<16}{ns:9.0f} ns/frame")
+
+@benchmark
+def bench_queue_ops(sizes=(10000, 100000), repeats=200):
+    """Compare queue edits on a deque (the previous backing store) with IndexedQueue"""
+    def songs(count):
+        return [{'title': f"Song {i}", 'requested_by': i % 8} for i in range(count)]
+
+    def timed(func, runs=1):
+        start = time.perf_counter()
+        for _ in range(runs):
+            func()
+        return (time.perf_counter() - start) / runs * 1e6
+
+    print("queue_ops: microseconds per operation")
+    for size in sizes:
+        items = songs(size)
+        rng = random.Random(0)
+        positions = [rng.randrange(size // 2) for _ in range(repeats)]
+        old = deque(items)
+        new = IndexedQueue(items)
+
+        def old_move():
+            # Previous move_song copied the deque to a list and back
+            queue_list = list(old)
+            queue_list.insert(positions[0], queue_list.pop(positions[-1]))
+            return deque(queue_list)
+
+        def old_remove_at():
+            position = positions[len(old) % repeats]
+            song = old[position]
+            del old[position]
+            old.append(song)
+
+        def new_remove_at():
+            new.append(new.pop(positions[len(new) % repeats]))
+
+        def old_remove_range():
+            queue_list = list(old)
+            del queue_list[size // 2:size // 2 + 100]
+            return deque(queue_list)
+
+        def old_remove_user():
+            kept, removed = deque(), []
+            for song in old:
+                (removed if song['requested_by'] == 3 else kept).append(song)
+            return kept, removed
+
+        copies = iter([IndexedQueue(items) for _ in range(3)])
+
+        rows = [
+            ('add one by one', timed(lambda: [queue.append(song) for queue in [deque()] for song in items]) / size,
+             timed(lambda: [queue.append(song) for queue in [IndexedQueue()] for song in items]) / size),
+            ('add in bulk', timed(lambda: deque(items)) / size, timed(lambda: IndexedQueue(items)) / size),
+            ('remove at index', timed(old_remove_at, repeats), timed(new_remove_at, repeats)),
+            ('move', timed(old_move, 20), timed(lambda: new.move(positions[-1], positions[0]), repeats)),
+            ('shuffle', timed(lambda: random.Random(0).shuffle(list(old)), 3),
+             timed(lambda: new.shuffle(random.Random(0)), 3)),
+            ('remove 100', timed(old_remove_range, 20),
+             timed(lambda: new.extend(new.remove_range(size // 2, size // 2 + 100)), repeats)),
+            ('remove by user', timed(old_remove_user, 3),
+             timed(lambda: next(copies).remove_if(lambda song: song['requested_by'] == 3), 3))
+        ]
+
+        print(f"  {size} songs")
+        print(f"    {'operation':<18}{'deque':>12}{'indexed':>12}")
+        for label, old_us, new_us in rows:
+            print(f"    {label:<18}{old_us:12.2f}{new_us:12.2f}")
+
+        # The deque has to be copied to a list to shuffle; IndexedQueue swaps within its blocks
+        peaks = []
+        for shuffle in (lambda: random.Random(0).shuffle(list(old)), lambda: new.shuffle(random.Random(0))):
+            tracemalloc.start()
+            shuffle()
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        print(f"    {'shuffle peak KiB':<18}{peaks[0] / 1024:12.1f}{peaks[1] / 1024:12.1f}")
+
+@benchmark
+def bench_track_memory(count=10000):
+    """Compare memory held by 10k queue entries as dicts and as Track objects"""
+    from utils import format_duration
+
+    # Raw metadata as yt-dlp and the Spotify client hand it over
+    flat_entries = [{'id': f"{i:011d}", 'title': f"Video {i}", 'duration': 120 + i % 600} for i in range(count)]
+    spotify_tracks = [
+        (f"Song {i}", f"Artist {i % 50}", f"Album {i % 20}", 180 + i % 60, f"https://open.spotify.com/track/{i:022d}")
+        for i in range(count)
+    ]
+
+    def playlist_dicts():
+        return [{
+            'title': entry['title'],
+            'url': f"https://www.youtube.com/watch?v={entry['id']}",
+            'webpage_url': f"https://www.youtube.com/watch?v={entry['id']}",
+            'duration': format_duration(entry['duration']),
+            'source': 'youtube',
+            'temp_file': False
+        } for entry in flat_entries]
+
+    def playlist_tracks():
+        return [
+            Track(entry['title'], webpage_url=f"https://www.youtube.com/watch?v={entry['id']}", duration=entry['duration'])
+            for entry in flat_entries
+        ]
+
+    def spotify_info(name, artist, album, duration, url):
+        # Joined artist names are new strings for every track
+        return {'name': name, 'artist': ''.join(artist), 'album': ''.join(album), 'duration': duration, 'external_url': url}
+
+    def spotify_dicts():
+        return [{
+            'title': query,
+            'query': query,
+            'duration': format_duration(duration),
+            'source': 'youtube',
+            'temp_file': False,
+            'lazy': True,
+            'spotify_info': spotify_info(name, artist, album, duration, url)
+        } for name, artist, album, duration, url in spotify_tracks for query in [f"{artist} - {name}"]]
+
+    def spotify_tracks_compact():
+        return [
+            Track(query, query=query, duration=duration, lazy=True,
+                  spotify_info=spotify_info(name, artist, album, duration, url))
+            for name, artist, album, duration, url in spotify_tracks for query in [f"{artist} - {name}"]
+        ]
+
+    def retained(build):
+        tracemalloc.start()
+        entries = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del entries
+        return size
+
+    print(f"track_memory: bytes held by {count} queue entries")
+    print(f"  {'kind':<18}{'dict':>12}{'Track':>12}{'saved':>8}")
+    for label, old, new in (('playlist entry', playlist_dicts, playlist_tracks),
+                            ('spotify entry', spotify_dicts, spotify_tracks_compact)):
+        old_bytes, new_bytes = retained(old), retained(new)
+        print(f"  {label:<18}{old_bytes:12,}{new_bytes:12,}{1 - new_bytes / old_bytes:8.0%}")
+
+@benchmark
+def bench_queue_journal(mutations=20000, guilds=50):
+    """Report queue mutation throughput without a journal, with the group-committed journal and with an fsync per mutation"""
+    rng = random.Random(0)
+    plan = [(rng.randrange(guilds), rng.randrange(4)) for _ in range(mutations)]
+
+    class SyncJournal:
+        """Writes and fsyncs every record before returning, as a naive journal would"""
+
+        def __init__(self, path):
+            self.log = open(path, 'a', encoding='utf-8')
+
+        def append(self, op, *args):
+            self.log.write(repr([op, *args]) + '\n')
+            self.log.flush()
+            os.fsync(self.log.fileno())
+
+    def run(journal_for):
+        managers = [QueueManager(journal=journal_for(guild_id)) for guild_id in range(guilds)]
+        start = time.perf_counter()
+        for i, (guild_id, op) in enumerate(plan):
+            queue_manager = managers[guild_id]
+            if op == 0 or queue_manager.is_empty():
+                queue_manager.add_song(Track(f"Song {i}", webpage_url=f"https://www.youtube.com/watch?v={i:011d}", duration=200))
+            elif op == 1:
+                queue_manager.move_song(0, queue_manager.get_queue_length() - 1)
+            elif op == 2:
+                queue_manager.get_next_song()
+            else:
+                queue_manager.remove_song(0)
+        return time.perf_counter() - start, managers
+
+    print(f"queue_journal: {mutations} mutations across {guilds} guilds")
+    with tempfile.TemporaryDirectory() as directory:
+        elapsed, _ = run(lambda guild_id: None)
+        print(f"  {'no journal:':<18}{mutations / elapsed:10.0f} ops/s")
+
+        journal = QueueJournal(os.path.join(directory, 'journal'))
+        start = time.perf_counter()
+        elapsed, managers = run(journal.guild)
+        journal.flush()
+        durable = time.perf_counter() - start
+        stats = journal.stats()
+        print(f"  {'group commit:':<18}{mutations / elapsed:10.0f} ops/s, all durable after {durable:.2f}s "
+              f"({stats['records']} records in {stats['commits']} commits, {stats['syncs']} fsyncs)")
+
+        # Play every queue to the end; a restart must then have nothing to replay
+        for queue_manager in managers:
+            while queue_manager.get_next_song():
+                pass
+            queue_manager.finish()
+        journal.close()
+        reopened = QueueJournal(os.path.join(directory, 'journal'))
+        replayed = sum(1 for guild_id in range(guilds) if any(reopened.load(guild_id)))
+        reopened.close()
+        print(f"  {'after finishing:':<18}{replayed:10d} of {guilds} guilds would replay a song on restart")
+        assert not replayed, "Finished songs must not come back after a restart"
+
+        sample = mutations // 20
+        plan[:] = plan[:sample]
+        elapsed, _ = run(lambda guild_id: SyncJournal(os.path.join(directory, f"sync-{guild_id}.log")))
+        print(f"  {'fsync per op:':<18}{sample / elapsed:10.0f} ops/s (first {sample} mutations)")
+
+@benchmark
+def bench_guild_registry(guilds=5000):
+    """Report memory per guild while resident and after idle eviction"""
+    import gc
+    from guild_registry import GuildRegistry, GuildState
+    from music_player import MusicPlayer
+    from prefetcher import Prefetcher
+
+    def create_state(guild_id, restore_queue):
+        player = MusicPlayer(None, guild_id=guild_id)
+        queue_manager = QueueManager()
+        return GuildState(player, queue_manager, Prefetcher(player, queue_manager))
+
+    registry = GuildRegistry(create_state, idle_timeout=0)
+    tracemalloc.start()
+    for guild_id in range(guilds):
+        state = registry.get(guild_id)
+        if guild_id % 10 == 0:
+            # Some guilds changed settings and played a few songs
+            state.player.audio_processor.set_volume(0.5)
+            state.queue_manager.history.extend(
+                Track(f"Song {i}", webpage_url=f"https://www.youtube.com/watch?v={i:011d}", duration=200) for i in range(10)
+            )
+    resident = tracemalloc.get_traced_memory()[0]
+    registry.sweep()
+    gc.collect()
+    evicted = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    stats = registry.stats()
+
+    start = time.perf_counter()
+    for guild_id in range(guilds):
+        registry.get(guild_id)
+    rehydrate = (time.perf_counter() - start) / guilds
+
+    print(f"guild_registry: {guilds} idle guilds, 10% with saved settings and history")
+    print(f"  resident:   {resident / guilds:9.0f} bytes/guild")
+    print(f"  evicted:    {evicted / guilds:9.0f} bytes/guild ({stats['evicted_bytes'] / stats['evicted_with_state']:.0f} byte blobs)")
+    print(f"  rehydrate:  {rehydrate * 1e6:9.1f} us/guild")
+
+@benchmark
+def bench_idle_timers(guilds=50000):
+    """Compare arming and resetting idle deadlines with sleeping tasks vs the timer wheel"""
+    from timer_wheel import TimerWheel
+
+    async def sleeping_tasks():
+        async def idle(guild_id):
+            await asyncio.sleep(60)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        tasks = {guild_id: asyncio.ensure_future(idle(guild_id)) for guild_id in range(guilds)}
+        await asyncio.sleep(0)
+        memory = tracemalloc.get_traced_memory()[0]
+        # A playback event resets every deadline
+        for guild_id in range(guilds):
+            tasks.pop(guild_id).cancel()
+            tasks[guild_id] = asyncio.ensure_future(idle(guild_id))
+        await asyncio.sleep(0)
+        elapsed = time.perf_counter() - start
+        tracemalloc.stop()
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        return elapsed, memory
+
+    async def wheel():
+        timers = TimerWheel()
+        callback = lambda: None
+        tracemalloc.start()
+        start = time.perf_counter()
+        for guild_id in range(guilds):
+            timers.schedule((guild_id, 'disconnect'), 60, callback)
+        memory = tracemalloc.get_traced_memory()[0]
+        for guild_id in range(guilds):
+            timers.schedule((guild_id, 'disconnect'), 60, callback)
+        elapsed = time.perf_counter() - start
+        tracemalloc.stop()
+        return elapsed, memory
+
+    print(f"idle_timers: arm and reset one 60 s deadline for each of {guilds} guilds")
+    for label, run in (('sleeping tasks:', sleeping_tasks), ('timer wheel:', wheel)):
+        elapsed, memory = asyncio.run(run())
+        print(f"  {label:<16}{elapsed * 1e6 / (2 * guilds):7.2f} us per arm, {memory / guilds:6.0f} bytes per pending timer")
+
+@benchmark
+def bench_queue_view(size=100000, views=2000):
+    """Compare rendering a queue page from a full copy with the sliced, version-cached page"""
+    queue_manager = QueueManager()
+    queue_manager.add_songs([
+        Track(f"Song {i}", webpage_url=f"https://www.youtube.com/watch?v={i:011d}", duration=200) for i in range(size)
+    ])
+
+    def render(songs, start):
+        return "\n".join(f"{i}. **{song['title']}** ({song.get('duration', 'Unknown')})" for i, song in enumerate(songs, start + 1))
+
+    def full_copy(page):
+        songs = queue_manager.get_queue_list()
+        return render(songs[page * 10:page * 10 + 10], page * 10)
+
+    def cached(page):
+        return queue_manager.render_page(page, render)
+
+    def changed(page):
+        queue_manager.touch()
+        return queue_manager.render_page(page, render)
+
+    print(f"queue_view: {views} views of one page of a {size} song queue")
+    for label, view in (('full copy:', full_copy), ('slice, changed:', changed), ('slice, cached:', cached)):
+        start = time.perf_counter()
+        for _ in range(views):
+            view(5000)
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<17}{elapsed * 1e6 / views:9.1f} us per view")
+
+@benchmark
+def bench_autocomplete(entries=20000, searches=2000):
+    """Measure /play autocomplete lookups and memory on a full suggestion index.
+
+    Play counts follow a long tail, and users look for tracks in proportion
+    to how often they are played. Short prefixes must find the track in the
+    top 25 at a minimum rate.
+    """
+    from suggestions import SuggestionIndex
+
+    rng = random.Random(1)
+    syllables = ['la', 'mi', 'ro', 'ka', 'ne', 'to', 'su', 'ri', 'an', 'do', 'be', 'ga']
+    def word():
+        return ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+    labels = [f"{word().title()} {word()} - {word().title()}" for _ in range(entries)]
+    plays = [int(rng.paretovariate(1.0)) for _ in range(entries)]
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = SuggestionIndex(max_entries=entries)
+    for i, (label, count) in enumerate(zip(labels, plays)):
+        index.add(label, f"https://www.youtube.com/watch?v={i:011d}", count)
+    build = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    targets = rng.choices(labels, weights=plays, k=searches)
+    typo = lambda text: text[:3] + text[4:] if len(text) > 6 else text
+    print(f"autocomplete: {entries} indexed tracks, {memory / entries:.0f} bytes/track, "
+          f"{build * 1e6 / entries:.1f} us/add")
+    for label, queries, minimum in (
+        ('1 char:', [target[:1] for target in targets], 0.5),
+        ('3 chars:', [target[:3] for target in targets], 0.75),
+        ('first word:', [target.split()[0] for target in targets], 0.9),
+        ('two words, typo:', [typo(' '.join(target.split()[:2])) for target in targets], 0.95),
+    ):
+        found = 0
+        start = time.perf_counter()
+        for query, target in zip(queries, targets):
+            results = index.search(query)
+            found += any(result == target for result, _ in results)
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<18}{elapsed * 1e3 / searches:7.3f} ms per search, target in top 25: {found / searches:.0%}")
+        assert found / searches >= minimum, f"{label} hit rate below {minimum:.0%}"
+
+@benchmark
+def bench_library(files=100000, searches=5000):
+    """Scan a generated tagged MP3 library, then time rescans, index reloads and searches"""
+    import struct
+    from library import MusicLibrary
+
+    def id3_frame(frame_id, text):
+        body = b'\x03' + text.encode()
+        return frame_id.encode() + struct.pack('>I', len(body)) + b'\x00\x00' + body
+
+    def mp3_bytes(title, artist, album):
+        frames = id3_frame('TIT2', title) + id3_frame('TPE1', artist) + id3_frame('TALB', album)
+        size = len(frames)
+        header = b'ID3\x03\x00\x00' + bytes([(size >> 21) & 127, (size >> 14) & 127, (size >> 7) & 127, size & 127])
+        return header + frames + bytes.fromhex('fffb9000') + b'\x00' * 413
+
+    rng = random.Random(3)
+    syllables = ['la', 'mi', 'ro', 'ka', 'ne', 'to', 'su', 'ri', 'an', 'do', 'be', 'ga', 'vo', 'pe']
+    def word():
+        return ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 3)))
+
+    with tempfile.TemporaryDirectory() as directory:
+        root = os.path.join(directory, 'music')
+        titles = []
+        artists = [f"{word().title()} {word().title()}" for _ in range(files // 200)]
+        for album_index in range(files // 100):
+            artist = rng.choice(artists)
+            album = f"{word().title()} {word()}"
+            album_dir = os.path.join(root, artist, album)
+            os.makedirs(album_dir)
+            for number in range(100):
+                title = f"{word().title()} {word()} {word()}"
+                titles.append((title, artist))
+                with open(os.path.join(album_dir, f"{number:03d}.mp3"), 'wb') as f:
+                    f.write(mp3_bytes(title, artist, album))
+
+        index_path = os.path.join(directory, 'library.db')
+        library = MusicLibrary(root, index_path)
+        start = time.perf_counter()
+        library.scan()
+        first_scan = time.perf_counter() - start
+        start = time.perf_counter()
+        library.scan()
+        rescan = time.perf_counter() - start
+        start = time.perf_counter()
+        reloaded = MusicLibrary(root, index_path)
+        reload = time.perf_counter() - start
+
+        print(f"library: {len(library.tracks)} tagged files, {len(library.terms)} index terms")
+        print(f"  first scan:        {first_scan:8.2f} s")
+        print(f"  unchanged rescan:  {rescan:8.2f} s")
+        print(f"  index reload:      {reload:8.2f} s")
+
+        targets = [rng.choice(titles) for _ in range(searches)]
+        for label, queries in (
+            ('full title:', [title for title, _ in targets]),
+            ('two title words:', [' '.join(title.split()[:2]) for title, _ in targets]),
+            ('artist + word:', [f"{artist} {title.split()[0]}" for title, artist in targets]),
+            ('no match:', ['zzz ' + title for title, _ in targets]),
+        ):
+            start = time.perf_counter()
+            for query in queries:
+                reloaded.search(query)
+            elapsed = time.perf_counter() - start
+            print(f"  {label:<19}{elapsed * 1e6 / searches:8.1f} us per search")
+
+        # Searches must not wait while a rescan indexes changed files
+        changed = 0
+        for path, _, _ in reloaded.walk():
+            if changed == files // 10:
+                break
+            os.utime(path, (time.time(), time.time() + 10))
+            changed += 1
+        scanner = threading.Thread(target=reloaded.scan)
+        scanner.start()
+        slowest = 0.0
+        queries = [title for title, _ in targets]
+        while scanner.is_alive():
+            start = time.perf_counter()
+            reloaded.search(rng.choice(queries))
+            slowest = max(slowest, time.perf_counter() - start)
+        scanner.join()
+        print(f"  slowest search during a rescan of {changed} changed files: {slowest * 1e3:.2f} ms")
+
+@benchmark
+def bench_upload_store(distinct=200, uploads=2000, file_kib=256, concurrency=16, playing=32):
+    """Stream skewed upload traffic into the upload store, checking deduplication, disk usage and cleanup cost"""
+    from upload_store import UploadStore
+
+    def mp3_bytes(index):
+        title = f"Upload {index}".encode()
+        frame = b'TIT2' + (len(title) + 1).to_bytes(4, 'big') + b'\x00\x00\x03' + title
+        header = b'ID3\x03\x00\x00' + len(frame).to_bytes(4, 'big')  # Small enough to be a valid syncsafe size
+        frames = (bytes.fromhex('fffb9000') + index.to_bytes(4, 'big') + b'\x00' * 409) * (file_kib * 1024 // 417)
+        return header + frame + frames
+
+    files = [mp3_bytes(i) for i in range(distinct)]
+    rng = random.Random(5)
+    # A few popular files make up most uploads, like a meme clip shared around a server
+    weights = [1 / (rank + 1) for rank in range(distinct)]
+    picks = rng.choices(range(distinct), weights=weights, k=uploads)
+
+    async def serve(request):
+        return web.Response(body=files[int(request.match_info['index'])], content_type='audio/mpeg')
+
+    async def run(directory):
+        app = web.Application()
+        app.router.add_get('/files/{index}', serve)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        base_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+        store = UploadStore(directory, max_bytes=64 * file_kib * 1024, max_file_bytes=4 * file_kib * 1024)
+        queued = deque()  # Paths of uploads waiting or playing, released oldest first
+        peak_bytes = 0
+        release_times = []
+        start = time.perf_counter()
+        for batch in range(0, uploads, concurrency):
+            results = await asyncio.gather(*(
+                store.save(f"{base_url}/files/{index}", f"upload{index}.mp3", size=len(files[index]))
+                for index in picks[batch:batch + concurrency]
+            ))
+            queued.extend(path for path, _ in results)
+            while len(queued) > playing:
+                released = time.perf_counter()
+                store.release(queued.popleft())
+                release_times.append(time.perf_counter() - released)
+            peak_bytes = max(peak_bytes, sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)))
+        elapsed = time.perf_counter() - start
+
+        await store.close()
+        await runner.cleanup()
+        return store.stats(), peak_bytes, elapsed, release_times
+
+    with tempfile.TemporaryDirectory() as directory:
+        stats, peak_bytes, elapsed, release_times = asyncio.run(run(directory))
+
+    half = len(release_times) // 2
+    received = stats['bytes_received']
+    print(f"upload_store: {uploads} uploads of {distinct} distinct {file_kib} KiB files, {concurrency} at a time")
+    print(f"  deduplicated:      {stats['deduplicated']:8d} uploads ({stats['deduplicated'] / uploads:.0%})")
+    print(f"  received:          {received / 1024 ** 2:8.1f} MiB")
+    print(f"  disk peak:         {peak_bytes / 1024 ** 2:8.1f} MiB (limit {stats['max_bytes'] / 1024 ** 2:.0f} MiB)")
+    print(f"  evictions:         {stats['evictions']:8d}")
+    print(f"  per upload:        {elapsed * 1e3 / uploads:8.2f} ms")
+    print(f"  release, 1st half: {sum(release_times[:half]) * 1e6 / half:8.1f} us")
+    print(f"  release, 2nd half: {sum(release_times[half:]) * 1e6 / (len(release_times) - half):8.1f} us")
+
+@benchmark
+def bench_spotify_matching(tracks=500, candidates=5):
+    """Match a fixture set of Spotify tracks against search results with decoys, then replay them from the stored mapping"""
+    from cache import SQLiteCacheBackend
+    from spotify_matcher import SpotifyMatcher
+
+    rng = random.Random(11)
+    syllables = ['la', 'mi', 'ro', 'ka', 'ne', 'to', 'su', 'ri', 'an', 'do', 'be', 'ga', 'vo', 'pe']
+    def word():
+        return ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 3)))
+
+    artists = [f"{word().title()} {word().title()}" for _ in range(tracks // 5)]
+    fixtures = []  # (Spotify track, flat search entries, IDs of entries that are the same recording)
+    for i in range(tracks):
+        artist = rng.choice(artists)
+        name = ' '.join(word().title() for _ in range(rng.randint(1, 4)))
+        live = rng.random() < 0.1  # Some Spotify tracks are live recordings themselves
+        if live:
+            name += ' - Live'
+        duration = rng.randint(120, 360)
+        track = {
+            'name': name, 'artist': artist, 'album': f"{word().title()} {word()}", 'duration': duration,
+            'external_url': f"https://open.spotify.com/track/sp{i}", 'isrc': f"QZ{i:010d}"
+        }
+        base = name.replace(' - Live', '')
+        good = [
+            {'title': base if not live else name, 'channel': f"{artist} - Topic", 'duration': duration},
+            {'title': f"{artist} - {base} (Official Video)", 'channel': f"{artist.replace(' ', '')}VEVO",
+             'duration': duration + rng.randint(4, 25)} if not live else
+            {'title': f"{artist} - {base} (Live)", 'channel': artist, 'duration': duration + rng.randint(0, 3)},
+            {'title': f"{artist} - {base} (Lyrics)", 'channel': 'Lyric Vault', 'duration': duration + rng.randint(-1, 1)},
+        ]
+        bad = [
+            {'title': f"{artist} - {base} (Live at {word().title()} Arena)", 'channel': artist,
+             'duration': duration + rng.randint(30, 120)} if not live else
+            {'title': f"{artist} - {base}", 'channel': f"{artist} - Topic", 'duration': duration - rng.randint(20, 60)},
+            {'title': f"{base} - {artist} (Cover)", 'channel': f"{word().title()} Sings", 'duration': duration + rng.randint(-15, 15)},
+            {'title': f"{base} ({word().title()} Remix)", 'channel': f"{word().title()} Beats", 'duration': duration + rng.randint(20, 90)},
+            {'title': f"{artist} - {base} (Sped Up)", 'channel': 'sped up songs', 'duration': int(duration / 1.25)},
+            {'title': f"{base} - Karaoke Version", 'channel': 'Sing King', 'duration': duration + rng.randint(-3, 3)},
+            {'title': f"{rng.choice(artists)} - {base}", 'channel': rng.choice(artists), 'duration': rng.randint(120, 360)},
+        ]
+        # Search results are often led by a popular video that is not the studio recording
+        entries = rng.sample(good, rng.randint(1, 2)) + rng.sample(bad, candidates)
+        rng.shuffle(entries)
+        entries = entries[:candidates]
+        if not any(entry in good for entry in entries):
+            entries[rng.randrange(candidates)] = good[0]
+        for j, entry in enumerate(entries):
+            entry['id'] = f"v{i}x{j}"
+        fixtures.append((track, entries, {entry['id'] for entry in entries if entry in good}))
+
+    with tempfile.TemporaryDirectory() as directory:
+        matcher = SpotifyMatcher(SQLiteCacheBackend(os.path.join(directory, 'matches.db')), candidates=candidates)
+
+        first_hit = sum(entries[0]['id'] in correct for _, entries, correct in fixtures)
+        matched = 0
+        start = time.perf_counter()
+        for track, entries, correct in fixtures:
+            match = matcher.lookup(track) or matcher.choose(track, entries)
+            matched += match['webpage_url'].rpartition('=')[2] in correct
+        first_pass = time.perf_counter() - start
+
+        # Repeat plays, half of them from another release of the same recording (same ISRC, new track ID)
+        searched = matcher.searches
+        start = time.perf_counter()
+        for i, (track, entries, _) in enumerate(fixtures):
+            if i % 2:
+                track = dict(track, external_url=f"https://open.spotify.com/track/compilation{i}")
+            matcher.lookup(track) or matcher.choose(track, entries)
+        repeat_pass = time.perf_counter() - start
+        stats = matcher.stats()
+
+    print(f"spotify_matching: {tracks} fixture tracks, {candidates} candidates per search")
+    print(f"  first hit accuracy: {first_hit / tracks:7.1%}")
+    print(f"  scored accuracy:    {matched / tracks:7.1%} ({stats['confident']} confident matches stored)")
+    print(f"  first play:         {first_pass * 1e3 / tracks:7.3f} ms per lookup + 1 flat search")
+    print(f"  repeat play:        {repeat_pass * 1e3 / tracks:7.3f} ms per lookup, "
+          f"{matcher.searches - searched} searches for {tracks} plays")
+
+class FakeGateway:
+    """Local stand-in for Discord's REST API and gateway, serving generated guilds per shard.
+
+    Guild IDs are chosen so that each lands on the shard that announces it.
+    IDENTIFY times are recorded per rate limit bucket to check the cluster's
+    identify spacing.
+    """
+
+    def __init__(self, shard_count, guilds_per_shard=50, max_concurrency=1):
+        self.shard_count = shard_count
+        self.guilds_per_shard = guilds_per_shard
+        self.max_concurrency = max_concurrency
+        self.identifies = []  # (time, shard_id)
+        self.runner = None
+        self.base_url = None
+
+    def respond(self, data):
+        # discord.py only parses bodies whose content type is exactly application/json
+        return web.Response(body=json.dumps(data).encode(), headers={'Content-Type': 'application/json'})
+
+    def user(self):
+        return {'id': '1000', 'username': 'bench-bot', 'discriminator': '0', 'global_name': None, 'avatar': None, 'bot': True}
+
+    def guild_ids(self, shard_id):
+        return [((n * self.shard_count + shard_id) << 22) | 1 for n in range(self.guilds_per_shard)]
+
+    def guild(self, guild_id):
+        return {
+            'id': str(guild_id), 'name': f"Guild {guild_id >> 22}", 'owner_id': '1', 'member_count': 10,
+            'channels': [], 'roles': [], 'members': [], 'emojis': [], 'stickers': [], 'features': [],
+            'voice_states': [], 'threads': [], 'unavailable': False
+        }
+
+    async def handle_user(self, request):
+        return self.respond(self.user())
+
+    async def handle_application(self, request):
+        return self.respond({
+            'id': '1000', 'name': 'bench-bot', 'description': '', 'icon': None, 'bot_public': True,
+            'bot_require_code_grant': False, 'owner': self.user(), 'verify_key': '', 'flags': 0
+        })
+
+    async def handle_gateway_bot(self, request):
+        return self.respond({
+            'url': self.base_url.replace('http', 'ws', 1) + '/gateway', 'shards': self.shard_count,
+            'session_start_limit': {'total': 1000, 'remaining': 1000, 'reset_after': 0, 'max_concurrency': self.max_concurrency}
+        })
+
+    async def handle_gateway(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.send_json({'op': 10, 'd': {'heartbeat_interval': 41250}})
+        sequence = 0
+        async for message in ws:
+            payload = message.json()
+            if payload['op'] == 1:
+                await ws.send_json({'op': 11, 'd': None})
+            elif payload['op'] == 2:
+                shard_id = payload['d']['shard'][0]
+                self.identifies.append((time.monotonic(), shard_id))
+                guild_ids = self.guild_ids(shard_id)
+                events = [('READY', {
+                    'v': 10, 'user': self.user(), 'session_id': f"session-{shard_id}",
+                    'resume_gateway_url': self.base_url.replace('http', 'ws', 1) + '/gateway',
+                    'guilds': [{'id': str(guild_id), 'unavailable': True} for guild_id in guild_ids],
+                    'shard': payload['d']['shard'], 'application': {'id': '1000', 'flags': 0}
+                })]
+                events += [('GUILD_CREATE', self.guild(guild_id)) for guild_id in guild_ids]
+                for event, data in events:
+                    sequence += 1
+                    await ws.send_json({'op': 0, 't': event, 's': sequence, 'd': data})
+        return ws
+
+    def identify_spacing(self):
+        """Get the smallest gap between IDENTIFYs in the same rate limit bucket"""
+        last = {}
+        gaps = []
+        for when, shard_id in sorted(self.identifies):
+            bucket = shard_id % self.max_concurrency
+            if bucket in last:
+                gaps.append(when - last[bucket])
+            last[bucket] = when
+        return min(gaps) if gaps else None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/api/v10/users/@me', self.handle_user)
+        app.router.add_get('/api/v10/oauth2/applications/@me', self.handle_application)
+        app.router.add_get('/api/v10/gateway/bot', self.handle_gateway_bot)
+        app.router.add_get('/gateway', self.handle_gateway)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+def run_cluster_worker():
+    """One bench_cluster worker: the sharded bot and per-guild state of main.py against FakeGateway.
+
+    main.py itself needs Opus and real credentials, so this builds the same
+    ClusterBot, GuildRegistry and stats reporting, and simulates load by
+    queueing songs in every guild that comes online.
+    """
+    import discord
+    import yarl
+    from discord.gateway import DiscordWebSocket
+    from discord.http import Route
+    from cluster import ClusterBot, IdentifyGate, write_worker_stats
+    from guild_registry import GuildRegistry, GuildState
+    from music_player import MusicPlayer
+    from prefetcher import Prefetcher
+
+    base_url = os.environ['FAKE_GATEWAY_URL']
+    Route.BASE = f"{base_url}/api/v10"
+    DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(base_url.replace('http', 'ws', 1) + '/gateway')
+    shard_ids = [int(shard_id) for shard_id in os.environ['SHARD_IDS'].split(',')]
+    stats_dir = os.environ['CLUSTER_STATS_DIR']
+    cluster_id = os.environ['CLUSTER_ID']
+    songs_per_guild = int(os.environ.get('FAKE_SONGS_PER_GUILD', '20'))
+
+    bot = ClusterBot(
+        command_prefix='!', intents=discord.Intents.default(), shard_count=int(os.environ['SHARD_COUNT']),
+        shard_ids=shard_ids, guild_ready_timeout=0.2,
+        identify_gate=IdentifyGate(stats_dir, int(os.environ['IDENTIFY_CONCURRENCY']), interval=0.2)
+    )
+
+    def create_state(guild_id, restore_queue):
+        player = MusicPlayer(bot, guild_id=guild_id)
+        queue_manager = QueueManager()
+        return GuildState(player, queue_manager, Prefetcher(player, queue_manager, depth=0))
+
+    registry = GuildRegistry(create_state)
+
+    @bot.event
+    async def on_guild_available(guild):
+        queue_manager = registry.get(guild.id).queue_manager
+        queue_manager.add_songs([
+            Track(f"Song {i}", webpage_url=f"https://www.youtube.com/watch?v={i:011d}", duration=200)
+            for i in range(songs_per_guild)
+        ])
+        queue_manager.get_next_song()
+
+    async def report():
+        while True:
+            registry_stats = registry.stats()
+            write_worker_stats(stats_dir, cluster_id, {
+                'pid': os.getpid(),
+                'updated_at': time.time(),
+                'ready': int(bot.is_ready()),
+                'guilds': len(bot.guilds),
+                'resident_guilds': registry_stats['resident'],
+                'queued_songs': sum(state.queue_manager.get_queue_length() for state in registry.resident.values())
+            })
+            await asyncio.sleep(0.1)
+
+    @bot.event
+    async def on_ready():
+        asyncio.create_task(report())
+
+    bot.run('fake-token', log_handler=None)
+
+@benchmark
+def bench_cluster(shard_count=8, workers=4, guilds_per_shard=250):
+    """Start a cluster against a fake gateway, kill a worker and time how long until all guilds are served again"""
+    from cluster import ClusterSupervisor
+
+    async def wait_for(supervisor, guilds, timeout=60):
+        start = time.monotonic()
+        while time.monotonic() - start < timeout:
+            supervisor.poll()
+            stats = supervisor.stats()
+            if stats['totals'].get('ready') == len(supervisor.workers) and stats['totals'].get('guilds') == guilds:
+                return time.monotonic() - start, stats
+            await asyncio.sleep(0.05)
+        raise TimeoutError(f"cluster did not serve {guilds} guilds within {timeout}s")
+
+    async def run():
+        gateway = FakeGateway(shard_count, guilds_per_shard, max_concurrency=2)
+        await gateway.start()
+        guilds = shard_count * guilds_per_shard
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, FAKE_GATEWAY_URL=gateway.base_url, AUDIO_CACHE_DIR=os.path.join(directory, 'audio'))
+            supervisor = ClusterSupervisor(
+                [sys.executable, os.path.abspath(__file__), '--cluster-worker'], shard_count, workers,
+                stats_dir=directory, env=env, max_concurrency=2, min_backoff=0.1
+            )
+            try:
+                supervisor.start()
+                startup, stats = await wait_for(supervisor, guilds)
+                print(f"cluster: {shard_count} shards on {workers} workers, {guilds} guilds with simulated queues")
+                print(f"  startup:   {startup:6.2f}s until every worker was ready and all guilds were served")
+                for worker in stats['workers']:
+                    print(f"    worker {worker['cluster_id']}: shards {worker['shards']}, "
+                          f"{worker['stats']['guilds']} guilds, {worker['stats']['queued_songs']} queued songs")
+                print(f"  totals:    {stats['totals']['guilds']} guilds, {stats['totals']['queued_songs']} queued songs")
+
+                victim = supervisor.workers[1].process
+                victim.kill()
+                victim.wait()
+                recovery, stats = await wait_for(supervisor, guilds)
+                print(f"  recovery:  {recovery:6.2f}s after killing worker 1 ({stats['restarts']} restart)")
+                print(f"  identify:  {len(gateway.identifies)} IDENTIFYs, "
+                      f"closest pair in one bucket {gateway.identify_spacing():.2f}s apart (gate 0.20s)")
+            finally:
+                supervisor.stop()
+                await gateway.stop()
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ['--cluster-worker']:
+        run_cluster_worker()
+        sys.exit(0)
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark '{name}'. Available: {', '.join(BENCHMARKS)}")
+            sys.exit(1)
+        BENCHMARKS[name]()
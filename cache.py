@@ -0,0 +1,208 @@
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class MemoryCacheBackend:
+    """In-process LRU store for cache entries"""
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Return (value, expires_at) for a key, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, expires_at):
+        """Store a value, evicting the least recently used entries"""
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def recent(self, limit):
+        """Get up to limit (key, value, expires_at) entries, most recently used first"""
+        with self.lock:
+            return [(key, value, expires_at) for key, (value, expires_at)
+                    in itertools.islice(reversed(self.entries.items()), limit)]
+
+    def delete(self, key):
+        """Remove a key if present"""
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        """Remove every entry"""
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SQLiteCacheBackend:
+    """SQLite-backed LRU store so cached entries survive restarts"""
+
+    def __init__(self, path, max_entries=50000):
+        self.path = path
+        self.max_entries = max_entries
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'key TEXT PRIMARY KEY, value TEXT, expires_at REAL, last_access REAL)'
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS cache_last_access ON cache (last_access)')
+        self.count = self.db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+    def get(self, key):
+        """Return (value, expires_at) for a key, or None"""
+        with self.lock:
+            row = self.db.execute(
+                'SELECT value, expires_at FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.db.execute(
+                'UPDATE cache SET last_access = ? WHERE key = ?', (time.time(), key)
+            )
+            return json.loads(row[0]), row[1]
+
+    def set(self, key, value, expires_at):
+        """Store a value, evicting the least recently used entries"""
+        with self.lock:
+            existed = self.db.execute(
+                'SELECT 1 FROM cache WHERE key = ?', (key,)
+            ).fetchone() is not None
+            self.db.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value), expires_at, time.time())
+            )
+            if not existed:
+                self.count += 1
+            if self.count > self.max_entries:
+                overflow = self.count - self.max_entries
+                self.db.execute(
+                    'DELETE FROM cache WHERE key IN '
+                    '(SELECT key FROM cache ORDER BY last_access LIMIT ?)', (overflow,)
+                )
+                self.count -= overflow
+                self.evictions += overflow
+
+    def recent(self, limit):
+        """Get up to limit (key, value, expires_at) entries, most recently used first"""
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT key, value, expires_at FROM cache ORDER BY last_access DESC LIMIT ?', (limit,)
+            ).fetchall()
+        return [(key, json.loads(value), expires_at) for key, value, expires_at in rows]
+
+    def delete(self, key):
+        """Remove a key if present"""
+        with self.lock:
+            cursor = self.db.execute('DELETE FROM cache WHERE key = ?', (key,))
+            self.count -= cursor.rowcount
+
+    def clear(self):
+        """Remove every entry"""
+        with self.lock:
+            self.db.execute('DELETE FROM cache')
+            self.count = 0
+
+    def __len__(self):
+        return self.count
+
+
+class Cache:
+    """TTL cache with hit/miss accounting on top of a pluggable backend"""
+
+    def __init__(self, backend=None, ttl=3600):
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key):
+        """Return (found, value) for a key, dropping it if it has expired"""
+        entry = self.backend.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            self.backend.delete(key)
+            self.misses += 1
+            return False, None
+
+        self.hits += 1
+        return True, value
+
+    def get(self, key, default=None):
+        """Return the cached value for a key or a default"""
+        found, value = self.lookup(key)
+        return value if found else default
+
+    def set(self, key, value, ttl=None):
+        """Store a value for ttl seconds (the cache default if omitted)"""
+        ttl = self.ttl if ttl is None else ttl
+        self.backend.set(key, value, time.time() + ttl if ttl else None)
+
+    def recent(self, limit):
+        """Get up to limit unexpired (key, value) pairs, most recently used first, without counting lookups"""
+        now = time.time()
+        return [(key, value) for key, value, expires_at in self.backend.recent(limit)
+                if expires_at is None or expires_at > now]
+
+    def delete(self, key):
+        """Remove a key from the cache"""
+        self.backend.delete(key)
+
+    def clear(self):
+        """Remove every entry from the cache"""
+        self.backend.clear()
+
+    def stats(self):
+        """Get hit/miss counters for the cache"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.backend.evictions
+        }
+
+
+def create_cache_backend(kind='memory', path=None, max_entries=2048):
+    """Build a cache backend from configuration values"""
+    if kind == 'sqlite':
+        if not path:
+            raise ValueError("A path is required for the sqlite cache backend")
+        return SQLiteCacheBackend(path, max_entries=max_entries)
+    if kind != 'memory':
+        logger.warning(f"Unknown cache backend '{kind}', falling back to memory")
+    return MemoryCacheBackend(max_entries=max_entries)
@@ -0,0 +1,307 @@
+"""Run the bot as a cluster of worker processes, each owning a range of shards.
+
+Start with `python cluster.py`. CLUSTER_WORKERS sets the number of worker
+processes and CLUSTER_SHARDS the total shard count (by default Discord's
+recommendation from /gateway/bot). Every worker runs main.py as an
+AutoShardedBot for its shard range, so it only holds state for its own
+guilds; the supervisor restarts workers that exit and aggregates the stats
+they report. Workers take turns to IDENTIFY through lock files so the
+cluster as a whole stays within Discord's session start rate limit.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+import aiohttp
+from discord.ext import commands
+
+logger = logging.getLogger(__name__)
+
+# Worker stats that are not summed across the cluster
+NON_ADDITIVE = ('pid', 'updated_at', 'latency_ms')
+
+def shard_for_guild(guild_id, shard_count):
+    """Get the shard Discord routes a guild's events to"""
+    return (guild_id >> 22) % shard_count
+
+def shard_ranges(shard_count, workers):
+    """Split shard IDs into contiguous ranges of nearly equal size, one per worker"""
+    workers = max(1, min(workers, shard_count))
+    size, extra = divmod(shard_count, workers)
+    ranges = []
+    start = 0
+    for worker in range(workers):
+        stop = start + size + (1 if worker < extra else 0)
+        ranges.append(list(range(start, stop)))
+        start = stop
+    return ranges
+
+async def fetch_gateway_limits(token, api_base='https://discord.com/api/v10'):
+    """Ask Discord how many shards the bot should run and how many may IDENTIFY at once"""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{api_base}/gateway/bot", headers={'Authorization': f"Bot {token}"}) as response:
+            response.raise_for_status()
+            data = await response.json()
+    return data['shards'], data['session_start_limit']['max_concurrency']
+
+def write_worker_stats(directory, cluster_id, stats):
+    """Publish a worker's stats for the supervisor, replacing the file atomically"""
+    path = os.path.join(directory, f"worker-{cluster_id}.json")
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(stats, f)
+    os.replace(f"{path}.tmp", path)
+
+def read_worker_stats(directory, max_age=None):
+    """Read every worker's published stats, skipping files older than max_age seconds"""
+    workers = []
+    for name in sorted(os.listdir(directory)):
+        if not (name.startswith('worker-') and name.endswith('.json')):
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                stats = json.load(f)
+        except (FileNotFoundError, ValueError):
+            continue
+        if max_age is None or time.time() - stats.get('updated_at', 0) <= max_age:
+            workers.append(stats)
+    return workers
+
+
+class IdentifyGate:
+    """Spaces out IDENTIFYs from every worker process sharing a directory.
+
+    Discord lets each rate limit bucket (shard_id % max_concurrency) start
+    one session per interval seconds, across all of the bot's connections.
+    Each bucket's last IDENTIFY time is kept in a lock file, so workers
+    started together queue up behind each other instead of being rejected.
+    """
+
+    def __init__(self, directory, max_concurrency=1, interval=5.0):
+        self.directory = directory
+        self.max_concurrency = max(1, max_concurrency)
+        self.interval = interval
+        os.makedirs(directory, exist_ok=True)
+
+    def claim(self, shard_id):
+        """Take the bucket's slot if it is free; returns 0, or the seconds until it frees up"""
+        path = os.path.join(self.directory, f"identify-{shard_id % self.max_concurrency}.lock")
+        with open(path, 'a+', encoding='utf-8') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)  # Released when the file is closed
+            f.seek(0)
+            try:
+                last = float(f.read() or 0)
+            except ValueError:
+                last = 0.0
+            now = time.time()
+            if now - last < self.interval:
+                return self.interval - (now - last)
+            f.truncate(0)
+            f.write(repr(now))
+            return 0
+
+    async def wait(self, shard_id):
+        """Wait until a shard may IDENTIFY"""
+        loop = asyncio.get_running_loop()
+        while True:
+            delay = await loop.run_in_executor(None, self.claim, shard_id)
+            if not delay:
+                return
+            await asyncio.sleep(delay)
+
+
+class ClusterBot(commands.AutoShardedBot):
+    """AutoShardedBot for one worker, identifying its shards through an IdentifyGate"""
+
+    def __init__(self, *args, identify_gate=None, **options):
+        super().__init__(*args, **options)
+        self.identify_gate = identify_gate
+
+    async def before_identify_hook(self, shard_id, *, initial=False):
+        if self.identify_gate is None:
+            await super().before_identify_hook(shard_id, initial=initial)
+        else:
+            await self.identify_gate.wait(shard_id)
+
+
+class Worker:
+    """One worker process and its restart bookkeeping"""
+
+    def __init__(self, cluster_id, shard_ids):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.process = None
+        self.started_at = None
+        self.restart_at = None  # When a failed worker is due to be started again
+        self.backoff = 0.0
+        self.restarts = 0
+
+
+class ClusterSupervisor:
+    """Starts one worker per shard range, restarts failed workers and aggregates their stats.
+
+    Workers are told their shards through SHARD_COUNT, SHARD_IDS and
+    CLUSTER_ID, and share max_concurrency for their IdentifyGate.
+    Per-process limits (ffmpeg processes, audio cache size) are divided
+    between the workers, and each gets its own audio cache and upload
+    directories and library index (upload references and library track
+    IDs are per process). A worker that exits is restarted after an
+    exponential backoff, which resets once it has stayed up for
+    stable_after seconds.
+    """
+
+    def __init__(self, command, shard_count, workers, stats_dir='data/cluster', env=None, max_concurrency=1,
+                 min_backoff=1.0, max_backoff=60.0, stable_after=60.0):
+        self.command = command
+        self.shard_count = shard_count
+        self.max_concurrency = max_concurrency
+        self.workers = [Worker(i, shard_ids) for i, shard_ids in enumerate(shard_ranges(shard_count, workers))]
+        self.stats_dir = stats_dir
+        self.env = dict(os.environ if env is None else env)
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.stopping = False
+        os.makedirs(stats_dir, exist_ok=True)
+
+    def worker_env(self, worker):
+        """Build the environment for one worker"""
+        env = dict(self.env)
+        count = len(self.workers)
+        env.update({
+            'SHARD_COUNT': str(self.shard_count),
+            'SHARD_IDS': ','.join(str(shard_id) for shard_id in worker.shard_ids),
+            'CLUSTER_ID': str(worker.cluster_id),
+            'CLUSTER_STATS_DIR': self.stats_dir,
+            'IDENTIFY_CONCURRENCY': str(self.max_concurrency),
+            'AUDIO_CACHE_DIR': os.path.join(env.get('AUDIO_CACHE_DIR', 'cache/audio'), f"worker-{worker.cluster_id}"),
+            'AUDIO_CACHE_MAX_MB': str(max(1, int(env.get('AUDIO_CACHE_MAX_MB', '2048')) // count)),
+            # Workers assign track IDs on their own, so each keeps its own library index
+            'LIBRARY_INDEX_PATH': '{0}-worker-{2}{1}'.format(
+                *os.path.splitext(env.get('LIBRARY_INDEX_PATH', 'cache/library.db')), worker.cluster_id
+            ),
+            'UPLOAD_DIR': os.path.join(env.get('UPLOAD_DIR', 'cache/uploads'), f"worker-{worker.cluster_id}"),
+            'UPLOAD_CACHE_MAX_MB': str(max(1, int(env.get('UPLOAD_CACHE_MAX_MB', '1024')) // count)),
+            'FFMPEG_MAX_PROCESSES': str(max(1, int(env.get('FFMPEG_MAX_PROCESSES', '64')) // count))
+        })
+        return env
+
+    def spawn(self, worker):
+        """Start a worker process"""
+        worker.process = subprocess.Popen(self.command, env=self.worker_env(worker))
+        worker.started_at = time.monotonic()
+        worker.restart_at = None
+        logger.info(f"Started worker {worker.cluster_id} (pid {worker.process.pid}) for shards {worker.shard_ids}")
+
+    def start(self):
+        for worker in self.workers:
+            self.spawn(worker)
+
+    def poll(self):
+        """Notice exited workers and restart those whose backoff has passed"""
+        now = time.monotonic()
+        for worker in self.workers:
+            if worker.restart_at is not None:
+                if now >= worker.restart_at and not self.stopping:
+                    worker.restarts += 1
+                    self.spawn(worker)
+                continue
+
+            code = worker.process.poll() if worker.process else None
+            if code is None:
+                continue
+            if now - worker.started_at >= self.stable_after:
+                worker.backoff = 0.0
+            worker.backoff = min(self.max_backoff, max(self.min_backoff, worker.backoff * 2))
+            worker.restart_at = now + worker.backoff
+            logger.warning(f"Worker {worker.cluster_id} exited with {code}, restarting in {worker.backoff:.0f}s")
+
+    def worker_stats(self, worker):
+        """Read the stats a live worker last published, or None"""
+        if not worker.process or worker.process.poll() is not None:
+            return None
+        try:
+            with open(os.path.join(self.stats_dir, f"worker-{worker.cluster_id}.json"), encoding='utf-8') as f:
+                stats = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        # A file left by the previous process of a restarted worker does not count
+        return stats if stats.get('pid') == worker.process.pid else None
+
+    def stats(self):
+        """Sum the numeric stats of every live worker"""
+        totals = {}
+        workers = []
+        for worker in self.workers:
+            stats = self.worker_stats(worker)
+            workers.append({
+                'cluster_id': worker.cluster_id,
+                'shards': worker.shard_ids,
+                'alive': worker.process is not None and worker.process.poll() is None,
+                'restarts': worker.restarts,
+                'stats': stats
+            })
+            for key, value in (stats or {}).items():
+                if isinstance(value, (int, float)) and key not in NON_ADDITIVE:
+                    totals[key] = totals.get(key, 0) + value
+        return {
+            'workers': workers,
+            'reporting': sum(1 for worker in workers if worker['stats']),
+            'restarts': sum(worker.restarts for worker in self.workers),
+            'totals': totals
+        }
+
+    async def run(self, interval=1.0, log_every=60.0):
+        """Start the workers and supervise them until cancelled"""
+        self.start()
+        last_log = time.monotonic()
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                self.poll()
+                if time.monotonic() - last_log >= log_every:
+                    last_log = time.monotonic()
+                    stats = self.stats()
+                    logger.info(f"Cluster: {stats['reporting']}/{len(self.workers)} workers reporting, "
+                                f"{stats['restarts']} restarts, totals {stats['totals']}")
+        finally:
+            self.stop()
+
+    def stop(self, timeout=10):
+        """Stop every worker, killing those that do not exit in time"""
+        self.stopping = True
+        live = [worker.process for worker in self.workers if worker.process and worker.process.poll() is None]
+        for process in live:
+            process.terminate()
+        for process in live:
+            try:
+                process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    workers = int(os.getenv('CLUSTER_WORKERS', str(os.cpu_count() or 1)))
+    shard_count = int(os.getenv('CLUSTER_SHARDS', '0'))
+    max_concurrency = int(os.getenv('IDENTIFY_CONCURRENCY', '1'))
+    if not shard_count:
+        shard_count, max_concurrency = asyncio.run(fetch_gateway_limits(os.getenv('DISCORD_TOKEN', '')))
+    logger.info(f"Running {shard_count} shards on {min(workers, shard_count)} workers")
+
+    supervisor = ClusterSupervisor(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')],
+        shard_count, workers, stats_dir=os.getenv('CLUSTER_STATS_DIR', 'data/cluster'),
+        max_concurrency=max_concurrency
+    )
+    try:
+        asyncio.run(supervisor.run())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
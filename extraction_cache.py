@@ -0,0 +1,73 @@
+import logging
+import re
+from cache import Cache
+from utils import extract_video_id, is_url
+
+logger = logging.getLogger(__name__)
+
+class ExtractionCache:
+    """Process-wide cache of yt-dlp extraction results shared by every guild"""
+
+    def __init__(self, backend=None, ttl=6 * 3600, negative_ttl=300):
+        self.cache = Cache(backend, ttl=ttl)
+        self.negative_ttl = negative_ttl
+        self.listeners = []
+
+    def normalize_query(self, query):
+        """Normalize search text so equivalent searches share a key; never used for URLs"""
+        query = re.sub(r'\s+', ' ', query.strip()).casefold()
+        if query.startswith('ytsearch:'):
+            query = query[len('ytsearch:'):].strip()
+        return query
+
+    def key_for(self, query):
+        """Get the cache key for a query, preferring the video ID"""
+        query = query.strip()
+        video_id = extract_video_id(query)
+        if video_id:
+            return f"id:{video_id}"
+        if is_url(query):
+            # Video IDs and most URL paths are case-sensitive, so other URLs are only equal when identical
+            return f"url:{query}"
+        return f"q:{self.normalize_query(query)}"
+
+    def add_listener(self, callback):
+        """Register a callback invoked with each successful extraction stored"""
+        self.listeners.append(callback)
+
+    def get(self, query):
+        """Return (found, song_info); a found None is a cached failure"""
+        found, song_info = self.cache.lookup(self.key_for(query))
+        if found and song_info is not None:
+            song_info = dict(song_info)
+        return found, song_info
+
+    def set(self, query, song_info):
+        """Cache a successful extraction under the query and its video ID"""
+        song_info = dict(song_info)
+        self.cache.set(self.key_for(query), song_info)
+
+        video_id = extract_video_id(song_info.get('webpage_url') or '')
+        if video_id:
+            self.cache.set(f"id:{video_id}", song_info)
+        for listener in self.listeners:
+            listener(song_info)
+
+    def recent(self, limit):
+        """Get up to limit cached extractions, most recently used first"""
+        seen = set()
+        results = []
+        for key, song_info in self.cache.recent(limit * 2):
+            # Each result is stored under its query and its video ID
+            if song_info and song_info.get('webpage_url') not in seen:
+                seen.add(song_info.get('webpage_url'))
+                results.append(song_info)
+        return results[:limit]
+
+    def set_failure(self, query):
+        """Remember that a query produced no result"""
+        self.cache.set(self.key_for(query), None, ttl=self.negative_ttl)
+
+    def stats(self):
+        """Get hit/miss counters for the cache"""
+        return self.cache.stats()
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import time
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, most urgent first
+PRIORITY_STREAM = 0    # Resolving a stream URL at play time
+PRIORITY_SEARCH = 1    # A user waiting on a single track search
+PRIORITY_BULK = 2      # Playlist ingestion
+
+PRIORITY_NAMES = {
+    PRIORITY_STREAM: 'stream',
+    PRIORITY_SEARCH: 'search',
+    PRIORITY_BULK: 'bulk'
+}
+
+class ExtractionJob:
+    """A queued call waiting for an extraction worker"""
+
+    __slots__ = ('func', 'args', 'future', 'priority', 'guild_id', 'queued_at')
+
+    def __init__(self, func, args, future, priority, guild_id):
+        self.func = func
+        self.args = args
+        self.future = future
+        self.priority = priority
+        self.guild_id = guild_id
+        self.queued_at = time.monotonic()
+
+
+class ExtractionScheduler:
+    """Runs blocking yt-dlp work on a dedicated pool with priorities and per-guild fair share.
+
+    Within a priority class guilds are served round-robin, so one guild
+    ingesting a long playlist cannot starve another guild's requests.
+    Process workers require picklable callables (module-level functions).
+    """
+
+    def __init__(self, workers=4, mode='thread'):
+        self.workers = max(1, workers)
+        self.mode = mode
+        if mode == 'process':
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='extract')
+
+        # priority -> guild_id -> deque of jobs; the OrderedDict is the round-robin order
+        self.pending = {priority: OrderedDict() for priority in PRIORITY_NAMES}
+        self.depth = {priority: 0 for priority in PRIORITY_NAMES}
+        self.running = 0
+
+        self.started = {priority: 0 for priority in PRIORITY_NAMES}
+        self.completed = {priority: 0 for priority in PRIORITY_NAMES}
+        self.wait_total = {priority: 0.0 for priority in PRIORITY_NAMES}
+        self.wait_max = {priority: 0.0 for priority in PRIORITY_NAMES}
+
+    async def run(self, func, *args, priority=PRIORITY_SEARCH, guild_id=None):
+        """Run func(*args) on an extraction worker once it is this job's turn"""
+        loop = asyncio.get_running_loop()
+        job = ExtractionJob(func, args, loop.create_future(), priority, guild_id)
+
+        guild_jobs = self.pending[priority].setdefault(guild_id, deque())
+        guild_jobs.append(job)
+        self.depth[priority] += 1
+        self.dispatch()
+
+        return await job.future
+
+    def next_job(self):
+        """Pop the next job: highest priority first, then round-robin across guilds"""
+        for priority in sorted(self.pending):
+            guilds = self.pending[priority]
+            while guilds:
+                guild_id, jobs = next(iter(guilds.items()))
+                job = jobs.popleft()
+                if jobs:
+                    guilds.move_to_end(guild_id)
+                else:
+                    del guilds[guild_id]
+                self.depth[priority] -= 1
+
+                if job.future.cancelled():
+                    continue
+                return job
+        return None
+
+    def dispatch(self):
+        """Start queued jobs while worker slots are free"""
+        while self.running < self.workers:
+            job = self.next_job()
+            if job is None:
+                return
+
+            waited = time.monotonic() - job.queued_at
+            self.started[job.priority] += 1
+            self.wait_total[job.priority] += waited
+            self.wait_max[job.priority] = max(self.wait_max[job.priority], waited)
+
+            self.running += 1
+            loop = asyncio.get_running_loop()
+            task = loop.run_in_executor(self.executor, job.func, *job.args)
+            task.add_done_callback(lambda done, job=job: self.finish(job, done))
+
+    def finish(self, job, done):
+        """Hand a worker result back to the waiting coroutine and start the next job"""
+        self.running -= 1
+        self.completed[job.priority] += 1
+
+        if not job.future.cancelled():
+            if done.cancelled():
+                job.future.cancel()
+            elif done.exception() is not None:
+                job.future.set_exception(done.exception())
+            else:
+                job.future.set_result(done.result())
+
+        self.dispatch()
+
+    def stats(self):
+        """Get queue depth and wait-time metrics per priority class"""
+        return {
+            'workers': self.workers,
+            'mode': self.mode,
+            'running': self.running,
+            'classes': {
+                name: {
+                    'queued': self.depth[priority],
+                    'completed': self.completed[priority],
+                    'avg_wait': self.wait_total[priority] / self.started[priority] if self.started[priority] else 0.0,
+                    'max_wait': self.wait_max[priority]
+                }
+                for priority, name in PRIORITY_NAMES.items()
+            }
+        }
+
+    def shutdown(self):
+        """Stop the worker pool"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
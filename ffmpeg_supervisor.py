@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import deque
+import discord
+
+logger = logging.getLogger(__name__)
+
+class FFmpegSupervisor:
+    """Tracks every ffmpeg process behind an audio source and caps how many run at once.
+
+    Sources are opened through open(), which waits for a free slot when the
+    cap is reached and gives the slot back when the source is cleaned up.
+    Spawned processes are reniced and pinned to the configured CPUs, and a
+    periodic reap() kills processes whose source disappeared without cleanup.
+    """
+
+    def __init__(self, max_processes=64, niceness=None, cpu_affinity=None):
+        self.max_processes = max(1, max_processes)
+        self.niceness = niceness  # Absolute nice value for ffmpeg, None leaves it unchanged
+        self.cpu_affinity = set(cpu_affinity) if cpu_affinity else None
+        self.lock = threading.Lock()
+        self.loop = None
+        self.in_use = 0  # Slots held by open sources or being opened
+        self.waiters = deque()
+        self.processes = {}  # PID -> {'process', 'source', 'started_at'}
+
+        self.spawned = 0
+        self.failed = 0
+        self.restarted = 0
+        self.reaped = 0
+        self.peak = 0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    async def acquire(self):
+        """Wait for a free process slot"""
+        self.loop = asyncio.get_running_loop()
+        with self.lock:
+            if self.in_use < self.max_processes and not self.waiters:
+                self.in_use += 1
+                return
+            future = self.loop.create_future()
+            self.waiters.append(future)
+
+        logger.info(f"ffmpeg process limit reached ({self.max_processes}), waiting for a slot")
+        start = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self.lock:
+                if future in self.waiters:
+                    self.waiters.remove(future)
+            raise
+        self.waits += 1
+        self.wait_time += time.monotonic() - start
+
+    def release(self):
+        """Give a slot back, handing it to the oldest waiter if there is one. Thread-safe."""
+        with self.lock:
+            if self.waiters:
+                future = self.waiters.popleft()
+                self.loop.call_soon_threadsafe(self.wake, future)
+                return
+            self.in_use -= 1
+
+    def wake(self, future):
+        """Pass a released slot to a waiter, or on if that waiter gave up meanwhile"""
+        if future.done():
+            self.release()
+        else:
+            future.set_result(None)
+
+    async def open(self, factory):
+        """Build an audio source once a slot is free; the slot is held until its cleanup"""
+        await self.acquire()
+        try:
+            source = factory()
+        except Exception:
+            self.release()
+            raise
+        # Volume and DSP wrappers keep the ffmpeg source in .original
+        process = getattr(getattr(source, 'original', source), '_process', None)
+        with self.lock:
+            entry = self.processes.get(getattr(process, 'pid', None))
+            if entry:
+                entry['holds_slot'] = True
+        if not entry:
+            self.release()  # Not a supervised source, nothing will give the slot back
+        return source
+
+    def register(self, process, source):
+        """Track a freshly spawned process and apply scheduling settings to it"""
+        if self.niceness is not None and hasattr(os, 'setpriority'):
+            try:
+                os.setpriority(os.PRIO_PROCESS, process.pid, self.niceness)
+            except OSError as e:
+                logger.debug(f"Could not renice ffmpeg {process.pid}: {e}")
+        if self.cpu_affinity and hasattr(os, 'sched_setaffinity'):
+            try:
+                os.sched_setaffinity(process.pid, self.cpu_affinity)
+            except OSError as e:
+                logger.debug(f"Could not pin ffmpeg {process.pid}: {e}")
+
+        with self.lock:
+            self.processes[process.pid] = {
+                'process': process,
+                'source': weakref.ref(source),
+                'started_at': time.monotonic(),
+                'holds_slot': False
+            }
+            self.spawned += 1
+            self.peak = max(self.peak, len(self.processes))
+
+    def unregister(self, process, failed=False):
+        """Stop tracking a process whose source was cleaned up"""
+        with self.lock:
+            entry = self.processes.pop(process.pid, None)
+            if entry and failed:
+                self.failed += 1
+        if entry and entry['holds_slot']:
+            self.release()
+
+    def record_restart(self):
+        """Count a stream that was restarted after its ffmpeg process failed"""
+        self.restarted += 1
+
+    def reap(self):
+        """Collect exited processes and kill orphans whose source is gone"""
+        with self.lock:
+            entries = list(self.processes.items())
+
+        for pid, entry in entries:
+            process = entry['process']
+            # poll() also collects the exit status, so no zombie lingers
+            exited = process.poll() is not None
+            if entry['source']() is not None:
+                continue
+
+            if not exited:
+                logger.warning(f"Killing orphaned ffmpeg process {pid}")
+                try:
+                    process.kill()
+                    process.wait(timeout=5)
+                except Exception as e:
+                    logger.error(f"Failed to kill ffmpeg process {pid}: {e}")
+            with self.lock:
+                entry = self.processes.pop(pid, None)
+                if entry:
+                    self.reaped += 1
+            if entry and entry['holds_slot']:
+                self.release()
+
+    async def run_reaper(self, interval=30):
+        """Reap periodically until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            self.reap()
+
+    def stats(self):
+        """Get process counts for the supervisor"""
+        with self.lock:
+            return {
+                'live': len(self.processes),
+                'max': self.max_processes,
+                'queued': len(self.waiters),
+                'peak': self.peak,
+                'spawned': self.spawned,
+                'failed': self.failed,
+                'restarted': self.restarted,
+                'reaped': self.reaped,
+                'waits': self.waits,
+                'avg_wait': self.wait_time / self.waits if self.waits else 0.0
+            }
+
+
+class SupervisedFFmpegMixin:
+    """Registers an FFmpegAudio's process with a supervisor for its whole lifetime"""
+
+    def __init__(self, *args, supervisor=None, **kwargs):
+        # Set before the base constructor, which spawns the process
+        self.supervisor = supervisor or get_supervisor()
+        super().__init__(*args, **kwargs)
+
+    def _spawn_process(self, args, **subprocess_kwargs):
+        process = super()._spawn_process(args, **subprocess_kwargs)
+        self.supervisor.register(process, self)
+        return process
+
+    def cleanup(self):
+        process = getattr(self, '_process', None)
+        # Cleanup marks the source stopped, after which an exit code is no longer treated as a failure
+        check = getattr(self, '_check_process_returncode', None)
+        if check and process:
+            check()
+        super().cleanup()
+        failed = getattr(self, '_current_error', None) is not None
+        if process and hasattr(process, 'pid'):
+            self.supervisor.unregister(process, failed=failed)
+
+
+class SupervisedPCMAudio(SupervisedFFmpegMixin, discord.FFmpegPCMAudio):
+    """FFmpegPCMAudio whose process is tracked by the supervisor"""
+
+
+class SupervisedOpusAudio(SupervisedFFmpegMixin, discord.FFmpegOpusAudio):
+    """FFmpegOpusAudio whose process is tracked by the supervisor"""
+
+
+_supervisor = None
+_supervisor_lock = threading.Lock()
+
+def configure_supervisor(max_processes=64, niceness=None, cpu_affinity=None):
+    """Create the process-wide supervisor"""
+    global _supervisor
+    with _supervisor_lock:
+        _supervisor = FFmpegSupervisor(max_processes=max_processes, niceness=niceness, cpu_affinity=cpu_affinity)
+    return _supervisor
+
+def get_supervisor():
+    """Get the process-wide supervisor, creating a default one on first use"""
+    global _supervisor
+    if _supervisor is None:
+        with _supervisor_lock:
+            if _supervisor is None:
+                _supervisor = FFmpegSupervisor()
+    return _supervisor
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import logging
+import time
+import zlib
+from collections import OrderedDict
+from track import Track
+
+logger = logging.getLogger(__name__)
+
+class GuildState:
+    """Everything kept in memory for one guild"""
+
+    __slots__ = ('player', 'queue_manager', 'prefetcher', 'ingestor', 'last_used')
+
+    def __init__(self, player, queue_manager, prefetcher, ingestor=None):
+        self.player = player
+        self.queue_manager = queue_manager
+        self.prefetcher = prefetcher
+        self.ingestor = ingestor
+        self.last_used = time.monotonic()
+
+    def is_idle(self):
+        """Check whether the guild has nothing that needs its state kept in memory"""
+        voice_client = self.player.voice_client
+        if voice_client and voice_client.is_connected():
+            return False
+        if self.ingestor and self.ingestor.is_running():
+            return False
+        return self.queue_manager.is_empty()
+
+
+class GuildRegistry:
+    """Per-guild state with least-recently-used eviction of idle guilds.
+
+    A guild is evicted once it has been idle (no voice connection, empty
+    queue, no playlist loading) for idle_timeout seconds, or sooner when
+    more than max_resident guilds are in memory. Settings and play history
+    that differ from a fresh guild are kept as a small compressed blob, and
+    the state is rebuilt by the factory the next time the guild is used.
+    """
+
+    def __init__(self, factory, idle_timeout=900, max_resident=1000, default_volume=1.0):
+        self.factory = factory  # factory(guild_id, restore_queue) -> GuildState
+        self.idle_timeout = idle_timeout
+        self.max_resident = max_resident
+        self.default_volume = default_volume
+        self.resident = OrderedDict()  # Guild ID -> GuildState, least recently used first
+        self.evicted = {}  # Guild ID -> compressed settings, or None when there was nothing to keep
+
+        self.evictions = 0
+        self.rehydrations = 0
+
+    def __contains__(self, guild_id):
+        return guild_id in self.resident
+
+    def peek(self, guild_id):
+        """Get a resident guild's state without creating or touching it"""
+        return self.resident.get(guild_id)
+
+    def get(self, guild_id):
+        """Get a guild's state, rebuilding it if it was evicted or never created"""
+        state = self.resident.get(guild_id)
+        if state:
+            self.resident.move_to_end(guild_id)
+            state.last_used = time.monotonic()
+            return state
+
+        # An evicted queue was empty, so there is nothing in the journal to restore
+        was_evicted = guild_id in self.evicted
+        saved = self.evicted.pop(guild_id, None)
+        state = self.factory(guild_id, not was_evicted)
+        self.resident[guild_id] = state
+        if was_evicted:
+            self.rehydrations += 1
+            if saved:
+                self.apply(state, saved)
+        return state
+
+    def remove(self, guild_id):
+        """Forget a guild entirely; returns its resident state, if any"""
+        self.evicted.pop(guild_id, None)
+        return self.resident.pop(guild_id, None)
+
+    def save(self, state):
+        """Serialize what a fresh state would not have, or None"""
+        saved = {}
+        processor = state.player.audio_processor
+        if processor.volume != self.default_volume:
+            saved['volume'] = processor.volume
+        if processor.bass_boost:
+            saved['bass_boost'] = processor.bass_boost
+        history = state.queue_manager.get_history()
+        if history:
+            saved['history'] = [Track.from_dict(song).to_dict() for song in history]
+        if not saved:
+            return None
+        return zlib.compress(json.dumps(saved, separators=(',', ':')).encode())
+
+    def apply(self, state, saved):
+        """Restore serialized settings onto a rebuilt state"""
+        saved = json.loads(zlib.decompress(saved))
+        processor = state.player.audio_processor
+        if 'volume' in saved:
+            processor.set_volume(saved['volume'])
+            processor.reset()
+        if 'bass_boost' in saved:
+            processor.set_bass_boost(saved['bass_boost'])
+        state.queue_manager.history.extend(Track.from_dict(song) for song in saved.get('history', ()))
+
+    def release(self, guild_id):
+        """Evict a guild now if it is resident and idle; returns True if it was evicted"""
+        state = self.resident.get(guild_id)
+        if state is None or not state.is_idle():
+            return False
+        self.evict(guild_id)
+        return True
+
+    def evict(self, guild_id):
+        """Drop an idle guild's state, keeping only its serialized settings"""
+        state = self.resident.pop(guild_id)
+        state.prefetcher.cancel()
+        self.evicted[guild_id] = self.save(state)
+        self.evictions += 1
+
+    def sweep(self):
+        """Evict guilds idle past the timeout, then the least recently used idle ones over the cap"""
+        now = time.monotonic()
+        overflow = len(self.resident) - self.max_resident
+        evicted = 0
+        for guild_id, state in list(self.resident.items()):
+            expired = now - state.last_used >= self.idle_timeout
+            if (expired or evicted < overflow) and state.is_idle():
+                self.evict(guild_id)
+                evicted += 1
+        if evicted:
+            logger.info(f"Evicted {evicted} idle guilds ({len(self.resident)} resident, {len(self.evicted)} evicted)")
+        return evicted
+
+    async def run_sweeper(self, interval=60):
+        """Sweep periodically until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            self.sweep()
+
+    def stats(self):
+        """Get resident and evicted guild counts"""
+        saved = [blob for blob in self.evicted.values() if blob]
+        return {
+            'resident': len(self.resident),
+            'evicted': len(self.evicted),
+            'evicted_with_state': len(saved),
+            'evicted_bytes': sum(len(blob) for blob in saved),
+            'evictions': self.evictions,
+            'rehydrations': self.rehydrations
+        }
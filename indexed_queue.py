@@ -0,0 +1,223 @@
+import bisect
+import itertools
+import random
+
+class IndexedQueue:
+    """Positional sequence stored as a list of blocks with a Fenwick tree over block sizes.
+
+    Finding the block for a position takes O(log b) for b blocks and the work
+    inside a block is bounded by its load, so indexed access, insert, remove
+    and move stay cheap at any position. Bulk appends and range removals
+    touch each block once and rebuild the tree once.
+    """
+
+    def __init__(self, items=(), load=512):
+        self.load = load
+        self.blocks = []
+        self.tree = [0]  # 1-based Fenwick tree of block lengths
+        self.size = 0
+        if items:
+            self.extend(items)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.blocks)
+
+    def rebuild_tree(self):
+        """Recompute the Fenwick tree after blocks were added or removed"""
+        tree = [0] + [len(block) for block in self.blocks]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def tree_add(self, block_index, delta):
+        """Adjust one block's length in the tree"""
+        i = block_index + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def locate(self, index):
+        """Map a position to (block index, offset within the block)"""
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("queue index out of range")
+
+        position = 0
+        step = 1 << (len(self.blocks).bit_length() - 1)
+        while step:
+            following = position + step
+            if following < len(self.tree) and self.tree[following] <= index:
+                position = following
+                index -= self.tree[following]
+            step >>= 1
+        return position, index
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.size)
+            if step != 1:
+                return list(self)[index]
+            return self.slice(start, stop)
+        block, offset = self.locate(index)
+        return self.blocks[block][offset]
+
+    def __setitem__(self, index, item):
+        block, offset = self.locate(index)
+        self.blocks[block][offset] = item
+
+    def slice(self, start, stop):
+        """Get the items in [start, stop) without walking the blocks before start"""
+        stop = min(stop, self.size)
+        if start >= stop:
+            return []
+        block, offset = self.locate(start)
+        return list(itertools.islice(
+            itertools.chain(self.blocks[block][offset:], itertools.chain.from_iterable(self.blocks[block + 1:])),
+            stop - start
+        ))
+
+    def append(self, item):
+        """Add an item at the end"""
+        if self.blocks and len(self.blocks[-1]) < self.load:
+            self.blocks[-1].append(item)
+            self.tree_add(len(self.blocks) - 1, 1)
+        else:
+            self.blocks.append([item])
+            self.rebuild_tree()
+        self.size += 1
+
+    def extend(self, items):
+        """Add many items at the end, rebuilding the tree once"""
+        items = list(items)
+        if not items:
+            return
+        position = 0
+        if self.blocks and len(self.blocks[-1]) < self.load:
+            position = self.load - len(self.blocks[-1])
+            self.blocks[-1].extend(items[:position])
+        for start in range(position, len(items), self.load):
+            self.blocks.append(items[start:start + self.load])
+        self.size += len(items)
+        self.rebuild_tree()
+
+    def insert(self, index, item):
+        """Insert an item before a position"""
+        if index < 0:
+            index = max(0, index + self.size)
+        if index >= self.size:
+            self.append(item)
+            return
+
+        block, offset = self.locate(index)
+        self.blocks[block].insert(offset, item)
+        self.size += 1
+        if len(self.blocks[block]) > 2 * self.load:
+            # Split oversized blocks so inserts stay bounded by the load
+            half = len(self.blocks[block]) // 2
+            self.blocks[block:block + 1] = [self.blocks[block][:half], self.blocks[block][half:]]
+            self.rebuild_tree()
+        else:
+            self.tree_add(block, 1)
+
+    def pop(self, index=-1):
+        """Remove and return the item at a position"""
+        block, offset = self.locate(index)
+        item = self.blocks[block].pop(offset)
+        self.size -= 1
+
+        following = block + 1
+        if not self.blocks[block]:
+            del self.blocks[block]
+            self.rebuild_tree()
+        elif following < len(self.blocks) and len(self.blocks[block]) + len(self.blocks[following]) <= self.load // 2:
+            # Merge small neighbours so the block count tracks the size
+            self.blocks[block].extend(self.blocks.pop(following))
+            self.rebuild_tree()
+        else:
+            self.tree_add(block, -1)
+        return item
+
+    def popleft(self):
+        """Remove and return the first item"""
+        return self.pop(0)
+
+    def __delitem__(self, index):
+        self.pop(index)
+
+    def move(self, from_index, to_index):
+        """Move an item to another position"""
+        self.insert(to_index, self.pop(from_index))
+
+    def remove_range(self, start, stop):
+        """Remove and return the items in [start, stop)"""
+        stop = min(stop, self.size)
+        if start >= stop:
+            return []
+
+        block, offset = self.locate(start)
+        removed = []
+        remaining = stop - start
+        while remaining:
+            items = self.blocks[block]
+            taken = items[offset:offset + remaining]
+            del items[offset:offset + remaining]
+            removed.extend(taken)
+            remaining -= len(taken)
+            if items:
+                block += 1
+            else:
+                del self.blocks[block]
+            offset = 0
+        self.size -= len(removed)
+        self.rebuild_tree()
+        return removed
+
+    def remove_if(self, predicate):
+        """Remove and return every item matching a predicate in one pass"""
+        removed = []
+        for block in self.blocks:
+            kept = []
+            for item in block:
+                (removed if predicate(item) else kept).append(item)
+            block[:] = kept
+        if removed:
+            self.blocks = [block for block in self.blocks if block]
+            self.size -= len(removed)
+            self.rebuild_tree()
+        return removed
+
+    def shuffle(self, rng=random):
+        """Shuffle the items across the existing blocks, which keep their sizes.
+
+        A Fisher-Yates pass that only draws rng.randrange, so a seeded rng
+        always gives the same order without copying the items. The queue
+        journal replays shuffles through this method for that reason.
+        """
+        starts = list(itertools.accumulate((len(block) for block in self.blocks), initial=0))
+        blocks = self.blocks
+        randrange = rng.randrange
+        locate = bisect.bisect_right
+        i = self.size - 1
+        for block_index in range(len(blocks) - 1, -1, -1):
+            block = blocks[block_index]
+            for offset in range(len(block) - 1, -1, -1):
+                if not i:
+                    return
+                j = randrange(i + 1)
+                other_index = locate(starts, j) - 1
+                other = blocks[other_index]
+                other_offset = j - starts[other_index]
+                block[offset], other[other_offset] = other[other_offset], block[offset]
+                i -= 1
+
+    def clear(self):
+        """Remove every item"""
+        self.blocks = []
+        self.tree = [0]
+        self.size = 0
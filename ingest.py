@@ -0,0 +1,60 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class PlaylistIngestor:
+    """Streams playlist entries into a guild's queue in the background.
+
+    Batches of entries are appended as the source produces them, so playback
+    can start on the first batch while later pages are still loading.
+    Ingestion is cancelled by stop().
+    """
+
+    def __init__(self, queue_manager):
+        self.queue_manager = queue_manager
+        self.tasks = set()
+
+    def start(self, entries, on_first=None, on_done=None, requested_by=None):
+        """Start consuming an async iterator of song entry batches"""
+        task = asyncio.get_event_loop().create_task(self.run(entries, on_first, on_done, requested_by))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def run(self, entries, on_first, on_done, requested_by=None):
+        """Append entries to the queue until the source is exhausted or cancelled"""
+        started_at = time.monotonic()
+        added = 0
+        error = None
+        try:
+            async for batch in entries:
+                first = not added
+                self.queue_manager.add_songs(batch, requested_by=requested_by)
+                added += len(batch)
+                if first and added:
+                    logger.info(f"First playlist entry queued after {time.monotonic() - started_at:.2f}s")
+                    if on_first:
+                        await on_first()
+        except asyncio.CancelledError:
+            logger.info(f"Playlist ingestion cancelled after {added} entries")
+            raise
+        except Exception as e:
+            logger.error(f"Playlist ingestion failed after {added} entries: {e}")
+            error = e
+        finally:
+            await entries.aclose()
+
+        if on_done:
+            await on_done(added, error)
+
+    def is_running(self):
+        """Check whether any ingestion is still in progress"""
+        return bool(self.tasks)
+
+    def stop(self):
+        """Cancel every running ingestion"""
+        for task in list(self.tasks):
+            task.cancel()
+        self.tasks.clear()
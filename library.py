@@ -0,0 +1,457 @@
+import array
+import asyncio
+import bisect
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import time
+from suggestions import words_of
+from track import Track
+
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = ('.mp3', '.flac', '.ogg', '.opus', '.m4a', '.wav')
+
+# MPEG audio layer III bitrates in kbit/s by bitrate index, for MPEG-1 and MPEG-2/2.5
+MP3_BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+}
+MP3_SAMPLE_RATES = (44100, 48000, 32000)
+
+def read_text_frame(data):
+    """Decode an ID3v2 text frame body"""
+    encoding = data[:1]
+    body = data[1:]
+    if encoding == b'\x01':
+        text = body.decode('utf-16', 'replace')
+    elif encoding == b'\x02':
+        text = body.decode('utf-16-be', 'replace')
+    elif encoding == b'\x03':
+        text = body.decode('utf-8', 'replace')
+    else:
+        text = body.decode('latin-1')
+    return text.split('\x00')[0].strip()
+
+def syncsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+def read_id3v2(f):
+    """Read title/artist/album/length from an ID3v2 tag; returns (tags, tag size)"""
+    header = f.read(10)
+    if len(header) < 10 or header[:3] != b'ID3':
+        return {}, 0
+    version, flags = header[3], header[5]
+    size = syncsafe(header[6:10])
+    data = f.read(size)
+    tags = {}
+    names = {'TIT2': 'title', 'TT2': 'title', 'TPE1': 'artist', 'TP1': 'artist',
+             'TALB': 'album', 'TAL': 'album', 'TLEN': 'length', 'TLE': 'length'}
+
+    position = 0
+    if flags & 0x40 and version >= 3:
+        # Extended header: its size includes itself in v2.4 but not in v2.3
+        position = syncsafe(data[:4]) if version == 4 else struct.unpack('>I', data[:4])[0] + 4
+    while position < len(data):
+        if version == 2:
+            frame_id = data[position:position + 3].decode('latin-1')
+            frame_size = int.from_bytes(data[position + 3:position + 6], 'big')
+            position += 6
+        else:
+            frame_id = data[position:position + 4].decode('latin-1')
+            raw_size = data[position + 4:position + 8]
+            if len(raw_size) < 4:
+                break
+            frame_size = syncsafe(raw_size) if version == 4 else struct.unpack('>I', raw_size)[0]
+            position += 10
+        if not frame_id.strip('\x00') or frame_size <= 0:
+            break  # Padding
+        if frame_id in names:
+            tags[names[frame_id]] = read_text_frame(data[position:position + frame_size])
+        position += frame_size
+    return tags, 10 + size
+
+def read_id3v1(f):
+    """Read the fixed-size ID3v1 tag at the end of the file, if any"""
+    try:
+        f.seek(-128, os.SEEK_END)
+    except OSError:
+        return {}
+    data = f.read(128)
+    if data[:3] != b'TAG':
+        return {}
+    field = lambda start: data[start:start + 30].split(b'\x00')[0].decode('latin-1').strip()
+    return {'title': field(3), 'artist': field(33), 'album': field(63)}
+
+def mp3_duration(f, offset, file_size):
+    """Get an MP3's duration from its Xing/Info header, or estimate it from a constant bitrate"""
+    f.seek(offset)
+    data = f.read(4096)
+    start = 0
+    while True:
+        start = data.find(b'\xff', start)
+        if start < 0 or start + 4 > len(data):
+            return 0
+        if data[start + 1] & 0xe0 == 0xe0:
+            break
+        start += 1
+
+    header = int.from_bytes(data[start:start + 4], 'big')
+    version_bits = (header >> 19) & 3  # 3 is MPEG-1, 2 MPEG-2, 0 MPEG-2.5
+    layer_bits = (header >> 17) & 3
+    bitrate_index = (header >> 12) & 15
+    rate_index = (header >> 10) & 3
+    mono = (header >> 6) & 3 == 3
+    if layer_bits != 1 or version_bits == 1 or rate_index == 3 or bitrate_index in (0, 15):
+        return 0  # Only layer III with a known bitrate is handled
+
+    mpeg1 = version_bits == 3
+    sample_rate = MP3_SAMPLE_RATES[rate_index] // (1 if mpeg1 else 2 if version_bits == 2 else 4)
+    samples_per_frame = 1152 if mpeg1 else 576
+
+    side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    xing = start + 4 + side_info
+    if data[xing:xing + 4] in (b'Xing', b'Info'):
+        flags = int.from_bytes(data[xing + 4:xing + 8], 'big')
+        if flags & 1:
+            frames = int.from_bytes(data[xing + 8:xing + 12], 'big')
+            return round(frames * samples_per_frame / sample_rate)
+
+    bitrate = MP3_BITRATES[1 if mpeg1 else 2][bitrate_index] * 1000
+    return round((file_size - offset - start) * 8 / bitrate)
+
+def read_vorbis_comment(data, position=0):
+    """Read TITLE/ARTIST/ALBUM from a Vorbis comment block"""
+    tags = {}
+    vendor_length = struct.unpack_from('<I', data, position)[0]
+    position += 4 + vendor_length
+    count = struct.unpack_from('<I', data, position)[0]
+    position += 4
+    for _ in range(min(count, 1000)):
+        length = struct.unpack_from('<I', data, position)[0]
+        position += 4
+        if length > len(data) - position:
+            break  # Spans into data that was not read (e.g. embedded cover art)
+        key, _, value = data[position:position + length].decode('utf-8', 'replace').partition('=')
+        position += length
+        key = key.lower()
+        if key in ('title', 'artist', 'album') and key not in tags:
+            tags[key] = value.strip()
+    return tags
+
+def read_flac(f):
+    """Read Vorbis comments and the duration from a FLAC file's metadata blocks"""
+    if f.read(4) != b'fLaC':
+        return {}
+    tags = {}
+    while True:
+        header = f.read(4)
+        if len(header) < 4:
+            break
+        last, kind = header[0] & 0x80, header[0] & 0x7f
+        length = int.from_bytes(header[1:4], 'big')
+        if kind == 0:
+            info = f.read(length)
+            packed = int.from_bytes(info[10:18], 'big')
+            sample_rate = packed >> 44
+            total_samples = packed & ((1 << 36) - 1)
+            if sample_rate:
+                tags['duration'] = round(total_samples / sample_rate)
+        elif kind == 4:
+            tags.update(read_vorbis_comment(f.read(length)))
+        else:
+            f.seek(length, os.SEEK_CUR)
+        if last:
+            break
+    return tags
+
+def read_ogg(f, file_size):
+    """Read Vorbis comments and the duration from an Ogg Vorbis or Opus file"""
+    data = f.read(65536)
+    tags = {}
+    sample_rate = 48000  # Opus granule positions always count 48 kHz samples
+    identification = data.find(b'\x01vorbis')
+    if identification >= 0:
+        sample_rate = struct.unpack_from('<I', data, identification + 12)[0] or 48000
+    for marker in (b'OpusTags', b'\x03vorbis'):
+        position = data.find(marker)
+        if position >= 0:
+            try:
+                tags = read_vorbis_comment(data, position + len(marker))
+            except struct.error:
+                pass
+            break
+
+    # The granule position of the last page is the total sample count
+    f.seek(max(0, file_size - 65536))
+    tail = f.read()
+    last_page = tail.rfind(b'OggS')
+    if last_page >= 0 and last_page + 14 <= len(tail):
+        granule = struct.unpack_from('<q', tail, last_page + 6)[0]
+        if granule > 0:
+            tags['duration'] = round(granule / sample_rate)
+    return tags
+
+def read_tags(path, file_size):
+    """Read title, artist, album and duration from an audio file, falling back to its name"""
+    tags = {}
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        with open(path, 'rb') as f:
+            if extension == '.mp3':
+                tags, tag_size = read_id3v2(f)
+                if not tags.get('title'):
+                    tags = {**read_id3v1(f), **{key: value for key, value in tags.items() if value}}
+                length = tags.pop('length', '')
+                tags['duration'] = int(length) // 1000 if length.isdigit() else mp3_duration(f, tag_size, file_size)
+            elif extension == '.flac':
+                tags = read_flac(f)
+            elif extension in ('.ogg', '.opus'):
+                tags = read_ogg(f, file_size)
+    except (OSError, ValueError, IndexError, struct.error) as e:
+        logger.debug(f"Could not read tags from {path}: {e}")
+
+    # Untagged files are often named "Artist - Title" inside an album folder
+    stem = os.path.splitext(os.path.basename(path))[0]
+    artist, _, title = stem.partition(' - ')
+    if not tags.get('title'):
+        tags['title'] = title if title else stem
+        if title and not tags.get('artist'):
+            tags['artist'] = artist
+    if not tags.get('album'):
+        tags['album'] = os.path.basename(os.path.dirname(path))
+    return tags
+
+
+class LibraryTrack:
+    """One file in the local music library"""
+
+    __slots__ = ('path', 'title', 'artist', 'album', 'duration')
+
+    def __init__(self, path, title, artist, album, duration):
+        self.path = path
+        self.title = title
+        self.artist = artist
+        self.album = album
+        self.duration = duration
+
+    def words(self):
+        return set(words_of(' '.join(filter(None, (self.title, self.artist, self.album)))))
+
+    def to_track(self):
+        """Get a queue entry that plays the file directly"""
+        title = f"{self.artist} - {self.title}" if self.artist else self.title
+        return Track(title, url=self.path, duration=self.duration, source='library')
+
+
+class MusicLibrary:
+    """Local music collection with a persisted inverted index for offline search.
+
+    scan() walks the directory tree and only reads tags from files whose
+    mtime or size changed since the last scan. Tracks and the inverted
+    index (word -> sorted track IDs over title, artist and album, plus
+    title-only and whole-title postings) are kept in SQLite so a restart
+    loads the index instead of rebuilding it. Searches intersect postings
+    in memory. A scan builds its changes on copies and swaps them in, so
+    searches never wait for indexing.
+    """
+
+    def __init__(self, root, index_path='cache/library.db'):
+        self.root = root
+        self.lock = threading.Lock()  # Held only to swap in or read the index references
+        self.tracks = {}  # Track ID -> LibraryTrack
+        self.files = {}  # Path -> (track ID, mtime, size)
+        # Term -> sorted array of track IDs. Words of any field are indexed as is, title words
+        # also as "t:word" and the whole title as "=words of title"
+        self.terms = {}
+        self.next_id = 1
+
+        self.scans = 0
+        self.searches = 0
+        self.last_scan = None  # (seconds, added, updated, removed)
+
+        directory = os.path.dirname(index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(index_path, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS tracks (id INTEGER PRIMARY KEY, path TEXT UNIQUE, mtime REAL, size INTEGER, '
+            'title TEXT, artist TEXT, album TEXT, duration INTEGER)'
+        )
+        self.db.execute('CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, ids BLOB)')
+        self.load()
+
+    def load(self):
+        """Read the persisted tracks and inverted index"""
+        for row in self.db.execute('SELECT id, path, mtime, size, title, artist, album, duration FROM tracks'):
+            track_id, path, mtime, size = row[:4]
+            self.tracks[track_id] = LibraryTrack(path, *row[4:])
+            self.files[path] = (track_id, mtime, size)
+            self.next_id = max(self.next_id, track_id + 1)
+        for term, ids in self.db.execute('SELECT term, ids FROM terms'):
+            postings = array.array('I')
+            postings.frombytes(ids)
+            self.terms[term] = postings
+        logger.info(f"Music library index has {len(self.tracks)} tracks")
+
+    def walk(self):
+        """Yield (path, mtime, size) for every audio file under the root"""
+        pending = [self.root]
+        while pending:
+            try:
+                entries = list(os.scandir(pending.pop()))
+            except OSError as e:
+                logger.warning(f"Cannot read library directory: {e}")
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.name.lower().endswith(AUDIO_EXTENSIONS):
+                    stat = entry.stat()
+                    yield entry.path, stat.st_mtime, stat.st_size
+
+    def scan(self):
+        """Index new and changed files and drop deleted ones; returns (added, updated, removed)"""
+        started = time.monotonic()
+        seen = set()
+        changed = []  # (path, mtime, size, tags)
+        for path, mtime, size in self.walk():
+            seen.add(path)
+            known = self.files.get(path)
+            if known and known[1] == mtime and known[2] == size:
+                continue
+            changed.append((path, mtime, size, read_tags(path, size)))
+        removed = [path for path in self.files if path not in seen]
+
+        # Searches keep using the current index while the changes are applied to copies;
+        # postings are copied the first time a scan touches them
+        tracks, files, terms = dict(self.tracks), dict(self.files), dict(self.terms)
+        touched = set()
+        added = 0
+        for path in removed:
+            track_id = files.pop(path)[0]
+            self.unindex(terms, track_id, tracks.pop(track_id), touched)
+        rows = []
+        for path, mtime, size, tags in changed:
+            known = files.get(path)
+            if known:
+                track_id = known[0]
+                self.unindex(terms, track_id, tracks[track_id], touched)
+            else:
+                track_id = self.next_id
+                self.next_id += 1
+                added += 1
+            track = LibraryTrack(path, tags['title'], tags.get('artist'), tags.get('album'), tags.get('duration', 0))
+            tracks[track_id] = track
+            files[path] = (track_id, mtime, size)
+            self.index(terms, track_id, track, touched)
+            rows.append((track_id, path, mtime, size, track.title, track.artist, track.album, track.duration))
+        term_rows = [(term, terms[term].tobytes()) for term in touched if term in terms]
+        dropped = [(term,) for term in touched if term not in terms]
+        with self.lock:
+            self.tracks, self.files, self.terms = tracks, files, terms
+
+        if changed or removed:
+            self.db.execute('BEGIN')
+            self.db.executemany('DELETE FROM tracks WHERE path = ?', [(path,) for path in removed])
+            self.db.executemany('INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            self.db.executemany('INSERT OR REPLACE INTO terms VALUES (?, ?)', term_rows)
+            self.db.executemany('DELETE FROM terms WHERE term = ?', dropped)
+            self.db.execute('COMMIT')
+
+        self.scans += 1
+        updated = len(changed) - added
+        self.last_scan = (time.monotonic() - started, added, updated, len(removed))
+        if changed or removed:
+            logger.info(f"Music library scan: {added} added, {updated} updated, {len(removed)} removed "
+                        f"({len(self.tracks)} tracks, {self.last_scan[0]:.1f}s)")
+        return added, updated, len(removed)
+
+    def terms_for(self, track):
+        title = words_of(track.title)
+        return track.words() | {f"t:{word}" for word in title} | {'=' + ' '.join(title)}
+
+    def postings_copy(self, terms, term, touched):
+        """Get a term's postings in a scan's copy of the index, copying them on first use"""
+        postings = terms.get(term)
+        if term not in touched or postings is None:
+            touched.add(term)
+            postings = terms[term] = array.array('I', postings or ())
+        return postings
+
+    def index(self, terms, track_id, track, touched):
+        """Add a track to the postings of its terms in a scan's copy of the index"""
+        for term in self.terms_for(track):
+            postings = self.postings_copy(terms, term, touched)
+            if not postings or postings[-1] < track_id:
+                postings.append(track_id)
+            else:
+                postings.insert(bisect.bisect_left(postings, track_id), track_id)
+
+    def unindex(self, terms, track_id, track, touched):
+        """Remove a track from the postings of its terms in a scan's copy of the index"""
+        for term in self.terms_for(track):
+            if term not in terms:
+                continue
+            postings = self.postings_copy(terms, term, touched)
+            position = bisect.bisect_left(postings, track_id)
+            if position < len(postings) and postings[position] == track_id:
+                del postings[position]
+            if not postings:
+                del terms[term]
+
+    def intersect(self, index, terms, limit):
+        """Get up to limit track IDs present in the postings of every term"""
+        postings = [index.get(term) for term in terms]
+        if not all(postings):
+            return []
+        postings.sort(key=len)
+        matches = []
+        for track_id in postings[0]:
+            for other in postings[1:]:
+                position = bisect.bisect_left(other, track_id)
+                if position == len(other) or other[position] != track_id:
+                    break
+            else:
+                matches.append(track_id)
+                if len(matches) == limit:
+                    break
+        return matches
+
+    def search(self, query, limit=5):
+        """Find tracks containing every word of the query: exact titles, then title matches, then any field"""
+        words = words_of(query)
+        if not words:
+            return []
+        self.searches += 1
+        with self.lock:
+            index, tracks = self.terms, self.tracks  # Scans replace these rather than change them
+        matches = list(index.get('=' + ' '.join(words), ())[:limit])
+        for terms in ([f"t:{word}" for word in set(words)], set(words)):
+            if len(matches) >= limit:
+                break
+            matches += [track_id for track_id in self.intersect(index, terms, limit) if track_id not in matches]
+        return [tracks[track_id] for track_id in matches[:limit]]
+
+    async def run_scanner(self, interval=3600):
+        """Scan in a worker thread now and then every interval seconds, until cancelled"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.scan)
+            except Exception as e:
+                logger.error(f"Music library scan failed: {e}")
+            await asyncio.sleep(interval)
+
+    def stats(self):
+        """Get index size and scan counters"""
+        return {
+            'tracks': len(self.tracks),
+            'terms': len(self.terms),
+            'scans': self.scans,
+            'searches': self.searches,
+            'last_scan': self.last_scan
+        }
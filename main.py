@@ -4,9 +4,32 @@ from discord import app_commands
 import os
 import asyncio
 import logging
+import math
+import time
 from music_player import MusicPlayer
 from queue_manager import QueueManager
+from queue_journal import QueueJournal
+from track import Track, is_local_file
 from spotify_handler import SpotifyHandler
+from cache import create_cache_backend
+from extraction_cache import ExtractionCache
+from spotify_cache import SpotifyCache
+from spotify_matcher import SpotifyMatcher
+from stream_cache import StreamUrlCache
+from audio_cache import AudioCache
+from prefetcher import Prefetcher, TransitionStats
+from extraction_scheduler import ExtractionScheduler
+from ytdl_pool import configure_pool
+from ffmpeg_supervisor import configure_supervisor
+from playlist_resolver import PlaylistResolver, spotify_placeholder, iter_spotify_placeholders
+from ingest import PlaylistIngestor
+from guild_registry import GuildRegistry, GuildState
+from timer_wheel import TimerWheel
+from suggestions import SuggestionIndex
+from library import MusicLibrary
+from upload_store import UploadStore, UPLOAD_EXTENSIONS
+from cluster import ClusterBot, IdentifyGate, shard_for_guild, write_worker_stats, read_worker_stats
+from extraction_scheduler import PRIORITY_STREAM
 from utils import create_embed, is_url, extract_video_id
 
 # Load Opus library for Discord voice - Updated for deployment
@@ -48,48 +71,397 @@ DISCORD_TOKEN = os.getenv('DISCORD_TOKEN', 'your_discord_token_here')
 SPOTIFY_CLIENT_ID = os.getenv('SPOTIFY_CLIENT_ID', 'your_spotify_client_id')
 SPOTIFY_CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET', 'your_spotify_client_secret')
 
+# Extraction cache configuration ('memory' or 'sqlite')
+EXTRACTION_CACHE_BACKEND = os.getenv('EXTRACTION_CACHE_BACKEND', 'memory')
+EXTRACTION_CACHE_PATH = os.getenv('EXTRACTION_CACHE_PATH', 'cache/extraction.db')
+EXTRACTION_CACHE_SIZE = int(os.getenv('EXTRACTION_CACHE_SIZE', '5000'))
+EXTRACTION_CACHE_TTL = int(os.getenv('EXTRACTION_CACHE_TTL', '21600'))
+
+# Spotify metadata cache stored on local disk
+SPOTIFY_CACHE_PATH = os.getenv('SPOTIFY_CACHE_PATH', 'cache/spotify.db')
+SPOTIFY_CACHE_SIZE = int(os.getenv('SPOTIFY_CACHE_SIZE', '20000'))
+
+# Spotify -> YouTube matches stored by ISRC and track ID, so repeat plays skip the search
+SPOTIFY_MATCH_PATH = os.getenv('SPOTIFY_MATCH_PATH', 'cache/spotify_matches.db')
+SPOTIFY_MATCH_SIZE = int(os.getenv('SPOTIFY_MATCH_SIZE', '100000'))
+SPOTIFY_MATCH_CANDIDATES = int(os.getenv('SPOTIFY_MATCH_CANDIDATES', '5'))
+
+# Parallel YouTube lookups and time limit (seconds) when matching Spotify playlists ahead of playback
+SPOTIFY_RESOLVE_CONCURRENCY = int(os.getenv('SPOTIFY_RESOLVE_CONCURRENCY', '8'))
+SPOTIFY_RESOLVE_DEADLINE = float(os.getenv('SPOTIFY_RESOLVE_DEADLINE', '120'))
+
+# Dedicated yt-dlp workers shared by all guilds ('thread' or 'process')
+EXTRACTION_WORKERS = int(os.getenv('EXTRACTION_WORKERS', '4'))
+EXTRACTION_WORKER_MODE = os.getenv('EXTRACTION_WORKER_MODE', 'thread')
+
+# On-disk Opus cache of frequently played tracks
+AUDIO_CACHE_DIR = os.getenv('AUDIO_CACHE_DIR', 'cache/audio')
+AUDIO_CACHE_MAX_MB = int(os.getenv('AUDIO_CACHE_MAX_MB', '2048'))
+AUDIO_CACHE_MIN_PLAYS = int(os.getenv('AUDIO_CACHE_MIN_PLAYS', '2'))
+
+# 'passthrough' hands Opus from ffmpeg straight to Discord; 'pcm' decodes and scales volume in Python
+PLAYBACK_MODE = os.getenv('PLAYBACK_MODE', 'passthrough')
+DEFAULT_VOLUME = int(os.getenv('DEFAULT_VOLUME', '100'))  # Percent
+
+# Global cap and scheduling for ffmpeg processes (FFMPEG_CPUS is a comma-separated CPU list)
+FFMPEG_MAX_PROCESSES = int(os.getenv('FFMPEG_MAX_PROCESSES', '64'))
+FFMPEG_NICE = int(os.getenv('FFMPEG_NICE', '5'))
+FFMPEG_CPUS = [int(cpu) for cpu in os.getenv('FFMPEG_CPUS', '').split(',') if cpu.strip()]
+
+# Write-ahead journal that lets queues survive restarts (empty QUEUE_JOURNAL_DIR turns it off)
+QUEUE_JOURNAL_DIR = os.getenv('QUEUE_JOURNAL_DIR', 'data/queues')
+QUEUE_JOURNAL_COMMIT_MS = int(os.getenv('QUEUE_JOURNAL_COMMIT_MS', '50'))
+QUEUE_JOURNAL_SNAPSHOT_EVERY = int(os.getenv('QUEUE_JOURNAL_SNAPSHOT_EVERY', '1000'))
+
+# Idle guilds (no voice connection, empty queue) are dropped from memory and rebuilt on their next command
+GUILD_IDLE_TIMEOUT = int(os.getenv('GUILD_IDLE_TIMEOUT', '900'))
+GUILD_MAX_RESIDENT = int(os.getenv('GUILD_MAX_RESIDENT', '1000'))
+
+# Per-guild deadlines in seconds: leave after the queue runs dry or after a long pause,
+# and pause when everyone else has left the voice channel
+IDLE_DISCONNECT_DELAY = int(os.getenv('IDLE_DISCONNECT_DELAY', '60'))
+PAUSED_DISCONNECT_DELAY = int(os.getenv('PAUSED_DISCONNECT_DELAY', '600'))
+AUTO_PAUSE_DELAY = int(os.getenv('AUTO_PAUSE_DELAY', '30'))
+
+# Number of upcoming tracks to resolve while the current one plays
+PREFETCH_DEPTH = int(os.getenv('PREFETCH_DEPTH', '2'))
+
+# Tracks remembered for /play autocomplete, fed by play history and the extraction and Spotify caches
+SUGGESTION_INDEX_SIZE = int(os.getenv('SUGGESTION_INDEX_SIZE', '20000'))
+
+# Local music library searched before YouTube (empty LIBRARY_DIR turns it off); rescanned for changed files
+LIBRARY_DIR = os.getenv('LIBRARY_DIR', '')
+LIBRARY_INDEX_PATH = os.getenv('LIBRARY_INDEX_PATH', 'cache/library.db')
+LIBRARY_RESCAN_INTERVAL = int(os.getenv('LIBRARY_RESCAN_INTERVAL', '3600'))
+
+# Content-addressed store for uploaded files; unreferenced files are evicted beyond UPLOAD_CACHE_MAX_MB
+UPLOAD_DIR = os.getenv('UPLOAD_DIR', 'cache/uploads')
+UPLOAD_CACHE_MAX_MB = int(os.getenv('UPLOAD_CACHE_MAX_MB', '1024'))
+UPLOAD_MAX_FILE_MB = int(os.getenv('UPLOAD_MAX_FILE_MB', '50'))
+UPLOAD_PROBE_WORKERS = int(os.getenv('UPLOAD_PROBE_WORKERS', '2'))
+
+# Cluster mode: set by cluster.py for each worker process, which then only runs the listed shards
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0'))
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv('SHARD_IDS', '').split(',') if shard_id.strip()]
+CLUSTER_ID = os.getenv('CLUSTER_ID', '0')
+CLUSTER_STATS_DIR = os.getenv('CLUSTER_STATS_DIR', '')
+IDENTIFY_CONCURRENCY = int(os.getenv('IDENTIFY_CONCURRENCY', '1'))  # session_start_limit.max_concurrency
+CLUSTER_STATS_INTERVAL = int(os.getenv('CLUSTER_STATS_INTERVAL', '15'))
+
 # Bot setup
 intents = discord.Intents.default()
 intents.message_content = True
 intents.voice_states = True
-bot = commands.Bot(command_prefix='!', intents=intents)
+if SHARD_COUNT:
+    bot = ClusterBot(
+        command_prefix='!', intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS or None,
+        identify_gate=IdentifyGate(CLUSTER_STATS_DIR, IDENTIFY_CONCURRENCY) if CLUSTER_STATS_DIR else None
+    )
+else:
+    bot = commands.Bot(command_prefix='!', intents=intents)
+
+def owns_guild(guild_id):
+    """Check whether this process runs the shard a guild belongs to"""
+    return not SHARD_IDS or shard_for_guild(guild_id, SHARD_COUNT) in SHARD_IDS
 
 # Global managers
-queue_managers = {}  # Guild ID -> QueueManager
-music_players = {}   # Guild ID -> MusicPlayer
-spotify_handler = SpotifyHandler(SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET)
+spotify_cache = SpotifyCache(create_cache_backend('sqlite', SPOTIFY_CACHE_PATH, SPOTIFY_CACHE_SIZE))
+spotify_handler = SpotifyHandler(SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, cache=spotify_cache)
+spotify_matcher = SpotifyMatcher(
+    create_cache_backend('sqlite', SPOTIFY_MATCH_PATH, SPOTIFY_MATCH_SIZE), candidates=SPOTIFY_MATCH_CANDIDATES
+)
+extraction_cache = ExtractionCache(
+    create_cache_backend(EXTRACTION_CACHE_BACKEND, EXTRACTION_CACHE_PATH, EXTRACTION_CACHE_SIZE),
+    ttl=EXTRACTION_CACHE_TTL
+)
+stream_cache = StreamUrlCache()
+audio_cache = AudioCache(AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_MAX_MB * 1024 ** 2, min_plays=AUDIO_CACHE_MIN_PLAYS)
+extraction_scheduler = ExtractionScheduler(workers=EXTRACTION_WORKERS, mode=EXTRACTION_WORKER_MODE)
+ytdl_pool = configure_pool(size=EXTRACTION_WORKERS)
+ffmpeg_supervisor = configure_supervisor(
+    max_processes=FFMPEG_MAX_PROCESSES, niceness=FFMPEG_NICE, cpu_affinity=FFMPEG_CPUS
+)
+queue_journal = QueueJournal(
+    QUEUE_JOURNAL_DIR, commit_interval=QUEUE_JOURNAL_COMMIT_MS / 1000, snapshot_every=QUEUE_JOURNAL_SNAPSHOT_EVERY,
+    owns=owns_guild if SHARD_IDS else None
+) if QUEUE_JOURNAL_DIR else None
+timer_wheel = TimerWheel(tick=1.0)
+suggestions = SuggestionIndex(max_entries=SUGGESTION_INDEX_SIZE)
+music_library = MusicLibrary(LIBRARY_DIR, LIBRARY_INDEX_PATH) if LIBRARY_DIR else None
+upload_store = UploadStore(
+    UPLOAD_DIR, max_bytes=UPLOAD_CACHE_MAX_MB * 1024 ** 2, max_file_bytes=UPLOAD_MAX_FILE_MB * 1024 ** 2,
+    probe_workers=UPLOAD_PROBE_WORKERS
+)
+reaper_task = None
+sweeper_task = None
+timer_task = None
+stats_task = None
+library_task = None
+transition_stats = TransitionStats()
 
 @bot.event
 async def on_ready():
+    global reaper_task, sweeper_task, timer_task, stats_task, library_task
     logger.info(f'{bot.user} has connected to Discord!')
-    try:
-        synced = await bot.tree.sync()
-        logger.info(f"Synced {len(synced)} slash command(s)")
-    except Exception as e:
-        logger.error(f"Failed to sync slash commands: {e}")
+    if reaper_task is None:
+        reaper_task = asyncio.create_task(ffmpeg_supervisor.run_reaper())
+    if sweeper_task is None:
+        sweeper_task = asyncio.create_task(guild_registry.run_sweeper())
+    if timer_task is None:
+        timer_task = asyncio.create_task(timer_wheel.run())
+    if library_task is None and music_library:
+        library_task = asyncio.create_task(music_library.run_scanner(LIBRARY_RESCAN_INTERVAL))
+    if stats_task is None and CLUSTER_STATS_DIR:
+        stats_task = asyncio.create_task(report_worker_stats())
+    # Slash commands are global, so in a cluster only the worker running shard 0 syncs them
+    if not SHARD_IDS or 0 in SHARD_IDS:
+        try:
+            synced = await bot.tree.sync()
+            logger.info(f"Synced {len(synced)} slash command(s)")
+        except Exception as e:
+            logger.error(f"Failed to sync slash commands: {e}")
     await bot.change_presence(activity=discord.Game(name="!commands for help"))
 
 @bot.event
 async def on_guild_remove(guild):
     """Clean up when bot is removed from a guild"""
     guild_id = guild.id
-    if guild_id in queue_managers:
-        del queue_managers[guild_id]
-    if guild_id in music_players:
-        await music_players[guild_id].cleanup()
-        del music_players[guild_id]
+    cancel_timers(guild_id, 'disconnect', 'pause', 'cleanup')
+    state = guild_registry.remove(guild_id)
+    if queue_journal:
+        queue_journal.drop(guild_id)
+    if state:
+        if state.ingestor:
+            state.ingestor.stop()
+        state.prefetcher.cancel()
+        # Queued uploads are handed back here; the current song's reference goes back
+        # through its after callback once cleanup stops playback
+        state.queue_manager.release(list(state.queue_manager.queue))
+        state.queue_manager.queue.clear()
+        await state.player.cleanup()
+
+def suggest_song(song_info, weight=1):
+    """Offer a resolved YouTube track in /play autocomplete"""
+    if not is_local_file(song_info):
+        suggestions.add(song_info.get('title'), song_info.get('webpage_url'), weight)
+
+def suggest_spotify_tracks(tracks):
+    """Offer Spotify tracks in /play autocomplete under their track URL"""
+    for track in tracks:
+        label = f"{track['name']} - {track['artist']}" if track.get('artist') else track.get('name')
+        suggestions.add(label, track.get('external_url'))
+
+# Start from what the persistent caches already know, oldest first so recent entries survive the size cap
+suggest_spotify_tracks(reversed(spotify_cache.recent_tracks(SUGGESTION_INDEX_SIZE // 2)))
+for cached_song in reversed(extraction_cache.recent(SUGGESTION_INDEX_SIZE // 2)):
+    suggest_song(cached_song)
+extraction_cache.add_listener(suggest_song)
+spotify_cache.add_listener(suggest_spotify_tracks)
+
+def library_track(query):
+    """Get a queue entry for the best local library match of a search, or None"""
+    if not music_library or is_url(query):
+        return None
+    matches = music_library.search(query, limit=1)
+    return matches[0].to_track() if matches else None
+
+def worker_stats():
+    """Get the stats this process reports to the cluster supervisor"""
+    registry_stats = guild_registry.stats()
+    voice_clients = [vc for vc in bot.voice_clients if vc.is_connected()]
+    return {
+        'pid': os.getpid(),
+        'cluster_id': CLUSTER_ID,
+        'shards': SHARD_IDS,
+        'updated_at': time.time(),
+        'guilds': len(bot.guilds),
+        'resident_guilds': registry_stats['resident'],
+        'evicted_guilds': registry_stats['evicted'],
+        'voice_connections': len(voice_clients),
+        'playing': sum(1 for vc in voice_clients if vc.is_playing()),
+        'queued_songs': sum(state.queue_manager.get_queue_length() for state in guild_registry.resident.values()),
+        'ffmpeg_processes': ffmpeg_supervisor.stats()['live'],
+        'upload_bytes': upload_store.total_bytes,
+        'pending_timers': timer_wheel.stats()['pending'],
+        'latency_ms': round(bot.latency * 1000) if math.isfinite(bot.latency) else 0
+    }
+
+async def report_worker_stats():
+    """Publish this worker's stats for the cluster supervisor until cancelled"""
+    os.makedirs(CLUSTER_STATS_DIR, exist_ok=True)
+    while True:
+        try:
+            write_worker_stats(CLUSTER_STATS_DIR, CLUSTER_ID, worker_stats())
+        except Exception as e:
+            logger.error(f"Failed to write cluster stats: {e}")
+        await asyncio.sleep(CLUSTER_STATS_INTERVAL)
+
+def create_guild_state(guild_id, restore_queue):
+    """Build the player, queue and prefetcher for a guild"""
+    player = MusicPlayer(
+        bot, guild_id=guild_id, extraction_cache=extraction_cache,
+        stream_cache=stream_cache, scheduler=extraction_scheduler, audio_cache=audio_cache,
+        playback_mode=PLAYBACK_MODE, volume=DEFAULT_VOLUME / 100, supervisor=ffmpeg_supervisor, uploads=upload_store,
+        matcher=spotify_matcher
+    )
+    queue_manager = QueueManager(journal=queue_journal.guild(guild_id) if queue_journal else None, uploads=upload_store)
+    prefetcher = Prefetcher(player, queue_manager, depth=PREFETCH_DEPTH, transition_stats=transition_stats)
+
+    # Queues journaled before a restart come back the first time the guild is used
+    if restore_queue:
+        restored = queue_manager.restore()
+        if restored:
+            logger.info(f"Restored {restored} queued songs for guild {guild_id}")
+    return GuildState(player, queue_manager, prefetcher)
+
+guild_registry = GuildRegistry(
+    create_guild_state, idle_timeout=GUILD_IDLE_TIMEOUT, max_resident=GUILD_MAX_RESIDENT,
+    default_volume=DEFAULT_VOLUME / 100
+)
 
 def get_queue_manager(guild_id):
     """Get or create queue manager for guild"""
-    if guild_id not in queue_managers:
-        queue_managers[guild_id] = QueueManager()
-    return queue_managers[guild_id]
+    return guild_registry.get(guild_id).queue_manager
 
 def get_music_player(guild_id):
     """Get or create music player for guild"""
-    if guild_id not in music_players:
-        music_players[guild_id] = MusicPlayer(bot)
-    return music_players[guild_id]
+    return guild_registry.get(guild_id).player
+
+def get_prefetcher(guild_id):
+    """Get or create the look-ahead prefetcher for guild"""
+    return guild_registry.get(guild_id).prefetcher
+
+def get_ingestor(guild_id):
+    """Get or create the background playlist ingestor for guild"""
+    state = guild_registry.get(guild_id)
+    if state.ingestor is None:
+        state.ingestor = PlaylistIngestor(state.queue_manager)
+    return state.ingestor
+
+def stop_ingestion(guild_id):
+    """Stop any playlist that is still being added to the guild's queue"""
+    state = guild_registry.peek(guild_id)
+    if state and state.ingestor:
+        state.ingestor.stop()
+
+def schedule_timer(guild_id, kind, delay, callback):
+    """Arm (or re-arm) one of a guild's deadlines"""
+    timer_wheel.schedule((guild_id, kind), delay, lambda: callback(guild_id))
+
+def cancel_timers(guild_id, *kinds):
+    """Disarm some of a guild's deadlines"""
+    for kind in kinds:
+        timer_wheel.cancel((guild_id, kind))
+
+async def idle_disconnect(guild_id):
+    """Leave the voice channel if nothing has played since the deadline was armed"""
+    state = guild_registry.peek(guild_id)
+    if not state or not state.player.voice_client or state.player.is_playing():
+        return
+    logger.info(f"Disconnecting idle guild {guild_id}")
+    state.player.auto_paused = False
+    await state.player.disconnect()
+    schedule_timer(guild_id, 'cleanup', GUILD_IDLE_TIMEOUT, release_guild)
+
+def release_guild(guild_id):
+    """Drop a disconnected guild's state without waiting for the registry sweep"""
+    guild_registry.release(guild_id)
+
+def auto_pause(guild_id):
+    """Pause playback when the bot has been alone in its channel since the deadline was armed"""
+    state = guild_registry.peek(guild_id)
+    if not state or not state.player.is_playing() or has_listeners(state.player.voice_client):
+        return
+    logger.info(f"Pausing guild {guild_id}: nobody is listening")
+    pause_playback(guild_id)
+    state.player.auto_paused = True
+
+def pause_playback(guild_id):
+    """Pause and start the countdown to leaving"""
+    get_music_player(guild_id).voice_client.pause()
+    schedule_timer(guild_id, 'disconnect', PAUSED_DISCONNECT_DELAY, idle_disconnect)
+
+def resume_playback(guild_id):
+    """Resume and stop the countdown to leaving"""
+    player = get_music_player(guild_id)
+    player.voice_client.resume()
+    player.auto_paused = False
+    cancel_timers(guild_id, 'disconnect', 'pause')
+
+def has_listeners(voice_client):
+    """Check whether anyone other than bots is in the bot's voice channel"""
+    channel = getattr(voice_client, 'channel', None)
+    return bool(channel and any(not member.bot for member in channel.members))
+
+@bot.event
+async def on_voice_state_update(member, before, after):
+    """Pause when the bot is left alone and resume when a listener comes back"""
+    if member.bot:
+        return
+    state = guild_registry.peek(member.guild.id)
+    voice_client = state.player.voice_client if state else None
+    if not voice_client or voice_client.channel not in (before.channel, after.channel):
+        return
+
+    guild_id = member.guild.id
+    if has_listeners(voice_client):
+        cancel_timers(guild_id, 'pause')
+        if state.player.auto_paused and voice_client.is_paused():
+            resume_playback(guild_id)
+    elif state.player.is_playing():
+        schedule_timer(guild_id, 'pause', AUTO_PAUSE_DELAY, auto_pause)
+
+def duplicate_note(queue_manager, song_info):
+    """Mention when a song being added is already waiting in the queue"""
+    return "\n(Already in the queue)" if queue_manager.is_queued(song_info) else ""
+
+def describe_resolution(report, deadline):
+    """Summarize the playlist tracks that could not be matched ahead of playback"""
+    lines = []
+    if report['failed']:
+        names = ', '.join(song['title'] for song in report['failed'][:5])
+        more = f" and {len(report['failed']) - 5} more" if len(report['failed']) > 5 else ""
+        lines.append(f"{len(report['failed'])} tracks could not be found on YouTube and will be skipped: {names}{more}")
+    if report['timed_out']:
+        lines.append(f"{len(report['timed_out'])} tracks were not matched within {deadline:.0f}s and will be matched as they come up")
+    return '\n'.join(lines)
+
+def start_playlist_ingestion(guild_id, entries, send, source_name, requested_by=None, resolver=None):
+    """Queue a playlist in the background, starting playback with its first track"""
+    player = get_music_player(guild_id)
+
+    async def on_first():
+        if not player.is_playing():
+            asyncio.create_task(play_next_song(guild_id))
+
+    async def on_done(added, error):
+        if error and not added:
+            embed = create_embed("Error", f"Failed to load playlist: {str(error)}", discord.Color.red())
+        elif error:
+            embed = create_embed("Playlist Partially Added", f"Added {added} songs from {source_name} before an error: {str(error)}", discord.Color.orange())
+        else:
+            embed = create_embed("Playlist Added", f"Added {added} songs from {source_name}", discord.Color.green())
+        if resolver:
+            summary = describe_resolution(await resolver.finish(), resolver.deadline)
+            if summary:
+                embed.description += f"\n{summary}"
+                if not error:
+                    embed.color = discord.Color.orange()
+        try:
+            await send(embed=embed)
+        except Exception as e:
+            logger.error(f"Failed to report playlist ingestion: {e}")
+
+    get_ingestor(guild_id).start(entries, on_first, on_done, requested_by=requested_by)
+
+def start_spotify_ingestion(guild_id, spotify_url, send, requested_by=None):
+    """Queue a Spotify playlist or album, matching its tracks on YouTube ahead of playback"""
+    resolver = PlaylistResolver(
+        get_music_player(guild_id), get_queue_manager(guild_id),
+        concurrency=SPOTIFY_RESOLVE_CONCURRENCY, deadline=SPOTIFY_RESOLVE_DEADLINE
+    )
+    entries = iter_spotify_placeholders(spotify_handler, spotify_url, resolver)
+    start_playlist_ingestion(guild_id, entries, send, "Spotify playlist", requested_by, resolver)
 
 @bot.command(name='join')
 async def join_voice(ctx):
@@ -121,8 +493,11 @@ async def leave_voice(ctx):
         await ctx.send(embed=embed)
         return
 
+    stop_ingestion(ctx.guild.id)
+    cancel_timers(ctx.guild.id, 'disconnect', 'pause')
     await player.disconnect()
     queue_manager.clear()
+    schedule_timer(ctx.guild.id, 'cleanup', GUILD_IDLE_TIMEOUT, release_guild)
     embed = create_embed("Disconnected", "Left the voice channel and cleared the queue", discord.Color.orange())
     await ctx.send(embed=embed)
 
@@ -130,7 +505,7 @@ async def leave_voice(ctx):
 async def play_music(ctx, *, query=None):
     """Play music from various sources"""
     if not query and not ctx.message.attachments:
-        embed = create_embed("Error", "Please provide a search query, URL, or upload an MP3 file!", discord.Color.red())
+        embed = create_embed("Error", "Please provide a search query, URL, or upload an audio file!", discord.Color.red())
         await ctx.send(embed=embed)
         return
 
@@ -154,21 +529,23 @@ async def play_music(ctx, *, query=None):
     # Handle file upload
     if ctx.message.attachments:
         attachment = ctx.message.attachments[0]
-        if attachment.filename.lower().endswith('.mp3'):
+        if upload_store.accepts(attachment.filename):
             try:
-                # Download the file temporarily
-                temp_path = f"temp_{ctx.guild.id}_{attachment.filename}"
-                await attachment.save(temp_path)
-                
-                song_info = {
-                    'title': attachment.filename[:-4],  # Remove .mp3 extension
-                    'url': temp_path,
-                    'duration': 'Unknown',
-                    'source': 'upload',
-                    'temp_file': True
-                }
-                
-                queue_manager.add_song(song_info)
+                # Identical uploads share one stored file; the queue entry holds a reference to it
+                path, tags = await upload_store.save(attachment.url, attachment.filename, size=attachment.size)
+                title = tags.get('title') or os.path.splitext(attachment.filename)[0]
+                if tags.get('artist'):
+                    title = f"{tags['artist']} - {title}"
+
+                song_info = Track(
+                    title,
+                    url=path,
+                    duration=tags.get('duration') or 0,
+                    source='upload',
+                    temp_file=True
+                )
+
+                queue_manager.add_song(song_info, requested_by=ctx.author.id)
                 embed = create_embed("Added to Queue", f"**{song_info['title']}** (Uploaded file)", discord.Color.blue())
                 await ctx.send(embed=embed)
                 
@@ -179,67 +556,65 @@ async def play_music(ctx, *, query=None):
                 embed = create_embed("Error", f"Failed to process uploaded file: {str(e)}", discord.Color.red())
                 await ctx.send(embed=embed)
         else:
-            embed = create_embed("Error", "Only MP3 files are supported for upload!", discord.Color.red())
+            formats = ', '.join(extension[1:].upper() for extension in UPLOAD_EXTENSIONS)
+            embed = create_embed("Error", f"Supported upload formats: {formats}", discord.Color.red())
             await ctx.send(embed=embed)
         return
 
     # Handle Spotify URLs
     if query and 'spotify.com' in query:
+        if '/playlist/' in query or '/album/' in query:
+            # Tracks are queued page by page and matched on YouTube in the background
+            await ctx.send("🔍 Loading Spotify playlist...")
+            start_spotify_ingestion(ctx.guild.id, query, ctx.send, ctx.author.id)
+            return
+
         await ctx.send("🔍 Processing Spotify link...")
         try:
             spotify_data = await spotify_handler.get_track_info(query)
             if spotify_data['type'] == 'track':
-                # Convert to YouTube search
-                search_query = f"{spotify_data['artist']} - {spotify_data['name']}"
-                song_info = await player.get_youtube_info(search_query)
+                # Matched through one scored search, or none at all once the track has been matched before
+                song_info = await player.match_spotify_track(spotify_data)
                 if song_info:
                     song_info['spotify_info'] = spotify_data
-                    queue_manager.add_song(song_info)
-                    embed = create_embed("Added to Queue", f"**{song_info['title']}** (from Spotify)", discord.Color.green())
+                    note = duplicate_note(queue_manager, song_info)
+                    queue_manager.add_song(song_info, requested_by=ctx.author.id)
+                    embed = create_embed("Added to Queue", f"**{song_info['title']}** (from Spotify){note}", discord.Color.green())
                     await ctx.send(embed=embed)
                 else:
                     embed = create_embed("Error", "Could not find this track on YouTube", discord.Color.red())
                     await ctx.send(embed=embed)
                     return
-            elif spotify_data['type'] == 'playlist':
-                added_count = 0
-                for track in spotify_data['tracks']:
-                    search_query = f"{track['artist']} - {track['name']}"
-                    song_info = await player.get_youtube_info(search_query)
-                    if song_info:
-                        song_info['spotify_info'] = track
-                        queue_manager.add_song(song_info)
-                        added_count += 1
-                
-                embed = create_embed("Playlist Added", f"Added {added_count} songs from Spotify playlist", discord.Color.green())
-                await ctx.send(embed=embed)
         except Exception as e:
             embed = create_embed("Error", f"Failed to process Spotify link: {str(e)}", discord.Color.red())
             await ctx.send(embed=embed)
             return
     else:
         # Handle YouTube URLs and search queries
-        await ctx.send("🔍 Searching...")
+        if query and 'playlist' in query and 'youtube.com' in query:
+            # Handle YouTube playlist: entries are queued as yt-dlp pages through it
+            await ctx.send("🔍 Loading playlist...")
+            start_playlist_ingestion(ctx.guild.id, player.iter_playlist(query), ctx.send, "YouTube playlist", ctx.author.id)
+            return
+
+        # Local files need no extraction, so the library is checked before searching YouTube
+        song_info = library_track(query)
+        if not song_info:
+            await ctx.send("🔍 Searching...")
         try:
-            if query and 'playlist' in query and 'youtube.com' in query:
-                # Handle YouTube playlist
-                songs = await player.get_playlist_info(query)
-                added_count = len(songs)
-                for song in songs:
-                    queue_manager.add_song(song)
-                embed = create_embed("Playlist Added", f"Added {added_count} songs to the queue", discord.Color.green())
+            # Handle single video or search
+            song_info = song_info or await player.get_youtube_info(query)
+            if song_info:
+                note = duplicate_note(queue_manager, song_info)
+                if song_info.get('source') == 'library':
+                    note = " (local library)" + note
+                queue_manager.add_song(song_info, requested_by=ctx.author.id)
+                embed = create_embed("Added to Queue", f"**{song_info['title']}**{note}", discord.Color.blue())
                 await ctx.send(embed=embed)
             else:
-                # Handle single video or search
-                song_info = await player.get_youtube_info(query)
-                if song_info:
-                    queue_manager.add_song(song_info)
-                    embed = create_embed("Added to Queue", f"**{song_info['title']}**", discord.Color.blue())
-                    await ctx.send(embed=embed)
-                else:
-                    embed = create_embed("Error", "Could not find any results", discord.Color.red())
-                    await ctx.send(embed=embed)
-                    return
+                embed = create_embed("Error", "Could not find any results", discord.Color.red())
+                await ctx.send(embed=embed)
+                return
         except Exception as e:
             embed = create_embed("Error", f"Failed to process request: {str(e)}", discord.Color.red())
             await ctx.send(embed=embed)
@@ -253,21 +628,47 @@ async def play_next_song(guild_id):
     """Play the next song in the queue"""
     player = get_music_player(guild_id)
     queue_manager = get_queue_manager(guild_id)
-    
-    if queue_manager.is_empty():
-        # Start disconnect timer
-        await asyncio.sleep(60)  # Wait 1 minute
-        if queue_manager.is_empty() and not player.is_playing():
-            await player.disconnect()
-        return
+    prefetcher = get_prefetcher(guild_id)
 
-    song = queue_manager.get_next_song()
-    if song:
-        try:
-            await player.play_song(song, lambda: play_next_song(guild_id))
-        except Exception as e:
-            logger.error(f"Error playing song: {e}")
-            await play_next_song(guild_id)  # Try next song
+    # Callers race (a track ending, a playlist's first batch, !play), so only one advances at a time
+    async with player.advancing:
+        if player.is_busy():
+            return  # Another caller started a song while this one waited
+
+        # Unplayable entries are skipped in a loop, so a long run of them cannot exhaust the stack
+        while True:
+            if queue_manager.is_empty():
+                # Waiting for new songs is not a transition gap
+                player.finished_at = None
+                queue_manager.finish()
+                schedule_timer(guild_id, 'disconnect', IDLE_DISCONNECT_DELAY, idle_disconnect)
+                return
+
+            song = queue_manager.get_next_song()
+            if not song:
+                return
+            cancel_timers(guild_id, 'disconnect', 'cleanup')
+            await prefetcher.wait_for(song)
+            prefetched = prefetcher.is_prefetched(song)
+
+            # Placeholders that cannot be matched are skipped transparently
+            if not await player.resolve_placeholder(song, priority=PRIORITY_STREAM):
+                logger.warning(f"Skipping unresolvable queue entry: {song['title']}")
+                continue
+
+            try:
+                await player.play_song(song, lambda: play_next_song(guild_id))
+            except Exception as e:
+                if player.is_busy():
+                    # Something else is playing; the song is not at fault, so stop instead of skipping on
+                    logger.error(f"Could not start '{song['title']}' while audio is playing: {e}")
+                    return
+                logger.error(f"Error playing song: {e}")
+                continue  # Try next song
+            suggest_song(song, weight=5)  # Songs people actually play rank above search results
+            if player.last_transition_gap is not None:
+                prefetcher.record_transition(player.last_transition_gap, prefetched)
+            return
 
 @bot.command(name='skip')
 async def skip_song(ctx):
@@ -293,7 +694,7 @@ async def pause_music(ctx):
         await ctx.send(embed=embed)
         return
 
-    player.voice_client.pause()
+    pause_playback(ctx.guild.id)
     embed = create_embed("Paused", "⏸️ Music paused", discord.Color.yellow())
     await ctx.send(embed=embed)
 
@@ -308,19 +709,56 @@ async def resume_music(ctx):
         return
 
     if player.voice_client.is_paused():
-        player.voice_client.resume()
+        resume_playback(ctx.guild.id)
         embed = create_embed("Resumed", "▶️ Music resumed", discord.Color.green())
         await ctx.send(embed=embed)
     else:
         embed = create_embed("Error", "Music is not paused!", discord.Color.red())
         await ctx.send(embed=embed)
 
+def volume_embed(guild_id, level):
+    """Set a guild's volume in percent and describe the result"""
+    if level < 0 or level > 200:
+        return create_embed("Error", "Volume must be between 0 and 200!", discord.Color.red())
+
+    player = get_music_player(guild_id)
+    if player.set_volume(level / 100):
+        return create_embed("Volume", f"🔊 Volume set to {level}%", discord.Color.blue())
+    return create_embed("Volume", f"🔊 Volume set to {level}% from the next song", discord.Color.blue())
+
+def bass_boost_embed(guild_id, level):
+    """Set a guild's bass boost (0-10) and describe the result"""
+    if level < 0 or level > 10:
+        return create_embed("Error", "Bass boost must be between 0 and 10!", discord.Color.red())
+
+    player = get_music_player(guild_id)
+    status = "off" if level == 0 else f"level {level}"
+    if player.set_bass_boost(level / 5):
+        return create_embed("Bass Boost", f"🎚️ Bass boost {status}", discord.Color.blue())
+    return create_embed("Bass Boost", f"🎚️ Bass boost {status} from the next song", discord.Color.blue())
+
+@bot.command(name='volume')
+async def set_volume(ctx, level: int = None):
+    """Show or change the playback volume"""
+    if level is None:
+        player = get_music_player(ctx.guild.id)
+        embed = create_embed("Volume", f"🔊 Volume is {round(player.audio_processor.volume * 100)}%", discord.Color.blue())
+    else:
+        embed = volume_embed(ctx.guild.id, level)
+    await ctx.send(embed=embed)
+
+@bot.command(name='bassboost')
+async def set_bass_boost(ctx, level: int = 0):
+    """Change the bass boost"""
+    await ctx.send(embed=bass_boost_embed(ctx.guild.id, level))
+
 @bot.command(name='stop')
 async def stop_music(ctx):
     """Stop music and clear the queue"""
     player = get_music_player(ctx.guild.id)
     queue_manager = get_queue_manager(ctx.guild.id)
     
+    stop_ingestion(ctx.guild.id)
     if player.voice_client:
         player.voice_client.stop()
     
@@ -328,15 +766,35 @@ async def stop_music(ctx):
     embed = create_embed("Stopped", "⏹️ Music stopped and queue cleared", discord.Color.red())
     await ctx.send(embed=embed)
 
-@bot.command(name='queue')
-async def show_queue(ctx):
-    """Show the current queue"""
-    queue_manager = get_queue_manager(ctx.guild.id)
-    player = get_music_player(ctx.guild.id)
-    
+def remove_user_embed(guild_id, member):
+    """Remove a member's songs from a guild's queue and describe the result"""
+    removed = get_queue_manager(guild_id).remove_by_user(member.id)
+    if not removed:
+        return create_embed("Remove", f"No queued songs from {member.display_name}", discord.Color.orange())
+    return create_embed("Removed", f"🗑️ Removed {len(removed)} songs requested by {member.display_name}", discord.Color.blue())
+
+@bot.command(name='removeuser')
+async def remove_user_songs(ctx, member: discord.Member):
+    """Remove every queued song a member requested"""
+    await ctx.send(embed=remove_user_embed(ctx.guild.id, member))
+
+QUEUE_PAGE_SIZE = 10
+
+def render_queue_page(songs, start):
+    """Format one page of upcoming songs"""
+    return "\n".join(
+        f"{i}. **{song['title']}** ({song.get('duration', 'Unknown')})" for i, song in enumerate(songs, start + 1)
+    )
+
+def queue_embed(guild_id, page=0):
+    """Describe the current song and one page of the queue; returns the embed and the page shown"""
+    queue_manager = get_queue_manager(guild_id)
+    player = get_music_player(guild_id)
+    pages = queue_manager.page_count(QUEUE_PAGE_SIZE)
+    page = min(max(page, 0), pages - 1)
+
     embed = discord.Embed(title="🎵 Music Queue", color=discord.Color.blue())
-    
-    # Current song
+
     current_song = queue_manager.get_current_song()
     if current_song and player.is_playing():
         embed.add_field(
@@ -344,35 +802,255 @@ async def show_queue(ctx):
             value=f"**{current_song['title']}**\nDuration: {current_song.get('duration', 'Unknown')}",
             inline=False
         )
-    
-    # Queue
-    upcoming = queue_manager.get_queue_list()
-    if upcoming:
-        queue_text = ""
-        for i, song in enumerate(upcoming[:10], 1):  # Show max 10 songs
-            queue_text += f"{i}. **{song['title']}** ({song.get('duration', 'Unknown')})\n"
-        
-        if len(upcoming) > 10:
-            queue_text += f"\n... and {len(upcoming) - 10} more songs"
-        
-        embed.add_field(name="📋 Up Next", value=queue_text, inline=False)
-    else:
-        if not current_song:
-            embed.add_field(name="📋 Queue", value="Queue is empty", inline=False)
-    
-    embed.set_footer(text=f"Total songs in queue: {len(upcoming)}")
-    await ctx.send(embed=embed)
+
+    # Only the requested page is read, and it is only formatted again after the queue changes
+    total = queue_manager.get_queue_length()
+    if total:
+        embed.add_field(
+            name="📋 Up Next",
+            value=queue_manager.render_page(page, render_queue_page, QUEUE_PAGE_SIZE),
+            inline=False
+        )
+    elif not current_song:
+        embed.add_field(name="📋 Queue", value="Queue is empty", inline=False)
+
+    embed.set_footer(text=f"Page {page + 1}/{pages} | Total songs in queue: {total}")
+    return embed, page
+
+def queue_pages_view(guild_id, page):
+    """Get page buttons for a queue message, or None if the queue fits on one page"""
+    if get_queue_manager(guild_id).page_count(QUEUE_PAGE_SIZE) <= 1:
+        return None
+    return QueuePages(guild_id, page)
+
+class QueuePages(discord.ui.View):
+    """Previous/next buttons under a queue message"""
+
+    def __init__(self, guild_id, page):
+        super().__init__(timeout=300)
+        self.guild_id = guild_id
+        self.page = page
+        self.update_buttons()
+
+    def update_buttons(self):
+        pages = get_queue_manager(self.guild_id).page_count(QUEUE_PAGE_SIZE)
+        self.previous_page.disabled = self.page <= 0
+        self.next_page.disabled = self.page >= pages - 1
+
+    async def show(self, interaction, page):
+        embed, self.page = queue_embed(self.guild_id, page)
+        self.update_buttons()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction, button):
+        await self.show(interaction, self.page - 1)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction, button):
+        await self.show(interaction, self.page + 1)
+
+@bot.command(name='queue')
+async def show_queue(ctx, page: int = 1):
+    """Show the current queue"""
+    embed, page = queue_embed(ctx.guild.id, page - 1)
+    await ctx.send(embed=embed, view=queue_pages_view(ctx.guild.id, page))
 
 @bot.command(name='upload')
 async def upload_command(ctx):
     """Instructions for uploading files"""
     embed = create_embed(
         "File Upload", 
-        "To upload an MP3 file, use the `!play` command and attach your MP3 file to the message!",
+        "To play your own file, use the `!play` command and attach it to the message!\n"
+        f"Formats: {', '.join(extension[1:].upper() for extension in UPLOAD_EXTENSIONS)} "
+        f"(up to {UPLOAD_MAX_FILE_MB} MiB)",
         discord.Color.blue()
     )
     await ctx.send(embed=embed)
 
+@bot.command(name='stats')
+async def show_stats(ctx):
+    """Show bot performance statistics"""
+    embed = discord.Embed(title="📊 Bot Statistics", color=discord.Color.blue())
+
+    cache_stats = extraction_cache.stats()
+    embed.add_field(
+        name="Extraction Cache",
+        value=(
+            f"Hits: {cache_stats['hits']} | Misses: {cache_stats['misses']}\n"
+            f"Hit rate: {cache_stats['hit_rate']:.1%} | Entries: {cache_stats['entries']}"
+        ),
+        inline=False
+    )
+
+    stream_stats = stream_cache.stats()
+    embed.add_field(
+        name="Stream URL Cache",
+        value=(
+            f"Reused: {stream_stats['hits']} | Resolved: {stream_stats['misses']}\n"
+            f"Hit rate: {stream_stats['hit_rate']:.1%} | Entries: {stream_stats['entries']}"
+        ),
+        inline=False
+    )
+
+    spotify_stats = spotify_cache.stats()
+    kinds = spotify_stats['kinds']
+    embed.add_field(
+        name="Spotify Cache",
+        value=(
+            f"Hit rate: {spotify_stats['hit_rate']:.1%} | Entries: {spotify_stats['entries']}\n"
+            + " | ".join(f"{kind}: {counts['hits']}/{counts['hits'] + counts['misses']}" for kind, counts in kinds.items())
+            + f"\nSnapshot revalidations: {spotify_stats['snapshot_checks']}"
+        ),
+        inline=False
+    )
+
+    match_stats = spotify_matcher.stats()
+    embed.add_field(
+        name="Spotify Matches",
+        value=(
+            f"Stored: {match_stats['entries']} | Reused: {match_stats['remembered']} / {match_stats['lookups']} "
+            f"({match_stats['hit_rate']:.1%})\n"
+            f"Searches: {match_stats['searches']} ({match_stats['confident']} confident)"
+        ),
+        inline=False
+    )
+
+    audio_stats = audio_cache.stats()
+    embed.add_field(
+        name="Audio Cache",
+        value=(
+            f"Hits: {audio_stats['hits']} / {audio_stats['lookups']} ({audio_stats['hit_rate']:.1%}) | "
+            f"Served: {audio_stats['bytes_served'] / 1024 ** 2:.1f} MiB\n"
+            f"Tracks: {audio_stats['entries']} | "
+            f"Size: {audio_stats['bytes'] / 1024 ** 2:.1f}/{audio_stats['max_bytes'] / 1024 ** 2:.0f} MiB | "
+            f"Evictions: {audio_stats['evictions']}"
+        ),
+        inline=False
+    )
+
+    gaps = transition_stats.stats()
+    embed.add_field(
+        name="Track Transitions",
+        value=(
+            f"Prefetched: {gaps['prefetched']['transitions']} "
+            f"(avg {gaps['prefetched']['avg_gap']:.2f}s, max {gaps['prefetched']['max_gap']:.2f}s)\n"
+            f"Cold: {gaps['cold']['transitions']} "
+            f"(avg {gaps['cold']['avg_gap']:.2f}s, max {gaps['cold']['max_gap']:.2f}s)"
+        ),
+        inline=False
+    )
+
+    scheduler_stats = extraction_scheduler.stats()
+    lines = [f"Workers: {scheduler_stats['running']}/{scheduler_stats['workers']} busy"]
+    for name, metrics in scheduler_stats['classes'].items():
+        lines.append(
+            f"{name}: {metrics['queued']} queued, {metrics['completed']} done, "
+            f"wait avg {metrics['avg_wait']:.2f}s / max {metrics['max_wait']:.2f}s"
+        )
+    pool_stats = ytdl_pool.stats()
+    lines.append(
+        f"yt-dlp instances: {pool_stats['instances']} for {pool_stats['checkouts']} jobs "
+        f"(build {pool_stats['build_time']:.2f}s, wait {pool_stats['wait_time']:.2f}s)"
+    )
+    embed.add_field(name="Extraction Scheduler", value="\n".join(lines), inline=False)
+
+    ffmpeg_stats = ffmpeg_supervisor.stats()
+    embed.add_field(
+        name="FFmpeg Processes",
+        value=(
+            f"Live: {ffmpeg_stats['live']}/{ffmpeg_stats['max']} (peak {ffmpeg_stats['peak']}) | "
+            f"Queued: {ffmpeg_stats['queued']}\n"
+            f"Spawned: {ffmpeg_stats['spawned']} | Failed: {ffmpeg_stats['failed']} | "
+            f"Restarted: {ffmpeg_stats['restarted']} | Reaped: {ffmpeg_stats['reaped']}"
+        ),
+        inline=False
+    )
+
+    timer_stats = timer_wheel.stats()
+    embed.add_field(
+        name="Timers",
+        value=(
+            f"Pending: {timer_stats['pending']} ("
+            + (", ".join(f"{kind}: {count}" for kind, count in timer_stats['kinds'].items()) or "none")
+            + f")\nArmed: {timer_stats['armed']} | Fired: {timer_stats['fired']} | Cancelled: {timer_stats['cancelled']}"
+        ),
+        inline=False
+    )
+
+    registry_stats = guild_registry.stats()
+    embed.add_field(
+        name="Guild State",
+        value=(
+            f"Resident: {registry_stats['resident']} | Evicted: {registry_stats['evicted']} "
+            f"({registry_stats['evicted_with_state']} with saved settings, {registry_stats['evicted_bytes'] / 1024:.1f} KiB)\n"
+            f"Evictions: {registry_stats['evictions']} | Rehydrations: {registry_stats['rehydrations']}"
+        ),
+        inline=False
+    )
+
+    suggestion_stats = suggestions.stats()
+    embed.add_field(
+        name="Autocomplete",
+        value=(
+            f"Tracks: {suggestion_stats['entries']} ({suggestion_stats['grams']} trigrams) | "
+            f"Searches: {suggestion_stats['searches']} | Evictions: {suggestion_stats['evictions']}"
+        ),
+        inline=False
+    )
+
+    if music_library:
+        library_stats = music_library.stats()
+        last_scan = library_stats['last_scan']
+        embed.add_field(
+            name="Music Library",
+            value=(
+                f"Tracks: {library_stats['tracks']} ({library_stats['terms']} terms) | Searches: {library_stats['searches']}\n"
+                + (f"Last scan: {last_scan[0]:.1f}s, {last_scan[1]} added, {last_scan[2]} updated, {last_scan[3]} removed"
+                   if last_scan else "Scanning...")
+            ),
+            inline=False
+        )
+
+    upload_stats = upload_store.stats()
+    embed.add_field(
+        name="Uploads",
+        value=(
+            f"Stored: {upload_stats['files']} files, {upload_stats['bytes'] / 1024 ** 2:.1f} / "
+            f"{upload_stats['max_bytes'] / 1024 ** 2:.0f} MiB ({upload_stats['referenced']} queued)\n"
+            f"Uploads: {upload_stats['uploads']} ({upload_stats['deduplicated']} deduplicated) | "
+            f"Evictions: {upload_stats['evictions']} | Rejected: {upload_stats['rejected']}"
+        ),
+        inline=False
+    )
+
+    if queue_journal:
+        journal_stats = queue_journal.stats()
+        embed.add_field(
+            name="Queue Journal",
+            value=(
+                f"Records: {journal_stats['records']} in {journal_stats['commits']} commits "
+                f"({journal_stats['syncs']} fsyncs) | Pending: {journal_stats['pending']}\n"
+                f"Snapshots: {journal_stats['snapshots']} | Queues restored: {journal_stats['restored']}"
+            ),
+            inline=False
+        )
+
+    if CLUSTER_STATS_DIR:
+        workers = read_worker_stats(CLUSTER_STATS_DIR, max_age=CLUSTER_STATS_INTERVAL * 3)
+        embed.add_field(
+            name="Cluster",
+            value=(
+                f"Worker {CLUSTER_ID} | Shards: {', '.join(map(str, SHARD_IDS)) or 'all'} of {SHARD_COUNT}\n"
+                f"Workers reporting: {len(workers)} | "
+                f"Guilds: {sum(worker.get('guilds', 0) for worker in workers)} | "
+                f"Voice: {sum(worker.get('voice_connections', 0) for worker in workers)}"
+            ),
+            inline=False
+        )
+
+    await ctx.send(embed=embed)
+
 @bot.command(name='commands')
 async def help_command(ctx):
     """Show help information"""
@@ -381,19 +1059,23 @@ async def help_command(ctx):
     commands_list = [
         ("!join", "Join your voice channel"),
         ("!leave", "Leave the voice channel"),
-        ("!play <query/URL>", "Play music from YouTube, Spotify, or upload MP3"),
+        ("!play <query/URL>", "Play music from YouTube, Spotify, or an uploaded file"),
         ("!skip", "Skip the current song"),
         ("!pause", "Pause the music"),
         ("!resume", "Resume the music"),
         ("!stop", "Stop music and clear queue"),
-        ("!queue", "Show the current queue"),
-        ("!upload", "Instructions for uploading MP3 files")
+        ("!volume <0-200>", "Change the volume"),
+        ("!bassboost <0-10>", "Boost the bass (0 turns it off)"),
+        ("!queue [page]", "Show the current queue"),
+        ("!removeuser <@member>", "Remove every song a member queued"),
+        ("!upload", "Instructions for uploading audio files"),
+        ("!stats", "Show cache and performance statistics")
     ]
     
     for command, description in commands_list:
         embed.add_field(name=command, value=description, inline=False)
     
-    embed.set_footer(text="Supports YouTube URLs, playlists, Spotify links, and MP3 uploads!")
+    embed.set_footer(text="Supports YouTube URLs, playlists, Spotify links, and audio uploads!")
     await ctx.send(embed=embed)
 
 # ================ SLASH COMMANDS ================
@@ -426,18 +1108,31 @@ async def slash_play(interaction: discord.Interaction, query: str):
         songs = []
         if is_url(query):
             from utils import is_youtube_url, is_spotify_url
+            if is_youtube_url(query) and 'playlist' in query:
+                await interaction.followup.send("🔍 Loading playlist...")
+                start_playlist_ingestion(interaction.guild.id, player.iter_playlist(query), interaction.followup.send, "YouTube playlist", interaction.user.id)
+                return
+            if is_spotify_url(query) and ('/playlist/' in query or '/album/' in query):
+                await interaction.followup.send("🔍 Loading Spotify playlist...")
+                start_spotify_ingestion(interaction.guild.id, query, interaction.followup.send, interaction.user.id)
+                return
+
             if is_youtube_url(query):
-                if 'playlist' in query:
-                    songs = await player.get_playlist_info(query)
-                else:
-                    song_info = await player.get_youtube_info(query)
+                song_info = await player.get_youtube_info(query)
+                if song_info:
+                    songs = [song_info]
+            elif is_spotify_url(query):
+                spotify_data = await spotify_handler.get_track_info(query)
+                if spotify_data['type'] == 'track':
+                    song_info = await player.match_spotify_track(spotify_data)
                     if song_info:
+                        song_info['spotify_info'] = spotify_data
                         songs = [song_info]
-            elif is_spotify_url(query):
-                songs = await spotify_handler.get_track_info(query)
+                else:
+                    songs = [spotify_placeholder(track) for track in spotify_data['tracks']]
         else:
-            # Optimized search query
-            song_info = await player.get_youtube_info(f"ytsearch:{query}")
+            # Local library first, then an optimized YouTube search
+            song_info = library_track(query) or await player.get_youtube_info(f"ytsearch:{query}")
             if song_info:
                 songs = [song_info]
 
@@ -447,11 +1142,11 @@ async def slash_play(interaction: discord.Interaction, query: str):
             return
 
         # Add to queue
-        for song in songs:
-            queue_manager.add_song(song)
+        note = duplicate_note(queue_manager, songs[0]) if len(songs) == 1 else ""
+        queue_manager.add_songs(songs, requested_by=interaction.user.id)
 
         if len(songs) == 1:
-            embed = create_embed("Added to Queue", f"**{songs[0]['title']}**", discord.Color.green())
+            embed = create_embed("Added to Queue", f"**{songs[0]['title']}**{note}", discord.Color.green())
         else:
             embed = create_embed("Added to Queue", f"Added {len(songs)} songs to queue", discord.Color.green())
         
@@ -466,6 +1161,15 @@ async def slash_play(interaction: discord.Interaction, query: str):
         embed = create_embed("Error", f"An error occurred: {str(e)}", discord.Color.red())
         await interaction.followup.send(embed=embed)
 
+@slash_play.autocomplete('query')
+async def play_autocomplete(interaction: discord.Interaction, current: str):
+    """Suggest known tracks from the in-memory index; never touches the network"""
+    return [
+        app_commands.Choice(name=label[:100], value=value)
+        for label, value in suggestions.search(current, limit=25)
+        if len(value) <= 100
+    ]
+
 @bot.tree.command(name="skip", description="Skip the current song")
 async def slash_skip(interaction: discord.Interaction):
     """Slash command version of skip"""
@@ -496,10 +1200,22 @@ async def slash_pause(interaction: discord.Interaction):
         await interaction.response.send_message(embed=embed)
         return
     
-    player.voice_client.pause()
+    pause_playback(interaction.guild.id)
     embed = create_embed("Paused", "Music has been paused", discord.Color.orange())
     await interaction.response.send_message(embed=embed)
 
+@bot.tree.command(name="volume", description="Change the playback volume")
+@app_commands.describe(level="Volume in percent (0-200)")
+async def slash_volume(interaction: discord.Interaction, level: int):
+    """Slash command version of volume"""
+    await interaction.response.send_message(embed=volume_embed(interaction.guild.id, level))
+
+@bot.tree.command(name="bassboost", description="Boost the bass")
+@app_commands.describe(level="Bass boost level (0-10, 0 turns it off)")
+async def slash_bass_boost(interaction: discord.Interaction, level: int):
+    """Slash command version of bassboost"""
+    await interaction.response.send_message(embed=bass_boost_embed(interaction.guild.id, level))
+
 @bot.tree.command(name="resume", description="Resume the music")
 async def slash_resume(interaction: discord.Interaction):
     """Slash command version of resume"""
@@ -510,36 +1226,22 @@ async def slash_resume(interaction: discord.Interaction):
         await interaction.response.send_message(embed=embed)
         return
     
-    player.voice_client.resume()
+    resume_playback(interaction.guild.id)
     embed = create_embed("Resumed", "Music has been resumed", discord.Color.green())
     await interaction.response.send_message(embed=embed)
 
 @bot.tree.command(name="queue", description="Show the current music queue")
-async def slash_queue(interaction: discord.Interaction):
+@app_commands.describe(page="Page of the queue to show")
+async def slash_queue(interaction: discord.Interaction, page: int = 1):
     """Slash command version of queue"""
-    queue_manager = get_queue_manager(interaction.guild.id)
-    
-    embed = create_embed("Music Queue", "", discord.Color.blue())
-    
-    current_song = queue_manager.get_current_song()
-    if current_song:
-        embed.add_field(name="Now Playing", value=current_song['title'], inline=False)
-    
-    upcoming = queue_manager.get_queue_list()
-    if upcoming:
-        queue_list = []
-        for i, song in enumerate(upcoming[:10], 1):
-            queue_list.append(f"{i}. {song['title']}")
-        embed.add_field(name="Up Next", value="\n".join(queue_list), inline=False)
-        
-        if len(upcoming) > 10:
-            embed.add_field(name="", value=f"... and {len(upcoming) - 10} more songs", inline=False)
-    else:
-        if not current_song:
-            embed.add_field(name="Queue", value="No songs in queue", inline=False)
-    
-    embed.set_footer(text=f"Total songs: {queue_manager.get_queue_length()}")
-    await interaction.response.send_message(embed=embed)
+    embed, page = queue_embed(interaction.guild.id, page - 1)
+    await interaction.response.send_message(embed=embed, view=queue_pages_view(interaction.guild.id, page))
+
+@bot.tree.command(name="removeuser", description="Remove every song a member queued")
+@app_commands.describe(member="Member whose songs should be removed")
+async def slash_remove_user(interaction: discord.Interaction, member: discord.Member):
+    """Slash command version of removeuser"""
+    await interaction.response.send_message(embed=remove_user_embed(interaction.guild.id, member))
 
 @bot.tree.command(name="stop", description="Stop music and clear the queue")
 async def slash_stop(interaction: discord.Interaction):
@@ -547,6 +1249,7 @@ async def slash_stop(interaction: discord.Interaction):
     player = get_music_player(interaction.guild.id)
     queue_manager = get_queue_manager(interaction.guild.id)
     
+    stop_ingestion(interaction.guild.id)
     if player.voice_client and player.voice_client.is_playing():
         player.voice_client.stop()
     
@@ -555,4 +1258,8 @@ async def slash_stop(interaction: discord.Interaction):
     await interaction.response.send_message(embed=embed)
 
 if __name__ == "__main__":
-    bot.run(DISCORD_TOKEN)
\ No newline at end of file
+    try:
+        bot.run(DISCORD_TOKEN)
+    finally:
+        if queue_journal:
+            queue_journal.close()
\ No newline at end of file
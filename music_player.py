@@ -1,39 +1,54 @@
-import discord
-import yt_dlp
 import asyncio
-import os
+import functools
+import itertools
+import time
 import logging
 from urllib.parse import urlparse, parse_qs
+from stream_cache import StreamUrlCache, get_stream_codec
+from extraction_scheduler import PRIORITY_STREAM, PRIORITY_SEARCH, PRIORITY_BULK
+from ytdl_pool import extract_info, get_pool
+from audio_dsp import AudioProcessor, ProcessedAudio
+from ffmpeg_supervisor import SupervisedOpusAudio, SupervisedPCMAudio, get_supervisor
+from playlist_resolver import spotify_search_query
+from spotify_matcher import video_gone
+from track import Track, is_local_file
+from utils import extract_video_id
 
 logger = logging.getLogger(__name__)
 
+def take_entries(entries, count):
+    """Pull up to count entries from a lazy playlist iterator"""
+    return list(itertools.islice(entries, count))
+
 class MusicPlayer:
-    def __init__(self, bot):
+    def __init__(self, bot, guild_id=None, extraction_cache=None, stream_cache=None, scheduler=None,
+                 audio_cache=None, playback_mode='passthrough', volume=1.0, supervisor=None, uploads=None,
+                 matcher=None):
         self.bot = bot
+        self.guild_id = guild_id
+        self.scheduler = scheduler  # Shared extraction worker pool
         self.voice_client = None
         self.current_song = None
-        
-        # Simplified yt-dlp configuration for better compatibility
-        self.ytdl_format_options = {
-            'format': 'bestaudio/best',
-            'restrictfilenames': True,
-            'noplaylist': True,
-            'nocheckcertificate': True,
-            'ignoreerrors': False,
-            'logtostderr': False,
-            'quiet': True,
-            'no_warnings': True,
-            'default_search': 'ytsearch',
-            'source_address': '0.0.0.0'
-        }
+        self.extraction_cache = extraction_cache  # Shared across guilds
+        self.stream_cache = stream_cache or StreamUrlCache()
+        self.audio_cache = audio_cache  # Shared on-disk Opus cache of popular tracks
+        self.playing_cached = False  # Whether the current source is a cached file
+        self.uploads = uploads  # Shared UploadStore; the playing upload holds a reference until it ends
+        self.matcher = matcher  # Shared SpotifyMatcher with the remembered Spotify -> YouTube matches
+        self.playback_mode = playback_mode  # 'passthrough' (Opus from ffmpeg) or 'pcm' (always through the DSP stage)
+        self.audio_processor = AudioProcessor(volume=volume)  # Live gain and effects for this guild
+        self.supervisor = supervisor or get_supervisor()  # Caps and tracks ffmpeg processes
+        self.stream_retry_window = 10  # Seconds in which a stream failure triggers re-resolution
+        self.finished_at = None  # When the previous track ended
+        self.last_transition_gap = None  # Silence before the current track started
+        self.auto_paused = False  # Paused because nobody was left listening
+        self.advancing = asyncio.Lock()  # Held while a song is picked and started, so only one caller does it
         
         # Discord-compatible FFmpeg options
         self.ffmpeg_options = {
             'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5 -nostdin',
-            'options': '-vn -filter:a "volume=0.5"'
+            'options': '-vn'
         }
-        
-        self.ytdl = yt_dlp.YoutubeDL(self.ytdl_format_options)
 
     async def connect(self, channel):
         """Connect to a voice channel"""
@@ -47,21 +62,35 @@ class MusicPlayer:
         if self.voice_client:
             await self.voice_client.disconnect()
             self.voice_client = None
-        
-        # Clean up temporary files
-        await self.cleanup_temp_files()
 
     def is_playing(self):
         """Check if music is currently playing"""
         return self.voice_client and self.voice_client.is_playing()
 
-    async def get_youtube_info(self, query):
+    def is_busy(self):
+        """Check if a song is playing or paused, i.e. the queue must not advance"""
+        return bool(self.voice_client and (self.voice_client.is_playing() or self.voice_client.is_paused()))
+
+    async def run_extraction(self, func, *args, priority=PRIORITY_SEARCH):
+        """Run blocking yt-dlp work on the extraction scheduler"""
+        if self.scheduler:
+            return await self.scheduler.run(func, *args, priority=priority, guild_id=self.guild_id)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+    async def get_youtube_info(self, query, priority=PRIORITY_SEARCH):
         """Get YouTube video information"""
+        if self.extraction_cache:
+            found, song_info = self.extraction_cache.get(query)
+            if found:
+                return Track.from_dict(song_info) if song_info else None
+
         try:
-            loop = asyncio.get_event_loop()
-            data = await loop.run_in_executor(None, lambda: self.ytdl.extract_info(query, download=False))
+            data = await self.run_extraction(extract_info, 'search', query, False, priority=priority)
             
             if not data:
+                if self.extraction_cache:
+                    self.extraction_cache.set_failure(query)
                 return None
                 
             if 'entries' in data and data['entries']:
@@ -72,125 +101,228 @@ class MusicPlayer:
                 video = data
 
             if not video:
+                if self.extraction_cache:
+                    self.extraction_cache.set_failure(query)
                 return None
 
-            song_info = {
-                'title': video.get('title', 'Unknown'),
-                'url': video.get('url'),
-                'webpage_url': video.get('webpage_url'),
-                'duration': self.format_duration(video.get('duration')),
-                'source': 'youtube',
-                'temp_file': False
-            }
+            song_info = Track(
+                video.get('title', 'Unknown'),
+                url=video.get('url'),
+                webpage_url=video.get('webpage_url'),
+                duration=video.get('duration'),
+                acodec=video.get('acodec')
+            )
+
+            if self.extraction_cache:
+                self.extraction_cache.set(query, song_info.to_dict())
+            self.stream_cache.set(song_info['webpage_url'], song_info['url'])
             
             return song_info
             
         except Exception as e:
+            # Not cached: timeouts, rate limits and extractor breakage are usually gone on the next try
             logger.error(f"Error extracting YouTube info: {e}")
             return None
 
+    async def match_spotify_track(self, track, priority=PRIORITY_SEARCH):
+        """Find the YouTube video for a Spotify track, reusing a remembered match"""
+        if not self.matcher:
+            return await self.get_youtube_info(spotify_search_query(track), priority=priority)
+
+        match = self.matcher.lookup(track)
+        if match is None:
+            # Flat results carry titles, channels and lengths without extracting each video
+            try:
+                data = await self.run_extraction(
+                    extract_info, 'playlist', self.matcher.search_query(track), False, priority=priority
+                )
+            except Exception as e:
+                logger.error(f"Error searching for Spotify track '{spotify_search_query(track)}': {e}")
+                return None
+            match = self.matcher.choose(track, (data or {}).get('entries') or [])
+            if match is None:
+                return None
+        return Track(match['title'], webpage_url=match['webpage_url'], duration=match['duration'])
+
+    async def run_local_extraction(self, func, *args, priority=PRIORITY_BULK):
+        """Run yt-dlp work whose state must stay in this process (e.g. a lazy entry iterator)"""
+        if self.scheduler and self.scheduler.mode == 'thread':
+            return await self.scheduler.run(func, *args, priority=priority, guild_id=self.guild_id)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+    def playlist_entry(self, entry):
+        """Build song info for a flat playlist entry"""
+        return Track(
+            entry.get('title', 'Unknown'),
+            webpage_url=f"https://www.youtube.com/watch?v={entry['id']}",
+            duration=entry.get('duration')
+        )
+
+    async def iter_playlist(self, playlist_url, chunk_size=50):
+        """Yield batches of YouTube playlist entries as yt-dlp pages through the playlist"""
+        # The lazy entry generator is tied to its YoutubeDL instance, so this
+        # ingestion gets a dedicated one instead of holding a pooled instance
+        ytdl = await self.run_local_extraction(get_pool().build, 'playlist')
+        data = await self.run_local_extraction(
+            functools.partial(ytdl.extract_info, playlist_url, download=False, process=False)
+        )
+
+        entries = iter(data.get('entries') or [])
+        while True:
+            chunk = await self.run_local_extraction(take_entries, entries, chunk_size)
+            if not chunk:
+                break
+            songs = [self.playlist_entry(entry) for entry in chunk if entry and entry.get('id')]
+            if songs:
+                yield songs
+
     async def get_playlist_info(self, playlist_url):
         """Get YouTube playlist information"""
         try:
-            # Modify options for playlist extraction
-            playlist_options = self.ytdl_format_options.copy()
-            playlist_options['extract_flat'] = True
-            playlist_ytdl = yt_dlp.YoutubeDL(playlist_options)
-            
-            loop = asyncio.get_event_loop()
-            data = await loop.run_in_executor(None, lambda: playlist_ytdl.extract_info(playlist_url, download=False))
-            
-            songs = []
-            if 'entries' in data:
-                for entry in data['entries'][:50]:  # Limit to 50 songs
-                    if entry:
-                        song_info = {
-                            'title': entry.get('title', 'Unknown'),
-                            'url': f"https://www.youtube.com/watch?v={entry['id']}",
-                            'webpage_url': f"https://www.youtube.com/watch?v={entry['id']}",
-                            'duration': self.format_duration(entry.get('duration')),
-                            'source': 'youtube',
-                            'temp_file': False
-                        }
-                        songs.append(song_info)
-            
-            return songs
+            return [song_info async for batch in self.iter_playlist(playlist_url) for song_info in batch]
             
         except Exception as e:
             logger.error(f"Error extracting playlist info: {e}")
             return []
 
-    async def create_audio_source(self, song_info):
+    async def resolve_placeholder(self, song, priority=PRIORITY_SEARCH):
+        """Resolve a lazy queue entry in place; returns False if it cannot be played"""
+        if not song.get('lazy'):
+            return True
+        if song.get('failed'):
+            return False
+
+        if song.get('spotify_info'):
+            song_info = await self.match_spotify_track(song['spotify_info'], priority=priority)
+        else:
+            song_info = await self.get_youtube_info(song['query'], priority=priority)
+        if not song_info:
+            song['failed'] = True
+            logger.warning(f"Could not resolve queue entry: {song['title']}")
+            return False
+
+        song.update(song_info)
+        song['lazy'] = False
+        return True
+
+    def cached_audio_id(self, song_info):
+        """Get the video ID of a song whose audio is cached on disk, or None"""
+        if not self.audio_cache or is_local_file(song_info) or song_info.get('lazy'):
+            return None
+        video_id = extract_video_id(song_info.get('webpage_url') or '')
+        return video_id if video_id and self.audio_cache.contains(video_id) else None
+
+    async def resolve_stream_url(self, song_info, refresh=False, priority=PRIORITY_STREAM):
+        """Get a playable stream URL, only re-extracting when the known one is stale"""
+        webpage_url = song_info.get('webpage_url')
+        if not webpage_url:
+            raise Exception("No webpage URL available for streaming")
+
+        if not refresh:
+            stream_url = self.stream_cache.get(webpage_url)
+            if stream_url:
+                return stream_url
+
+            # Reuse the URL get_youtube_info already resolved while it is still valid
+            stream_url = song_info.get('url')
+            if stream_url != webpage_url and self.stream_cache.is_fresh(stream_url):
+                self.stream_cache.set(webpage_url, stream_url)
+                return stream_url
+
+        logger.info(f"Resolving stream URL for: {webpage_url}")
+        data = await self.run_extraction(extract_info, 'stream', webpage_url, False, priority=priority)
+
+        if 'entries' in data:
+            data = data['entries'][0]
+
+        stream_url = data['url']
+        song_info['acodec'] = data.get('acodec')
+        self.stream_cache.set(webpage_url, stream_url)
+        return stream_url
+
+    def build_source(self, location, codec=None, before_options='-nostdin'):
+        """Wrap a file or stream URL in the audio source for the playback mode"""
+        if self.playback_mode == 'passthrough' and self.audio_processor.is_neutral():
+            # Opus input is copied into Discord's packets as-is; anything else is
+            # encoded by ffmpeg, so the player thread never touches PCM
+            return SupervisedOpusAudio(
+                location, codec=codec, before_options=before_options, options='-vn', supervisor=self.supervisor
+            )
+
+        source = SupervisedPCMAudio(location, before_options=before_options, options='-vn', supervisor=self.supervisor)
+        return ProcessedAudio(source, self.audio_processor)
+
+    def set_volume(self, volume):
+        """Change the gain; returns True if it applies to the current track immediately"""
+        self.audio_processor.set_volume(volume)
+        return self.is_processing()
+
+    def set_bass_boost(self, boost):
+        """Change the bass boost; returns True if it applies to the current track immediately"""
+        self.audio_processor.set_bass_boost(boost)
+        return self.is_processing()
+
+    def is_processing(self):
+        """Check whether the current track runs through the DSP stage"""
+        return bool(self.voice_client and isinstance(self.voice_client.source, ProcessedAudio))
+
+    async def create_audio_source(self, song_info, refresh_stream=False):
         """Create audio source for Discord using proven method"""
         try:
-            if song_info.get('temp_file'):
+            self.playing_cached = False
+            if is_local_file(song_info):
                 # Direct file playback
-                logger.info(f"Creating source for uploaded file: {song_info['url']}")
-                source = discord.FFmpegPCMAudio(song_info['url'], **self.ffmpeg_options)
-                return discord.PCMVolumeTransformer(source, volume=0.5)
+                logger.info(f"Creating source for local file: {song_info['url']}")
+                if self.playback_mode == 'passthrough' and self.audio_processor.is_neutral():
+                    return await self.supervisor.open(lambda: self.build_source(song_info['url']))
+                return await self.supervisor.open(lambda: ProcessedAudio(
+                    SupervisedPCMAudio(song_info['url'], supervisor=self.supervisor, **self.ffmpeg_options),
+                    self.audio_processor
+                ))
             else:
-                # YouTube streaming using working approach
-                webpage_url = song_info.get('webpage_url')
-                if not webpage_url:
-                    raise Exception("No webpage URL available for streaming")
-                
-                logger.info(f"Creating audio source from: {webpage_url}")
-                
-                # Use proven yt-dlp configuration
-                ytdl_opts = {
-                    'format': 'bestaudio/best',
-                    'outtmpl': '%(extractor)s-%(id)s-%(title)s.%(ext)s',
-                    'restrictfilenames': True,
-                    'noplaylist': True,
-                    'nocheckcertificate': True,
-                    'ignoreerrors': False,
-                    'logtostderr': False,
-                    'quiet': True,
-                    'no_warnings': True,
-                    'default_search': 'auto',
-                    'source_address': '0.0.0.0'
-                }
-
-                # Simple FFmpeg options that work with Discord
-                ffmpeg_opts = {
-                    'before_options': '-nostdin',
-                    'options': '-vn'
-                }
-                
-                ytdl = yt_dlp.YoutubeDL(ytdl_opts)
-                loop = asyncio.get_event_loop()
-                
+                # Popular tracks play from the local cache without extraction or network
+                video_id = extract_video_id(song_info.get('webpage_url') or '')
+                cached_path = self.audio_cache.get(video_id) if self.audio_cache and video_id and not refresh_stream else None
+                if cached_path:
+                    logger.info(f"Playing cached audio: {cached_path}")
+                    self.playing_cached = True
+                    return await self.supervisor.open(lambda: self.build_source(cached_path, codec='opus'))
+
+                logger.info(f"Creating audio source from: {song_info.get('webpage_url')}")
+
                 try:
-                    data = await loop.run_in_executor(None, lambda: ytdl.extract_info(webpage_url, download=False))
+                    stream_url = await self.resolve_stream_url(song_info, refresh=refresh_stream)
                 except Exception as e:
                     logger.error(f"Error extracting info: {e}")
                     raise
 
-                if 'entries' in data:
-                    data = data['entries'][0]
+                logger.info("Stream URL ready")
+                if self.audio_cache:
+                    self.audio_cache.record_play(video_id, stream_url)
 
-                stream_url = data['url']
-                logger.info(f"Stream URL extracted successfully")
-                
-                # Create PCM audio source with volume control
-                source = discord.FFmpegPCMAudio(stream_url, **ffmpeg_opts)
-                return discord.PCMVolumeTransformer(source, volume=0.5)
+                codec = song_info.get('acodec') or get_stream_codec(stream_url)
+                logger.info(f"Playback mode: {self.playback_mode} (source codec: {codec or 'unknown'})")
+                return await self.supervisor.open(lambda: self.build_source(stream_url, codec=codec))
                     
         except Exception as e:
             logger.error(f"Error creating audio source: {e}")
             raise
 
-    async def play_song(self, song_info, after_callback=None):
+    async def play_song(self, song_info, after_callback=None, refresh_stream=False):
         """Play a song"""
         if not self.voice_client:
             raise Exception("Not connected to a voice channel")
 
         self.current_song = song_info
+        self.last_transition_gap = None
         logger.info(f"Starting playback: {song_info['title']}")
 
         try:
-            source = await self.create_audio_source(song_info)
+            source = await self.create_audio_source(song_info, refresh_stream=refresh_stream)
             logger.info(f"Audio source created: {type(source)}")
+            started_at = time.monotonic()
+            from_cache = self.playing_cached
             
             def after_playing(error):
                 if error:
@@ -200,24 +332,38 @@ class MusicPlayer:
                     logger.error(f'Full error: {traceback.format_exc()}')
                 else:
                     logger.info(f"Finished playing: {song_info['title']}")
-                
-                # Clean up temp files
-                if song_info.get('temp_file') and song_info.get('url'):
-                    try:
-                        if os.path.exists(song_info['url']):
-                            os.remove(song_info['url'])
-                    except Exception as e:
-                        logger.error(f"Error removing temp file: {e}")
-                
+
+                # A reused stream URL that fails right away has most likely expired; resolve it once more
+                failed_early = time.monotonic() - started_at < self.stream_retry_window
+                if error and failed_early and not refresh_stream and not is_local_file(song_info):
+                    logger.warning(f"Retrying with a fresh stream URL: {song_info['title']}")
+                    self.supervisor.record_restart()
+                    self.stream_cache.invalidate(song_info.get('webpage_url'))
+                    if from_cache:
+                        # The cached file is unplayable; drop it and stream instead
+                        self.audio_cache.discard(extract_video_id(song_info['webpage_url']))
+                    asyncio.run_coroutine_threadsafe(self.retry_song(song_info, after_callback), self.bot.loop)
+                    return
+
+                self.finished_at = time.monotonic()
+
+                # The store is only touched from the event loop
+                if song_info.get('temp_file') and self.uploads:
+                    self.bot.loop.call_soon_threadsafe(self.uploads.release, song_info.get('url'))
+
                 if after_callback:
                     try:
-                        asyncio.run_coroutine_threadsafe(after_callback, self.bot.loop)
+                        callback = after_callback() if callable(after_callback) else after_callback
+                        asyncio.run_coroutine_threadsafe(callback, self.bot.loop)
                     except Exception as e:
                         logger.error(f"Error in after callback: {e}")
 
             logger.info(f"Voice client connected: {self.voice_client.is_connected()}")
             self.voice_client.play(source, after=after_playing)
-            logger.info(f"Play command sent to Discord")
+            if self.finished_at is not None:
+                self.last_transition_gap = time.monotonic() - self.finished_at
+                self.finished_at = None
+            logger.info("Play command sent to Discord")
             
             # Check if playback actually started
             await asyncio.sleep(0.5)
@@ -231,38 +377,27 @@ class MusicPlayer:
             logger.error(f"Exception details: {type(e).__name__}: {str(e)}")
             import traceback
             logger.error(f"Traceback: {traceback.format_exc()}")
-            if song_info.get('temp_file') and song_info.get('url'):
-                try:
-                    if os.path.exists(song_info['url']):
-                        os.remove(song_info['url'])
-                except:
-                    pass
+            if song_info.get('temp_file') and self.uploads:
+                self.uploads.release(song_info.get('url'))
+            if song_info.get('spotify_info') and self.matcher and video_gone(e):
+                # The remembered video was taken down; search again next time
+                self.matcher.forget(song_info['spotify_info'])
             raise
 
-    def format_duration(self, seconds):
-        """Format duration from seconds to MM:SS"""
-        if not seconds:
-            return "Unknown"
-        
-        minutes = seconds // 60
-        seconds = seconds % 60
-        return f"{minutes:02d}:{seconds:02d}"
-
-    async def cleanup_temp_files(self):
-        """Clean up any temporary files"""
-        try:
-            # Remove any temp files that might exist
-            for file in os.listdir('.'):
-                if file.startswith('temp_') and file.endswith('.mp3'):
-                    try:
-                        os.remove(file)
-                    except Exception as e:
-                        logger.error(f"Error removing temp file {file}: {e}")
-        except:
-            pass
+    async def retry_song(self, song_info, after_callback):
+        """Play a song again with a fresh stream URL, moving on to the next one if that fails too"""
+        async with self.advancing:
+            try:
+                await self.play_song(song_info, after_callback, refresh_stream=True)
+                return
+            except Exception as e:
+                logger.error(f"Retry failed for '{song_info['title']}': {e}")
+        # Outside the lock, since moving on takes it again
+        if after_callback:
+            callback = after_callback() if callable(after_callback) else after_callback
+            await callback
 
     async def cleanup(self):
         """Full cleanup of the player"""
         if self.voice_client:
             await self.voice_client.disconnect()
-        await self.cleanup_temp_files()
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import time
+from extraction_scheduler import PRIORITY_BULK
+from queue_manager import create_placeholder
+
+logger = logging.getLogger(__name__)
+
+def spotify_search_query(track):
+    """Build the YouTube search query for a Spotify track"""
+    return f"{track['artist']} - {track['name']}"
+
+def spotify_placeholder(track):
+    """Build a lazy queue entry for a Spotify track, matched on YouTube when it nears playback"""
+    query = spotify_search_query(track)
+    return create_placeholder(query, query, duration=track.get('duration'), spotify_info=track)
+
+async def iter_spotify_placeholders(spotify_handler, spotify_url, resolver=None):
+    """Yield batches of placeholders for a Spotify playlist or album as its pages arrive.
+
+    Each batch is also handed to resolver, if given, so it is matched ahead
+    of playback; closing the iterator early cancels that work.
+    """
+    batches = spotify_handler.iter_collection_tracks(spotify_url)
+    try:
+        async for batch in batches:
+            if batch:
+                placeholders = [spotify_placeholder(track) for track in batch]
+                if resolver:
+                    resolver.add(placeholders)
+                yield placeholders
+    except GeneratorExit:
+        if resolver:
+            resolver.cancel()
+        raise
+    finally:
+        await batches.aclose()
+
+
+class PlaylistResolver:
+    """Matches a playlist's queued placeholders on YouTube ahead of playback.
+
+    Entries are resolved in place, so queue order is kept whatever order the
+    lookups finish in. At most concurrency lookups run at once, started in
+    playlist order. Lookups not done by the per-playlist deadline are
+    cancelled; those entries stay lazy and are matched just before they play.
+    """
+
+    def __init__(self, player, queue_manager=None, concurrency=8, deadline=120):
+        self.player = player
+        self.queue_manager = queue_manager
+        self.semaphore = asyncio.Semaphore(max(1, concurrency))
+        self.deadline = deadline
+        self.deadline_at = time.monotonic() + deadline
+        self.songs = []
+        self.tasks = []
+
+    def add(self, songs):
+        """Start resolving a batch of queued placeholders"""
+        loop = asyncio.get_running_loop()
+        for song in songs:
+            self.songs.append(song)
+            self.tasks.append(loop.create_task(self.resolve(song)))
+
+    async def resolve(self, song):
+        """Match one placeholder once a lookup slot is free"""
+        async with self.semaphore:
+            try:
+                resolved = await self.player.resolve_placeholder(song, priority=PRIORITY_BULK)
+            except Exception as e:
+                logger.error(f"Error resolving '{song.get('title')}': {e}")
+                return
+        if resolved and self.queue_manager:
+            self.queue_manager.touch()  # The entry's title and duration changed
+
+    async def finish(self):
+        """Wait for lookups until the deadline, then report each entry as 'resolved', 'failed' or 'timed_out'"""
+        pending = [task for task in self.tasks if not task.done()]
+        try:
+            if pending:
+                await asyncio.wait(pending, timeout=max(0.0, self.deadline_at - time.monotonic()))
+        finally:
+            self.cancel()
+
+        report = {'resolved': [], 'failed': [], 'timed_out': []}
+        for song in self.songs:
+            if song.get('failed'):
+                report['failed'].append(song)
+            elif song.get('lazy'):
+                report['timed_out'].append(song)
+            else:
+                report['resolved'].append(song)
+        if report['timed_out']:
+            logger.warning(f"Playlist resolution deadline hit with {len(report['timed_out'])} tracks unmatched")
+        return report
+
+    def cancel(self):
+        """Cancel lookups that have not finished"""
+        for task in self.tasks:
+            task.cancel()
@@ -0,0 +1,126 @@
+import asyncio
+import itertools
+import logging
+from extraction_scheduler import PRIORITY_SEARCH
+from track import is_local_file
+
+logger = logging.getLogger(__name__)
+
+class TransitionStats:
+    """Tracks the silence between tracks, split by whether the next track was prefetched"""
+
+    def __init__(self):
+        self.counts = {'prefetched': 0, 'cold': 0}
+        self.totals = {'prefetched': 0.0, 'cold': 0.0}
+        self.maximums = {'prefetched': 0.0, 'cold': 0.0}
+
+    def record(self, gap, prefetched):
+        """Record one transition gap in seconds"""
+        kind = 'prefetched' if prefetched else 'cold'
+        self.counts[kind] += 1
+        self.totals[kind] += gap
+        self.maximums[kind] = max(self.maximums[kind], gap)
+
+    def stats(self):
+        """Get count, average and worst gap for each kind of transition"""
+        return {
+            kind: {
+                'transitions': self.counts[kind],
+                'avg_gap': self.totals[kind] / self.counts[kind] if self.counts[kind] else 0.0,
+                'max_gap': self.maximums[kind]
+            }
+            for kind in self.counts
+        }
+
+
+class Prefetcher:
+    """Resolves stream URLs for the next few queued tracks while the current one plays"""
+
+    def __init__(self, player, queue_manager, depth=2, transition_stats=None):
+        self.player = player
+        self.queue_manager = queue_manager
+        self.depth = depth
+        self.transition_stats = transition_stats
+        self.tasks = {}     # id(song) -> resolving task
+        self.resolved = {}  # id(song) -> song, kept alive so ids are not reused
+
+        queue_manager.add_listener(self.on_queue_changed)
+
+    def on_queue_changed(self, event):
+        """Re-plan prefetching whenever the queue changes"""
+        if event == 'clear':
+            self.cancel()
+            return
+        self.schedule()
+
+    def window(self):
+        """Get the songs that should be resolved ahead of time"""
+        return list(itertools.islice(self.queue_manager.queue, self.depth))
+
+    def schedule(self):
+        """Start resolving songs in the window and drop work for songs that left it"""
+        window = self.window()
+        wanted = {id(song) for song in window}
+
+        # The song that just started keeps its work so playback can use it
+        current = self.queue_manager.get_current_song()
+        if current is not None:
+            wanted.add(id(current))
+
+        # Shuffles, moves and removals push songs out of the window
+        for key in list(self.tasks):
+            if key not in wanted:
+                self.tasks.pop(key).cancel()
+
+        for key in list(self.resolved):
+            if key not in wanted:
+                del self.resolved[key]
+
+        for song in window:
+            key = id(song)
+            if key in self.tasks or key in self.resolved or is_local_file(song) or song.get('failed'):
+                continue
+            self.tasks[key] = asyncio.get_event_loop().create_task(self.prefetch(song))
+
+    async def prefetch(self, song):
+        """Resolve one song's stream URL in the background"""
+        key = id(song)
+        try:
+            # Placeholders are matched first, then their stream is resolved
+            if not await self.player.resolve_placeholder(song, priority=PRIORITY_SEARCH):
+                return
+            self.queue_manager.touch()  # The entry's title and duration may have changed
+            # Tracks in the on-disk audio cache need no stream URL
+            if not self.player.cached_audio_id(song):
+                await self.player.resolve_stream_url(song, priority=PRIORITY_SEARCH)
+            self.resolved[key] = song
+            logger.info(f"Prefetched stream for: {song['title']}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Prefetch failed for '{song.get('title')}': {e}")
+        finally:
+            if self.tasks.get(key) is asyncio.current_task():
+                del self.tasks[key]
+
+    async def wait_for(self, song):
+        """Wait for an in-flight prefetch of a song instead of resolving it twice"""
+        task = self.tasks.get(id(song))
+        if task:
+            await asyncio.wait([task])
+
+    def is_prefetched(self, song):
+        """Check whether a song's stream URL was resolved ahead of time"""
+        return self.resolved.get(id(song)) is song
+
+    def record_transition(self, gap, prefetched):
+        """Record the silence before a track started"""
+        if self.transition_stats:
+            self.transition_stats.record(gap, prefetched)
+
+    def cancel(self):
+        """Cancel all pending work and forget prefetched songs"""
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks.clear()
+        self.resolved.clear()
@@ -0,0 +1,345 @@
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+from indexed_queue import IndexedQueue
+from track import Track
+
+logger = logging.getLogger(__name__)
+
+def track_record(song_info):
+    """Get the JSON-ready form of a queue entry"""
+    return Track.from_dict(song_info).to_dict()
+
+def replay(records, current=None, songs=None):
+    """Apply journal records to a queue held as a list of track dicts.
+
+    Mirrors the QueueManager mutations that produced the records; shuffles
+    are replayed from their recorded seed.
+    """
+    songs = list(songs or [])
+    for op, *args in records:
+        if op == 'add':
+            songs.extend(args[0])
+        elif op == 'next':
+            current = songs.pop(0) if songs else None
+        elif op == 'finish':
+            current = None
+        elif op == 'remove':
+            del songs[args[0]]
+        elif op == 'range':
+            del songs[args[0]:args[1]]
+        elif op == 'user':
+            songs = [song for song in songs if song.get('requested_by') != args[0]]
+        elif op == 'move':
+            songs.insert(args[1], songs.pop(args[0]))
+        elif op == 'shuffle':
+            # Shuffled exactly as QueueManager shuffled its IndexedQueue
+            shuffled = IndexedQueue(songs)
+            shuffled.shuffle(random.Random(args[0]))
+            songs = list(shuffled)
+        elif op == 'clear':
+            current, songs = None, []
+    return current, songs
+
+
+class GuildJournal:
+    """One guild's view of the shared journal"""
+
+    def __init__(self, journal, guild_id):
+        self.journal = journal
+        self.guild_id = guild_id
+
+    def append(self, op, *args):
+        self.journal.append(self.guild_id, [op, *args])
+
+    def load(self):
+        return self.journal.load(self.guild_id)
+
+    def snapshot(self, current, songs):
+        self.journal.snapshot(self.guild_id, current, songs)
+
+
+class QueueJournal:
+    """Write-ahead journal of queue mutations so queues survive restarts.
+
+    Mutations are handed to a background writer thread, which appends them
+    to one log file per guild and group-commits: everything that arrived
+    since the last write is written and fsynced together, at most once per
+    commit_interval. After snapshot_every records the writer folds the log
+    into a snapshot. Files carry a generation number ({guild}-{gen}.snap and
+    {guild}-{gen}.log); a new snapshot starts the next generation, so a
+    crash while compacting leaves either the old or the new state intact.
+    When several processes share the directory, owns(guild_id) limits each
+    one to its own guilds' files. Journaled queues are read at startup,
+    before the writer starts, so restoring a guild later does no file I/O.
+    """
+
+    def __init__(self, directory='data/queues', commit_interval=0.05, snapshot_every=1000, max_open_files=256,
+                 owns=None):
+        self.directory = directory
+        self.owns = owns  # Predicate for the guilds this process is responsible for
+        self.commit_interval = commit_interval
+        self.snapshot_every = snapshot_every
+        self.max_open_files = max_open_files
+        self.pending = queue.SimpleQueue()
+        self.files = OrderedDict()  # Guild ID -> open log file, least recently written first
+        self.generations = {}  # Guild ID -> current generation
+        self.counts = {}  # Guild ID -> records in the current log
+        self.preloaded = {}  # Guild ID -> (current, songs) read at startup and not restored yet
+
+        self.records = 0
+        self.commits = 0
+        self.syncs = 0
+        self.snapshots = 0
+        self.restored = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.scan()
+        self.preload()
+        self.thread = threading.Thread(target=self.run, name='queue-journal', daemon=True)
+        self.thread.start()
+
+    def path_for(self, guild_id, generation, kind):
+        return os.path.join(self.directory, f"{guild_id}-{generation}.{kind}")
+
+    def scan(self):
+        """Find each guild's current generation and delete files left from older ones"""
+        found = {}
+        for name in os.listdir(self.directory):
+            stem, _, kind = name.rpartition('.')
+            guild_id, _, generation = stem.partition('-')
+            if self.owns and guild_id.isdigit() and not self.owns(int(guild_id)):
+                continue
+            if kind == 'tmp':
+                os.remove(os.path.join(self.directory, name))
+                continue
+            if kind not in ('snap', 'log') or not guild_id.isdigit() or not generation.isdigit():
+                continue
+            found.setdefault(int(guild_id), []).append((int(generation), kind == 'snap', name))
+
+        for guild_id, files in found.items():
+            # The newest snapshot wins; without one only generation 0 can exist
+            snapshots = [generation for generation, is_snapshot, _ in files if is_snapshot]
+            current = max(snapshots) if snapshots else 0
+            self.generations[guild_id] = current
+            for generation, _, name in files:
+                if generation < current:
+                    os.remove(os.path.join(self.directory, name))
+        logger.info(f"Queue journal has state for {len(self.generations)} guilds")
+
+    def preload(self):
+        """Read every guild's journaled queue so load() never touches the disk"""
+        for guild_id in self.generations:
+            current, songs = self.read_state(guild_id)
+            if current or songs:
+                self.preloaded[guild_id] = (current, songs)
+
+    def guild(self, guild_id):
+        """Get the journal handle for one guild"""
+        return GuildJournal(self, guild_id)
+
+    def append(self, guild_id, record):
+        """Queue a record for the writer; never blocks"""
+        self.pending.put(('record', guild_id, record))
+
+    def snapshot(self, guild_id, current, songs):
+        """Replace a guild's journal with a snapshot of the given state"""
+        self.pending.put(('snapshot', guild_id, (current, songs)))
+
+    def drop(self, guild_id):
+        """Forget a guild's journal, e.g. after the bot left the guild"""
+        self.preloaded.pop(guild_id, None)
+        self.pending.put(('drop', guild_id, None))
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far is on disk"""
+        done = threading.Event()
+        self.pending.put(('flush', None, done))
+        return done.wait(timeout)
+
+    def close(self):
+        """Flush and stop the writer thread"""
+        if self.thread.is_alive():
+            self.pending.put(('stop', None, None))
+            self.thread.join()
+
+    def run(self):
+        """Writer thread: group-commit records as they arrive"""
+        while True:
+            batch = [self.pending.get()]
+            started = time.monotonic()
+            while True:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                stop = self.commit(batch)
+            except Exception as e:
+                logger.error(f"Queue journal write failed: {e}")
+                stop = any(kind == 'stop' for kind, _, _ in batch)
+
+            for kind, _, done in batch:
+                if kind == 'flush':
+                    done.set()
+            if stop:
+                for log in self.files.values():
+                    log.close()
+                self.files.clear()
+                return
+
+            # Let records accumulate so a burst of mutations shares one fsync
+            remaining = self.commit_interval - (time.monotonic() - started)
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def commit(self, batch):
+        """Write one batch and fsync every log it touched; returns True on a stop request"""
+        touched = {}
+        compact = set()
+        stop = False
+        for kind, guild_id, payload in batch:
+            if kind == 'record':
+                log = self.open_log(guild_id)
+                log.write(json.dumps(payload, separators=(',', ':')) + '\n')
+                touched[guild_id] = log
+                self.records += 1
+                self.counts[guild_id] = self.counts.get(guild_id, 0) + 1
+                if self.counts[guild_id] >= self.snapshot_every:
+                    compact.add(guild_id)
+            elif kind == 'snapshot':
+                self.sync(touched.pop(guild_id, None))
+                compact.discard(guild_id)
+                self.write_snapshot(guild_id, *payload)
+            elif kind == 'drop':
+                touched.pop(guild_id, None)
+                compact.discard(guild_id)
+                self.remove_guild(guild_id)
+            elif kind == 'stop':
+                stop = True
+
+        for log in touched.values():
+            self.sync(log)
+        if touched:
+            self.commits += 1
+
+        for guild_id in compact:
+            # Files only change on this thread, so they can be read here while it writes nothing else
+            current, songs = self.read_state(guild_id)
+            self.write_snapshot(guild_id, current, songs)
+        return stop
+
+    def sync(self, log):
+        if log and not log.closed:
+            log.flush()
+            os.fsync(log.fileno())
+            self.syncs += 1
+
+    def open_log(self, guild_id):
+        """Get the append handle for a guild's current log"""
+        log = self.files.get(guild_id)
+        if log:
+            self.files.move_to_end(guild_id)
+            return log
+
+        if len(self.files) >= self.max_open_files:
+            _, oldest = self.files.popitem(last=False)
+            self.sync(oldest)
+            oldest.close()
+        generation = self.generations.setdefault(guild_id, 0)
+        log = open(self.path_for(guild_id, generation, 'log'), 'a', encoding='utf-8')
+        self.files[guild_id] = log
+        return log
+
+    def close_log(self, guild_id):
+        log = self.files.pop(guild_id, None)
+        if log:
+            log.close()
+
+    def write_snapshot(self, guild_id, current, songs):
+        """Start a new generation from the given state and delete the previous one"""
+        self.close_log(guild_id)
+        generation = self.generations.get(guild_id, 0)
+        path = self.path_for(guild_id, generation + 1, 'snap')
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({'current': current, 'queue': songs}, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(f"{path}.tmp", path)
+        self.generations[guild_id] = generation + 1
+        self.counts[guild_id] = 0
+        for kind in ('snap', 'log'):
+            try:
+                os.remove(self.path_for(guild_id, generation, kind))
+            except FileNotFoundError:
+                pass
+        self.snapshots += 1
+
+    def remove_guild(self, guild_id):
+        self.close_log(guild_id)
+        generation = self.generations.pop(guild_id, None)
+        self.counts.pop(guild_id, None)
+        if generation is None:
+            return
+        for kind in ('snap', 'log'):
+            try:
+                os.remove(self.path_for(guild_id, generation, kind))
+            except FileNotFoundError:
+                pass
+
+    def read_state(self, guild_id):
+        """Rebuild (current, songs) from a guild's snapshot and log; only at startup or on the writer thread"""
+        generation = self.generations.get(guild_id)
+        if generation is None:
+            return None, []
+
+        current, songs = None, []
+        try:
+            with open(self.path_for(guild_id, generation, 'snap'), encoding='utf-8') as f:
+                state = json.load(f)
+            current, songs = state['current'], state['queue']
+        except FileNotFoundError:
+            pass
+
+        records = []
+        try:
+            with open(self.path_for(guild_id, generation, 'log'), encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break  # A torn final line from a crash mid-write
+        except FileNotFoundError:
+            pass
+
+        return replay(records, current, songs)
+
+    def load(self, guild_id):
+        """Get a guild's journaled queue as (current, songs) track dicts, as read at startup.
+
+        Each guild's state is handed out once; after that the restored queue's
+        own records and snapshots take over, so later calls return nothing.
+        """
+        current, songs = self.preloaded.pop(guild_id, (None, []))
+        if current or songs:
+            self.restored += 1
+        return current, songs
+
+    def stats(self):
+        """Get write counters for the journal"""
+        return {
+            'guilds': len(self.generations),
+            'records': self.records,
+            'commits': self.commits,
+            'syncs': self.syncs,
+            'snapshots': self.snapshots,
+            'restored': self.restored,
+            'pending': self.pending.qsize()
+        }
@@ -1,18 +1,145 @@
 from collections import deque
 import logging
+import os
+import random
+from indexed_queue import IndexedQueue
+from queue_journal import track_record
+from track import Track, is_local_file
+from utils import extract_video_id
 
 logger = logging.getLogger(__name__)
 
+def create_placeholder(title, query, duration=0, **extra):
+    """Build a lightweight queue entry that is resolved just before it plays"""
+    return Track(title, query=query, duration=duration, lazy=True, **extra)
+
+def song_key(song_info):
+    """Identify the track behind a queue entry for duplicate detection"""
+    # Spotify entries keep their track URL after being matched, so their key never changes
+    spotify_info = song_info.get('spotify_info')
+    if spotify_info and spotify_info.get('external_url'):
+        return f"spotify:{spotify_info['external_url']}"
+    video_id = extract_video_id(song_info.get('webpage_url') or '')
+    return f"youtube:{video_id}" if video_id else None
+
 class QueueManager:
-    def __init__(self):
-        self.queue = deque()
+    def __init__(self, journal=None, uploads=None):
+        self.journal = journal  # GuildJournal that records every mutation, if persistence is on
+        self.uploads = uploads  # UploadStore whose files queued uploads hold references to
+        self.queue = IndexedQueue()
+        self.song_counts = {}  # song_key -> entries queued
+        self.user_counts = {}  # requested_by -> entries queued
         self.current_song = None
         self.history = deque(maxlen=10)  # Keep last 10 played songs
+        self.version = 0  # Bumped on every mutation
+        self.listeners = []
+        self.page_cache = {}  # (render, page, per_page) -> rendered page, valid for page_cache_version
+        self.page_cache_version = 0
+
+    def add_listener(self, callback):
+        """Register a callback invoked with the event name after each mutation"""
+        self.listeners.append(callback)
+
+    def record(self, op, *args):
+        """Journal a mutation so the queue can be rebuilt after a restart"""
+        if self.journal:
+            self.journal.append(op, *args)
+
+    def restore(self):
+        """Rebuild the queue from the journal; returns the number of songs restored"""
+        if not self.journal:
+            return 0
+        current, songs = self.journal.load()
+        if current:
+            songs.insert(0, current)  # The interrupted song plays again first
+        # Uploads may have been evicted from the store and library files deleted while the bot was down
+        songs = [song for song in songs if self.keep_restored(song)]
+        if not songs:
+            return 0
+
+        tracks = [Track.from_dict(song) for song in songs]
+        for song_info in tracks:
+            self.index(song_info)
+        self.queue.extend(tracks)
+        self.journal.snapshot(None, songs)
+        logger.info(f"Restored {len(tracks)} songs from the queue journal")
+        self.notify('add')
+        return len(tracks)
+
+    def keep_restored(self, song):
+        """Check whether a journaled entry can still play, taking a reference to its upload"""
+        if song.get('temp_file'):
+            return bool(self.uploads) and self.uploads.acquire(song.get('url') or '')
+        return not is_local_file(song) or os.path.exists(song.get('url') or '')
+
+    def release(self, songs):
+        """Give back the upload references held by removed entries"""
+        if not self.uploads:
+            return
+        for song_info in songs:
+            if song_info.get('temp_file') and song_info.get('url'):
+                self.uploads.release(song_info['url'])
+
+    def notify(self, event):
+        """Record a mutation and tell listeners about it"""
+        self.version += 1
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error(f"Queue listener failed on '{event}': {e}")
+
+    def touch(self):
+        """Note that queued entries changed in place, e.g. a placeholder was resolved"""
+        self.version += 1
+
+    def index(self, song_info):
+        """Count a queued entry in the song and user indexes"""
+        key = song_key(song_info)
+        if key:
+            self.song_counts[key] = self.song_counts.get(key, 0) + 1
+        user = song_info.get('requested_by')
+        if user is not None:
+            self.user_counts[user] = self.user_counts.get(user, 0) + 1
 
-    def add_song(self, song_info):
+    def unindex(self, song_info):
+        """Drop a removed entry from the song and user indexes"""
+        for counts, key in ((self.song_counts, song_key(song_info)), (self.user_counts, song_info.get('requested_by'))):
+            if key is None or key not in counts:
+                continue
+            counts[key] -= 1
+            if not counts[key]:
+                del counts[key]
+
+    def add_song(self, song_info, requested_by=None):
         """Add a song to the queue"""
+        if requested_by is not None:
+            song_info['requested_by'] = requested_by
         self.queue.append(song_info)
+        self.index(song_info)
+        if self.journal:
+            self.record('add', [track_record(song_info)])
         logger.info(f"Added song to queue: {song_info['title']}")
+        self.notify('add')
+
+    def add_songs(self, songs, requested_by=None):
+        """Add many songs to the queue at once"""
+        if not songs:
+            return
+        for song_info in songs:
+            if requested_by is not None:
+                song_info['requested_by'] = requested_by
+            self.index(song_info)
+        self.queue.extend(songs)
+        if self.journal:
+            self.record('add', [track_record(song_info) for song_info in songs])
+        logger.info(f"Added {len(songs)} songs to queue")
+        self.notify('add')
+
+    def is_queued(self, song_info):
+        """Check whether the same track is already waiting in the queue"""
+        key = song_key(song_info)
+        return key is not None and key in self.song_counts
 
     def get_next_song(self):
         """Get the next song from the queue"""
@@ -21,18 +148,54 @@ class QueueManager:
                 self.history.appendleft(self.current_song)
             
             self.current_song = self.queue.popleft()
+            self.unindex(self.current_song)
+            self.record('next')
             logger.info(f"Playing next song: {self.current_song['title']}")
+            self.notify('advance')
             return self.current_song
         
         return None
 
+    def finish(self):
+        """Note that the current song ended with nothing queued after it"""
+        if self.current_song is None:
+            return
+        self.history.appendleft(self.current_song)
+        self.current_song = None
+        # Otherwise the journal keeps it as current and a restart would play it again
+        self.record('finish')
+        self.notify('finish')
+
     def get_current_song(self):
         """Get the currently playing song"""
         return self.current_song
 
-    def get_queue_list(self):
-        """Get a list of upcoming songs"""
-        return list(self.queue)
+    def get_queue_list(self, start=0, limit=None):
+        """Get a list of upcoming songs, optionally just a window of them"""
+        if limit is None:
+            return list(self.queue) if start == 0 else self.queue.slice(start, len(self.queue))
+        return self.queue.slice(start, start + limit)
+
+    def page_count(self, per_page=10):
+        """Get the number of pages the upcoming songs fill, at least one"""
+        return max(1, -(-len(self.queue) // per_page))
+
+    def render_page(self, page, render, per_page=10):
+        """Render one page of upcoming songs, reusing the result until the queue changes.
+
+        render(songs, start) gets the page's songs and the index of the first;
+        its output is cached under the queue version, so it must depend only
+        on those songs.
+        """
+        if self.page_cache_version != self.version:
+            self.page_cache.clear()
+            self.page_cache_version = self.version
+        key = (render, page, per_page)
+        rendered = self.page_cache.get(key)
+        if rendered is None:
+            start = page * per_page
+            rendered = self.page_cache[key] = render(self.queue.slice(start, start + per_page), start)
+        return rendered
 
     def is_empty(self):
         """Check if the queue is empty"""
@@ -40,19 +203,54 @@ class QueueManager:
 
     def clear(self):
         """Clear the entire queue"""
+        if self.uploads:
+            self.release(list(self.queue))
         self.queue.clear()
+        self.song_counts.clear()
+        self.user_counts.clear()
         self.current_song = None
+        self.record('clear')
         logger.info("Queue cleared")
+        self.notify('clear')
 
     def remove_song(self, index):
         """Remove a song at specific index"""
         if 0 <= index < len(self.queue):
-            removed_song = self.queue[index]
-            del self.queue[index]
+            removed_song = self.queue.pop(index)
+            self.unindex(removed_song)
+            self.release([removed_song])
+            self.record('remove', index)
             logger.info(f"Removed song: {removed_song['title']}")
+            self.notify('remove')
             return removed_song
         return None
 
+    def remove_range(self, start, stop):
+        """Remove the songs in positions [start, stop)"""
+        start = max(0, start)
+        removed = self.queue.remove_range(start, stop)
+        if removed:
+            for song_info in removed:
+                self.unindex(song_info)
+            self.release(removed)
+            self.record('range', start, start + len(removed))
+            logger.info(f"Removed {len(removed)} songs")
+            self.notify('remove')
+        return removed
+
+    def remove_by_user(self, user_id):
+        """Remove every song a user requested"""
+        if user_id not in self.user_counts:
+            return []
+        removed = self.queue.remove_if(lambda song_info: song_info.get('requested_by') == user_id)
+        for song_info in removed:
+            self.unindex(song_info)
+        self.release(removed)
+        self.record('user', user_id)
+        logger.info(f"Removed {len(removed)} songs requested by {user_id}")
+        self.notify('remove')
+        return removed
+
     def get_queue_length(self):
         """Get the number of songs in queue"""
         return len(self.queue)
@@ -63,19 +261,19 @@ class QueueManager:
 
     def shuffle(self):
         """Shuffle the queue"""
-        import random
-        queue_list = list(self.queue)
-        random.shuffle(queue_list)
-        self.queue = deque(queue_list)
+        # A recorded seed lets the journal replay the same order
+        seed = random.getrandbits(32)
+        self.queue.shuffle(random.Random(seed))
+        self.record('shuffle', seed)
         logger.info("Queue shuffled")
+        self.notify('shuffle')
 
     def move_song(self, from_index, to_index):
         """Move a song from one position to another"""
         if 0 <= from_index < len(self.queue) and 0 <= to_index < len(self.queue):
-            queue_list = list(self.queue)
-            song = queue_list.pop(from_index)
-            queue_list.insert(to_index, song)
-            self.queue = deque(queue_list)
+            self.queue.move(from_index, to_index)
+            self.record('move', from_index, to_index)
             logger.info(f"Moved song from position {from_index} to {to_index}")
+            self.notify('move')
             return True
         return False
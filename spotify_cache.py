@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+from cache import Cache
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 3600
+
+class SpotifyCache:
+    """Persistent cache of Spotify track, album and playlist metadata.
+
+    Tracks and albums are effectively immutable and live for a long time.
+    Playlists are stored with their snapshot_id so an unchanged playlist can
+    be confirmed with one lightweight request, or none at all if it was
+    checked within the last playlist_recheck seconds. Entries are read and
+    written on the default executor, since a playlist can be a large JSON blob.
+    """
+
+    def __init__(self, backend=None, track_ttl=30 * DAY, album_ttl=30 * DAY,
+                 playlist_ttl=7 * DAY, playlist_recheck=300):
+        self.cache = Cache(backend, ttl=track_ttl)
+        self.ttls = {'track': track_ttl, 'album': album_ttl, 'playlist': playlist_ttl}
+        self.playlist_recheck = playlist_recheck
+        self.hits = {kind: 0 for kind in self.ttls}
+        self.misses = {kind: 0 for kind in self.ttls}
+        self.snapshot_checks = 0
+        self.listeners = []
+
+    def add_listener(self, callback):
+        """Register a callback invoked with the new or changed track dicts of each entry stored"""
+        self.listeners.append(callback)
+
+    def tracks_in(self, kind, value):
+        """Get the track dicts held by a cached entry"""
+        if kind == 'track':
+            return [value]
+        if kind == 'playlist':
+            value = value['info']
+        return value.get('tracks', [])
+
+    async def lookup(self, kind, spotify_id):
+        """Get a cached entry of a kind, counting the hit or miss"""
+        loop = asyncio.get_running_loop()
+        found, value = await loop.run_in_executor(None, self.cache.lookup, f"{kind}:{spotify_id}")
+        if found:
+            self.hits[kind] += 1
+            return value
+        self.misses[kind] += 1
+        return None
+
+    async def store(self, kind, spotify_id, value, previous=None):
+        """Store an entry of a kind with that kind's TTL, notifying listeners of tracks not in previous"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.cache.set, f"{kind}:{spotify_id}", value, self.ttls[kind])
+        if not self.listeners:
+            return
+        tracks = self.tracks_in(kind, value)
+        if previous is not None:
+            known = {track.get('external_url'): track for track in self.tracks_in(kind, previous)}
+            tracks = [track for track in tracks if known.get(track.get('external_url')) != track]
+        if tracks:
+            for listener in self.listeners:
+                listener(tracks)
+
+    def recent_tracks(self, limit):
+        """Get up to limit tracks from the most recently used entries"""
+        tracks = []
+        for key, value in self.cache.recent(limit):
+            kind = key.partition(':')[0]
+            if kind in self.ttls:
+                tracks.extend(self.tracks_in(kind, value))
+                if len(tracks) >= limit:
+                    break
+        return tracks[:limit]
+
+    async def get_track(self, track_id):
+        """Get cached track metadata"""
+        return await self.lookup('track', track_id)
+
+    async def set_track(self, track_id, track_info):
+        """Cache track metadata"""
+        await self.store('track', track_id, track_info)
+
+    async def get_album(self, album_id):
+        """Get cached album metadata with its tracks"""
+        return await self.lookup('album', album_id)
+
+    async def set_album(self, album_id, album_info):
+        """Cache album metadata with its tracks"""
+        await self.store('album', album_id, album_info)
+
+    async def get_playlist(self, playlist_id):
+        """Get the cached playlist entry: {'snapshot_id', 'checked_at', 'info'}"""
+        return await self.lookup('playlist', playlist_id)
+
+    def playlist_needs_check(self, entry):
+        """Check whether a cached playlist should be revalidated against Spotify"""
+        return time.time() - entry['checked_at'] >= self.playlist_recheck
+
+    async def set_playlist(self, playlist_id, snapshot_id, playlist_info, previous=None):
+        """Cache a playlist under its current snapshot_id; previous is the outdated entry it replaces"""
+        await self.store('playlist', playlist_id, {
+            'snapshot_id': snapshot_id,
+            'checked_at': time.time(),
+            'info': playlist_info
+        }, previous)
+
+    async def confirm_playlist(self, playlist_id, entry):
+        """Record that a cached playlist's snapshot is still current"""
+        self.snapshot_checks += 1
+        entry['checked_at'] = time.time()
+        # Nothing in it changed, so listeners have already seen every track
+        await self.store('playlist', playlist_id, entry, entry)
+
+    def stats(self):
+        """Get hit/miss counters per kind of metadata"""
+        lookups = sum(self.hits.values()) + sum(self.misses.values())
+        return {
+            'entries': len(self.cache.backend),
+            'evictions': self.cache.backend.evictions,
+            'hit_rate': sum(self.hits.values()) / lookups if lookups else 0.0,
+            'snapshot_checks': self.snapshot_checks,
+            'kinds': {kind: {'hits': self.hits[kind], 'misses': self.misses[kind]} for kind in self.ttls}
+        }
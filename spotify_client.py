@@ -0,0 +1,148 @@
+import asyncio
+import base64
+import logging
+import time
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+class SpotifyAPIError(Exception):
+    """Raised when the Spotify Web API returns an error response"""
+
+    def __init__(self, status, message):
+        super().__init__(f"Spotify API error {status}: {message}")
+        self.status = status
+
+
+class SpotifyClient:
+    """Non-blocking Spotify Web API client with a pooled session and cached token.
+
+    The API and token URLs can be pointed at a local fake server for testing.
+    """
+
+    def __init__(self, client_id, client_secret, api_base='https://api.spotify.com/v1',
+                 token_url='https://accounts.spotify.com/api/token', max_connections=20,
+                 page_concurrency=8, timeout=15):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.api_base = api_base.rstrip('/')
+        self.token_url = token_url
+        self.max_connections = max_connections
+        self.page_concurrency = page_concurrency
+        self.timeout = timeout
+
+        self.session = None
+        self.token = None
+        self.token_expires_at = 0
+        self.token_lock = None
+        self.requests = 0
+
+    async def get_session(self):
+        """Get the shared HTTP session, creating it inside the running loop"""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self.session
+
+    async def get_token(self, force=False):
+        """Get a client-credentials access token, reusing it until shortly before expiry"""
+        if self.token_lock is None:
+            self.token_lock = asyncio.Lock()
+
+        async with self.token_lock:
+            if not force and self.token and time.time() < self.token_expires_at - 60:
+                return self.token
+
+            credentials = base64.b64encode(f"{self.client_id}:{self.client_secret}".encode()).decode()
+            session = await self.get_session()
+            async with session.post(
+                self.token_url,
+                data={'grant_type': 'client_credentials'},
+                headers={'Authorization': f"Basic {credentials}"}
+            ) as response:
+                if response.status != 200:
+                    raise SpotifyAPIError(response.status, await response.text())
+                payload = await response.json()
+
+            self.token = payload['access_token']
+            self.token_expires_at = time.time() + payload.get('expires_in', 3600)
+            logger.info("Spotify access token refreshed")
+            return self.token
+
+    async def get(self, path, params=None, retries=3):
+        """GET an API path (or absolute URL) and return the decoded JSON"""
+        url = path if path.startswith('http') else f"{self.api_base}{path}"
+        session = await self.get_session()
+        force_token = False
+
+        for attempt in range(retries + 1):
+            token = await self.get_token(force=force_token)
+            self.requests += 1
+            async with session.get(url, params=params, headers={'Authorization': f"Bearer {token}"}) as response:
+                if response.status == 200:
+                    return await response.json()
+
+                if response.status == 401 and not force_token:
+                    force_token = True
+                    continue
+
+                if response.status == 429 and attempt < retries:
+                    delay = float(response.headers.get('Retry-After', '1'))
+                    logger.warning(f"Spotify rate limit hit, retrying in {delay}s")
+                    await asyncio.sleep(delay)
+                    continue
+
+                raise SpotifyAPIError(response.status, await response.text())
+
+        raise SpotifyAPIError(429, "Retries exhausted")
+
+    async def iter_pages(self, path, first_page, max_items=None):
+        """Yield the items of a paged collection page by page, in order.
+
+        The first page tells us the total and page size, so the remaining
+        pages are fetched in parallel by offset instead of following 'next';
+        each page is yielded as soon as it and every page before it arrived.
+        """
+        items = list(first_page['items'])
+        total = first_page.get('total', len(items))
+        if max_items is not None:
+            total = min(total, max_items)
+
+        yield items[:total]
+
+        page_size = first_page.get('limit') or len(items)
+        if not first_page.get('next') or not page_size or len(items) >= total:
+            return
+
+        semaphore = asyncio.Semaphore(self.page_concurrency)
+
+        async def fetch(offset):
+            async with semaphore:
+                page = await self.get(path, params={'offset': offset, 'limit': page_size})
+                return page['items']
+
+        start = first_page.get('offset', 0) + len(items)
+        tasks = [asyncio.ensure_future(fetch(offset)) for offset in range(start, total, page_size)]
+        try:
+            fetched = len(items)
+            for task in tasks:
+                page = await task
+                yield page[:total - fetched]
+                fetched += len(page)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def get_all_items(self, path, first_page, max_items=None):
+        """Collect every item of a paged collection"""
+        items = []
+        async for page in self.iter_pages(path, first_page, max_items=max_items):
+            items.extend(page)
+        return items
+
+    async def close(self):
+        """Close the HTTP session"""
+        if self.session and not self.session.closed:
+            await self.session.close()
@@ -1,23 +1,19 @@
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
 import logging
 import re
+from spotify_client import SpotifyClient
 
 logger = logging.getLogger(__name__)
 
 class SpotifyHandler:
-    def __init__(self, client_id, client_secret):
+    def __init__(self, client_id, client_secret, cache=None, **client_options):
         self.client_id = client_id
         self.client_secret = client_secret
         self.spotify = None
+        self.cache = cache  # Optional SpotifyCache
         
         if client_id and client_secret and client_id != 'your_spotify_client_id':
             try:
-                client_credentials_manager = SpotifyClientCredentials(
-                    client_id=client_id,
-                    client_secret=client_secret
-                )
-                self.spotify = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
+                self.spotify = SpotifyClient(client_id, client_secret, **client_options)
                 logger.info("Spotify client initialized successfully")
             except Exception as e:
                 logger.error(f"Failed to initialize Spotify client: {e}")
@@ -64,106 +60,174 @@ class SpotifyHandler:
 
     async def get_single_track(self, track_id):
         """Get information for a single track"""
+        if self.cache:
+            cached = await self.cache.get_track(track_id)
+            if cached:
+                return cached
+
         try:
-            track = self.spotify.track(track_id)
+            track = await self.spotify.get(f"/tracks/{track_id}")
             
-            return {
+            track_info = {
                 'type': 'track',
                 'name': track['name'],
                 'artist': ', '.join([artist['name'] for artist in track['artists']]),
                 'album': track['album']['name'],
                 'duration': track['duration_ms'] // 1000,
-                'external_url': track['external_urls']['spotify']
+                'external_url': track['external_urls']['spotify'],
+                'isrc': track.get('external_ids', {}).get('isrc')
             }
+            if self.cache:
+                await self.cache.set_track(track_id, track_info)
+            return track_info
         except Exception as e:
             logger.error(f"Error fetching track {track_id}: {e}")
             raise
 
+    def parse_track(self, track, album_name=None):
+        """Convert a Spotify track object to our track info format"""
+        return {
+            'name': track['name'],
+            'artist': ', '.join([artist['name'] for artist in track['artists']]),
+            'album': album_name or track['album']['name'],
+            'duration': track['duration_ms'] // 1000,
+            'external_url': track['external_urls']['spotify'],
+            'isrc': track.get('external_ids', {}).get('isrc')  # Album track listings leave this out
+        }
+
+    async def iter_collection_tracks(self, spotify_url, collection_info=None):
+        """Yield batches of tracks from a playlist or album URL as pages arrive"""
+        if not self.spotify:
+            raise Exception("Spotify client not initialized. Please check your credentials.")
+
+        collection_id = self.extract_spotify_id(spotify_url)
+        if not collection_id:
+            raise Exception("Invalid Spotify URL")
+
+        if '/playlist/' in spotify_url:
+            batches = self.iter_playlist_tracks(collection_id, collection_info)
+        elif '/album/' in spotify_url:
+            batches = self.iter_album_tracks(collection_id, collection_info)
+        else:
+            raise Exception("Only Spotify playlists and albums can be streamed")
+
+        async for batch in batches:
+            yield batch
+
+    async def iter_playlist_tracks(self, playlist_id, playlist_info=None):
+        """Yield batches of playlist tracks; playlist_info is filled with the playlist details"""
+        playlist_info = playlist_info if playlist_info is not None else {}
+
+        cached = await self.cache.get_playlist(playlist_id) if self.cache else None
+        if cached:
+            fresh = not self.cache.playlist_needs_check(cached)
+            if not fresh:
+                # One small request tells us whether the playlist changed
+                try:
+                    current = await self.spotify.get(f"/playlists/{playlist_id}", params={'fields': 'snapshot_id'})
+                    fresh = current.get('snapshot_id') == cached['snapshot_id']
+                    if fresh:
+                        await self.cache.confirm_playlist(playlist_id, cached)
+                except Exception as e:
+                    logger.warning(f"Could not revalidate cached playlist {playlist_id}: {e}")
+
+            if fresh:
+                playlist_info.update(cached['info'])
+                yield cached['info']['tracks']
+                return
+
+        try:
+            playlist = await self.spotify.get(f"/playlists/{playlist_id}")
+        except Exception as e:
+            logger.error(f"Error fetching playlist {playlist_id}: {e}")
+            raise
+
+        playlist_info.update({
+            'type': 'playlist',
+            'name': playlist['name'],
+            'description': playlist.get('description', ''),
+            'total_tracks': playlist['tracks']['total'],
+            'tracks': []
+        })
+
+        # Remaining pages are fetched in parallel and yielded in order
+        pages = self.spotify.iter_pages(f"/playlists/{playlist_id}/tracks", playlist['tracks'])
+        async for page in pages:
+            batch = [
+                self.parse_track(item['track'])
+                for item in page
+                if item['track'] and item['track']['type'] == 'track'
+            ]
+            playlist_info['tracks'].extend(batch)
+            yield batch
+
+        if self.cache:
+            await self.cache.set_playlist(playlist_id, playlist.get('snapshot_id'), playlist_info, cached)
+
     async def get_playlist_tracks(self, playlist_id):
         """Get all tracks from a playlist"""
         try:
-            playlist = self.spotify.playlist(playlist_id)
-            tracks = []
-            
-            # Get playlist info
-            playlist_info = {
-                'type': 'playlist',
-                'name': playlist['name'],
-                'description': playlist.get('description', ''),
-                'total_tracks': playlist['tracks']['total'],
-                'tracks': []
-            }
-            
-            # Get all tracks (handle pagination)
-            results = playlist['tracks']
-            while results:
-                for item in results['items']:
-                    if item['track'] and item['track']['type'] == 'track':
-                        track = item['track']
-                        track_info = {
-                            'name': track['name'],
-                            'artist': ', '.join([artist['name'] for artist in track['artists']]),
-                            'album': track['album']['name'],
-                            'duration': track['duration_ms'] // 1000,
-                            'external_url': track['external_urls']['spotify']
-                        }
-                        playlist_info['tracks'].append(track_info)
-                
-                # Get next page
-                results = self.spotify.next(results) if results['next'] else None
-                
-                # Limit to 100 tracks to avoid excessive processing
-                if len(playlist_info['tracks']) >= 100:
-                    break
-            
+            playlist_info = {}
+            async for _ in self.iter_playlist_tracks(playlist_id, playlist_info):
+                pass
             return playlist_info
             
         except Exception as e:
             logger.error(f"Error fetching playlist {playlist_id}: {e}")
             raise
 
+    async def iter_album_tracks(self, album_id, album_info=None):
+        """Yield batches of album tracks; album_info is filled with the album details"""
+        album_info = album_info if album_info is not None else {}
+
+        if self.cache:
+            cached = await self.cache.get_album(album_id)
+            if cached:
+                album_info.update(cached)
+                yield cached['tracks']
+                return
+
+        try:
+            album = await self.spotify.get(f"/albums/{album_id}")
+        except Exception as e:
+            logger.error(f"Error fetching album {album_id}: {e}")
+            raise
+
+        album_info.update({
+            'type': 'playlist',  # Treat album as playlist
+            'name': album['name'],
+            'description': f"Album by {', '.join([artist['name'] for artist in album['artists']])}",
+            'total_tracks': album['total_tracks'],
+            'tracks': []
+        })
+
+        async for page in self.spotify.iter_pages(f"/albums/{album_id}/tracks", album['tracks']):
+            batch = [self.parse_track(track, album['name']) for track in page]
+            album_info['tracks'].extend(batch)
+            yield batch
+
+        if self.cache:
+            await self.cache.set_album(album_id, album_info)
+
     async def get_album_tracks(self, album_id):
         """Get all tracks from an album"""
         try:
-            album = self.spotify.album(album_id)
-            
-            album_info = {
-                'type': 'playlist',  # Treat album as playlist
-                'name': album['name'],
-                'description': f"Album by {', '.join([artist['name'] for artist in album['artists']])}",
-                'total_tracks': album['total_tracks'],
-                'tracks': []
-            }
-            
-            # Get all tracks from album
-            results = album['tracks']
-            while results:
-                for track in results['items']:
-                    track_info = {
-                        'name': track['name'],
-                        'artist': ', '.join([artist['name'] for artist in track['artists']]),
-                        'album': album['name'],
-                        'duration': track['duration_ms'] // 1000,
-                        'external_url': track['external_urls']['spotify']
-                    }
-                    album_info['tracks'].append(track_info)
-                
-                # Get next page
-                results = self.spotify.next(results) if results['next'] else None
-            
+            album_info = {}
+            async for _ in self.iter_album_tracks(album_id, album_info):
+                pass
             return album_info
             
         except Exception as e:
             logger.error(f"Error fetching album {album_id}: {e}")
             raise
 
-    def search_track(self, query, limit=1):
+    async def search_track(self, query, limit=1):
         """Search for tracks on Spotify"""
         if not self.spotify:
             return None
         
         try:
-            results = self.spotify.search(q=query, type='track', limit=limit)
+            results = await self.spotify.get('/search', params={'q': query, 'type': 'track', 'limit': limit})
             tracks = []
             
             for track in results['tracks']['items']:
@@ -181,3 +245,8 @@ class SpotifyHandler:
         except Exception as e:
             logger.error(f"Error searching for track: {e}")
             return None
+
+    async def close(self):
+        """Close the Spotify HTTP session"""
+        if self.spotify:
+            await self.spotify.close()
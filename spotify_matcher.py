@@ -0,0 +1,160 @@
+import logging
+import unicodedata
+from cache import Cache
+from suggestions import words_of
+
+logger = logging.getLogger(__name__)
+
+# Words video titles and channel names add that say nothing about which recording it is
+NOISE_WORDS = frozenset((
+    'official', 'video', 'audio', 'music', 'lyric', 'lyrics', 'visualizer', 'hd', 'hq', '4k', 'mv',
+    'feat', 'ft', 'featuring', 'with', 'the', 'a', 'and', 'x', 'remastered', 'remaster', 'version',
+    'topic', 'vevo', 'records', 'full', 'explicit', 'clean', 'radio', 'edit', 'original'
+))
+
+# Words that mark a different recording than the studio track, unless Spotify's own title has them
+VERSION_WORDS = frozenset((
+    'live', 'cover', 'karaoke', 'instrumental', 'remix', 'nightcore', 'sped', 'slowed', 'reverb', '8d',
+    'acoustic', 'piano', 'extended', 'loop', 'hour', 'hours', 'reaction', 'tutorial', 'mashup', 'boosted',
+    'concert', 'session', 'demo', 'rehearsal', 'parody', 'bass'
+))
+
+# yt-dlp error text for videos that are gone for good, unlike network or ffmpeg failures
+GONE_MARKERS = (
+    'video unavailable', 'no longer available', 'has been removed', 'private video',
+    'account associated with this video has been terminated', 'copyright claim'
+)
+
+def plain_words(text):
+    """Split text into casefolded words with accents removed"""
+    return words_of(unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode())
+
+def video_gone(error):
+    """Check whether a playback error means the video was taken down or made private"""
+    message = str(error).casefold()
+    return any(marker in message for marker in GONE_MARKERS)
+
+def spotify_keys(track):
+    """Get the mapping keys for a Spotify track: its ISRC and its track ID, when known"""
+    keys = []
+    if track.get('isrc'):
+        keys.append(f"isrc:{track['isrc'].upper()}")
+    url = track.get('external_url') or ''
+    if url:
+        keys.append(f"spotify:{url.rstrip('/').rpartition('/')[2]}")
+    return keys
+
+def duration_score(expected, actual, tolerance=20):
+    """Score how close a candidate's length is, 1 within two seconds falling to 0 at tolerance"""
+    if not expected or not actual:
+        return 0.5  # Unknown lengths neither help nor rule out a candidate
+    delta = abs(expected - actual)
+    return 1.0 if delta <= 2 else max(0.0, 1 - (delta - 2) / (tolerance - 2))
+
+def score_candidate(track, entry):
+    """Score a flat search entry as a match for a Spotify track, roughly 0 to 1"""
+    name_words = set(plain_words(track.get('name'))) - NOISE_WORDS
+    artist_words = set(plain_words(track.get('artist'))) - NOISE_WORDS
+    title_words = set(plain_words(entry.get('title')))
+    channel = entry.get('channel') or entry.get('uploader') or ''
+    channel_words = set(plain_words(channel))
+
+    # Most of the song's own title should appear, and not much else besides the artist
+    recall = len(name_words & title_words) / len(name_words) if name_words else 0.0
+    extra = title_words - name_words - artist_words - NOISE_WORDS
+    precision = 1 - len(extra) / max(len(title_words - NOISE_WORDS), 1)
+    title_score = 0.7 * recall + 0.3 * precision
+
+    # The artist is usually in the title or the channel name, which may be written as one word ("ArtistVEVO")
+    artist_found = artist_words & (title_words | channel_words)
+    artist_score = len(artist_found) / len(artist_words) if artist_words else 0.0
+    compact_artist = ''.join(plain_words(track.get('artist', '').split(',')[0]))
+    if compact_artist and compact_artist in ''.join(channel_words):
+        artist_score = max(artist_score, 1.0)
+
+    album_words = set(plain_words(track.get('album')))
+    wrong_version = (title_words & VERSION_WORDS) - name_words - album_words
+    score = (0.35 * title_score + 0.35 * artist_score
+             + 0.3 * duration_score(track.get('duration'), entry.get('duration'))
+             - 0.4 * len(wrong_version))
+    if channel.endswith(' - Topic'):
+        score += 0.05  # Auto-generated channels carry the label's studio recording
+    return score
+
+
+class SpotifyMatcher:
+    """Matches Spotify tracks to YouTube videos and remembers the choice.
+
+    A match comes from one flat search for a handful of candidates, each
+    scored on title and artist similarity, length difference and words that
+    mark another version (live, cover, remix). Matches scoring at least
+    min_score are stored under the track's ISRC and Spotify ID, so later
+    plays of the same recording skip the search entirely.
+    """
+
+    def __init__(self, backend=None, candidates=5, min_score=0.7, ttl=90 * 24 * 3600):
+        self.cache = Cache(backend, ttl=ttl)
+        self.candidates = candidates
+        self.min_score = min_score
+
+        self.lookups = 0
+        self.remembered = 0
+        self.searches = 0
+        self.confident = 0  # Searches whose best candidate reached min_score
+
+    def search_query(self, track):
+        """Build the flat search that fetches candidates for a track"""
+        return f"ytsearch{self.candidates}:{track['artist']} {track['name']}"
+
+    def lookup(self, track):
+        """Get the stored match for a track, or None"""
+        self.lookups += 1
+        for key in spotify_keys(track):
+            match = self.cache.get(key)
+            if match:
+                self.remembered += 1
+                return match
+        return None
+
+    def choose(self, track, entries):
+        """Pick the best scoring search entry and remember it if it is a confident match; None without entries"""
+        self.searches += 1
+        best, best_score = None, None
+        for entry in entries:
+            if not entry or not entry.get('id'):
+                continue
+            score = score_candidate(track, entry)
+            if best_score is None or score > best_score:
+                best, best_score = entry, score
+        if best is None:
+            return None
+
+        match = {
+            'title': best.get('title', 'Unknown'),
+            'webpage_url': f"https://www.youtube.com/watch?v={best['id']}",
+            'duration': best.get('duration'),
+            'score': round(best_score, 3)
+        }
+        if best_score >= self.min_score:
+            self.confident += 1
+            for key in spotify_keys(track):
+                self.cache.set(key, match)
+        else:
+            logger.info(f"No confident match for '{track['artist']} - {track['name']}' (best {best_score:.2f})")
+        return match
+
+    def forget(self, track):
+        """Drop a stored match, e.g. because the video is no longer available"""
+        for key in spotify_keys(track):
+            self.cache.delete(key)
+
+    def stats(self):
+        """Get how often the stored mapping saved a search"""
+        return {
+            'entries': len(self.cache.backend),
+            'lookups': self.lookups,
+            'remembered': self.remembered,
+            'hit_rate': self.remembered / self.lookups if self.lookups else 0.0,
+            'searches': self.searches,
+            'confident': self.confident
+        }
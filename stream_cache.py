@@ -0,0 +1,99 @@
+import logging
+import re
+import time
+from urllib.parse import urlparse, parse_qs
+from cache import Cache, MemoryCacheBackend
+from utils import extract_video_id
+
+logger = logging.getLogger(__name__)
+
+def get_stream_expiry(url):
+    """Read the expiry timestamp embedded in a media URL, if any"""
+    if not url:
+        return None
+
+    try:
+        parsed = urlparse(url)
+    except ValueError:
+        return None
+
+    expire = parse_qs(parsed.query).get('expire')
+    if expire and expire[0].isdigit():
+        return int(expire[0])
+
+    # Some googlevideo manifests carry parameters as path segments
+    match = re.search(r'/expire/(\d+)', parsed.path)
+    if match:
+        return int(match.group(1))
+
+    return None
+
+def get_stream_codec(url):
+    """Guess the audio codec of a googlevideo URL from its mime parameter"""
+    if not url:
+        return None
+
+    try:
+        mime = parse_qs(urlparse(url).query).get('mime')
+    except ValueError:
+        return None
+
+    # YouTube serves Opus in WebM and AAC in MP4 for audio-only formats
+    if mime and mime[0] == 'audio/webm':
+        return 'opus'
+    if mime and mime[0] == 'audio/mp4':
+        return 'aac'
+    return None
+
+class StreamUrlCache:
+    """Cache of resolved media URLs that honours their embedded expiry"""
+
+    def __init__(self, max_entries=4096, margin=300, default_ttl=1800):
+        self.cache = Cache(MemoryCacheBackend(max_entries=max_entries))
+        self.margin = margin  # Treat URLs this close to expiry as stale
+        self.default_ttl = default_ttl  # Used when a URL carries no expiry
+
+    def key_for(self, webpage_url):
+        """Get the cache key for a webpage URL"""
+        video_id = extract_video_id(webpage_url)
+        return f"id:{video_id}" if video_id else webpage_url
+
+    def remaining_ttl(self, stream_url):
+        """Seconds a stream URL stays usable, or None if its expiry is unknown"""
+        expiry = get_stream_expiry(stream_url)
+        if expiry is None:
+            return None
+        return expiry - self.margin - time.time()
+
+    def is_fresh(self, stream_url):
+        """Check whether a stream URL has a known expiry that is not near"""
+        ttl = self.remaining_ttl(stream_url)
+        return ttl is not None and ttl > 0
+
+    def get(self, webpage_url):
+        """Get a still-valid stream URL for a webpage URL"""
+        if not webpage_url:
+            return None
+        return self.cache.get(self.key_for(webpage_url))
+
+    def set(self, webpage_url, stream_url):
+        """Remember a freshly resolved stream URL until shortly before it expires"""
+        if not webpage_url or not stream_url or stream_url == webpage_url:
+            return
+
+        ttl = self.remaining_ttl(stream_url)
+        if ttl is None:
+            ttl = self.default_ttl
+        if ttl <= 0:
+            return
+
+        self.cache.set(self.key_for(webpage_url), stream_url, ttl=ttl)
+
+    def invalidate(self, webpage_url):
+        """Forget the stream URL for a webpage URL, e.g. after playback failed"""
+        if webpage_url:
+            self.cache.delete(self.key_for(webpage_url))
+
+    def stats(self):
+        """Get hit/miss counters for the cache"""
+        return self.cache.stats()
@@ -0,0 +1,142 @@
+import bisect
+import heapq
+import itertools
+import re
+import sys
+from collections import OrderedDict
+
+WORD = re.compile(r'\w+')
+
+def words_of(text):
+    """Split text into casefolded words"""
+    return WORD.findall(text.casefold())
+
+def word_grams(words):
+    """Get the trigrams of each word padded at the front, so short prefixes have grams too"""
+    grams = set()
+    for word in words:
+        padded = '  ' + word
+        grams.update(sys.intern(padded[i:i + 3]) for i in range(len(padded) - 2))
+    return grams
+
+
+class Suggestion:
+    """One known track that autocomplete can offer"""
+
+    __slots__ = ('label', 'text', 'weight', 'grams')
+
+    def __init__(self, label, text, weight, grams):
+        self.label = label
+        self.text = text  # The label's words joined by single spaces
+        self.weight = weight
+        self.grams = grams
+
+
+class SuggestionIndex:
+    """Bounded in-memory trigram index of known tracks for /play autocomplete.
+
+    Each entry maps a label (what the user sees) to a value that /play can
+    resolve without searching, such as a YouTube or Spotify URL. Words are
+    indexed by their front-padded trigrams, so typed prefixes match and a
+    typo only loses a few grams. Labels are also kept in sorted order, so
+    labels starting with the query come first, most played first; when
+    those fill the results, as they do for short prefixes, the trigram scan
+    is skipped. Adding an entry again raises its weight; beyond max_entries
+    the least recently added or played entries go first.
+    """
+
+    def __init__(self, max_entries=20000, min_overlap=0.5):
+        self.max_entries = max_entries
+        self.min_overlap = min_overlap  # Share of the query's grams a match must contain
+        self.entries = OrderedDict()  # Value -> Suggestion, least recently touched first
+        self.postings = {}  # Trigram -> set of values
+        self.texts = []  # Sorted label texts, for prefix lookups
+        self.text_values = []  # The value of each entry in texts
+
+        self.searches = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, label, value, weight=1):
+        """Index a track, or bump its weight if it is already known"""
+        if not label or not value:
+            return
+        entry = self.entries.get(value)
+        if entry:
+            entry.weight += weight
+            self.entries.move_to_end(value)
+            return
+
+        words = words_of(label)
+        text = ' '.join(words)
+        grams = tuple(word_grams(words))
+        self.entries[value] = Suggestion(label, text, weight, grams)
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(value)
+        position = bisect.bisect_right(self.texts, text)
+        self.texts.insert(position, text)
+        self.text_values.insert(position, value)
+        while len(self.entries) > self.max_entries:
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def remove(self, value):
+        entry = self.entries.pop(value, None)
+        if entry is None:
+            return
+        for gram in entry.grams:
+            values = self.postings[gram]
+            values.discard(value)
+            if not values:
+                del self.postings[gram]
+        position = bisect.bisect_left(self.texts, entry.text)
+        while self.text_values[position] != value:
+            position += 1
+        del self.texts[position]
+        del self.text_values[position]
+
+    def prefix_matches(self, text, limit):
+        """Get up to limit values whose label text starts with text, highest weight first"""
+        start = bisect.bisect_left(self.texts, text)
+        end = bisect.bisect_left(self.texts, text + '\U0010ffff', start)
+        return heapq.nlargest(limit, self.text_values[start:end], key=lambda value: self.entries[value].weight)
+
+    def search(self, query, limit=25):
+        """Get up to limit (label, value) pairs matching a partial query, best first"""
+        self.searches += 1
+        words = words_of(query)
+        grams = word_grams(words)
+        if not grams:
+            # Nothing typed yet: offer the most recently used tracks
+            recent = itertools.islice(reversed(self.entries.items()), limit)
+            return [(entry.label, value) for value, entry in recent]
+
+        matches = self.prefix_matches(' '.join(words), limit)
+        if len(matches) == limit:
+            return [(self.entries[value].label, value) for value in matches]
+
+        scores = {}
+        for gram in grams:
+            for value in self.postings.get(gram, ()):
+                scores[value] = scores.get(value, 0) + 1
+
+        needed = max(1, int(len(grams) * self.min_overlap))
+        for value in matches:
+            scores.pop(value, None)
+        best = heapq.nlargest(
+            limit - len(matches),
+            ((score, self.entries[value].weight, value) for value, score in scores.items() if score >= needed)
+        )
+        matches.extend(value for _, _, value in best)
+        return [(self.entries[value].label, value) for value in matches]
+
+    def stats(self):
+        """Get the index size"""
+        return {
+            'entries': len(self.entries),
+            'grams': len(self.postings),
+            'searches': self.searches,
+            'evictions': self.evictions
+        }
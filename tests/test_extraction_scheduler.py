@@ -0,0 +1,53 @@
+import asyncio
+import threading
+import unittest
+from extraction_scheduler import PRIORITY_BULK, PRIORITY_SEARCH, PRIORITY_STREAM, ExtractionScheduler
+
+
+class ExtractionSchedulerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.scheduler = ExtractionScheduler(workers=1)
+        self.order = []
+
+    async def asyncTearDown(self):
+        self.scheduler.shutdown()
+
+    async def run_queued(self, jobs):
+        """Hold the only worker until every job is queued, then run them all"""
+        gate = threading.Event()
+        blocker = asyncio.ensure_future(self.scheduler.run(gate.wait))
+        await asyncio.sleep(0)
+        tasks = [
+            asyncio.ensure_future(self.scheduler.run(self.order.append, name, priority=priority, guild_id=guild_id))
+            for name, priority, guild_id in jobs
+        ]
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(blocker, *tasks)
+
+    async def test_guilds_share_a_priority_round_robin(self):
+        jobs = [(f"a{i}", PRIORITY_BULK, 1) for i in range(4)] + [(f"b{i}", PRIORITY_BULK, 2) for i in range(2)]
+        await self.run_queued(jobs)
+        self.assertEqual(self.order, ['a0', 'b0', 'a1', 'b1', 'a2', 'a3'])
+
+    async def test_higher_priority_runs_first(self):
+        jobs = [('bulk', PRIORITY_BULK, 1), ('search', PRIORITY_SEARCH, 1), ('stream', PRIORITY_STREAM, 2)]
+        await self.run_queued(jobs)
+        self.assertEqual(self.order, ['stream', 'search', 'bulk'])
+
+    async def test_cancelled_jobs_are_skipped(self):
+        gate = threading.Event()
+        blocker = asyncio.ensure_future(self.scheduler.run(gate.wait))
+        await asyncio.sleep(0)
+        cancelled = asyncio.ensure_future(self.scheduler.run(self.order.append, 'cancelled'))
+        kept = asyncio.ensure_future(self.scheduler.run(self.order.append, 'kept'))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        gate.set()
+        await asyncio.gather(blocker, kept)
+        self.assertEqual(self.order, ['kept'])
+        self.assertEqual(self.scheduler.stats()['classes']['search']['queued'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import random
+import unittest
+from indexed_queue import IndexedQueue
+
+
+class IndexedQueueTest(unittest.TestCase):
+    def check(self, queue, expected):
+        self.assertEqual(list(queue), expected)
+        self.assertEqual(len(queue), len(expected))
+        for index, item in enumerate(expected):
+            self.assertEqual(queue[index], item)
+
+    def test_operations_match_a_list(self):
+        rng = random.Random(7)
+        queue = IndexedQueue(range(50), load=8)
+        expected = list(range(50))
+        for step in range(2000):
+            op = rng.randrange(6)
+            if op == 0:
+                queue.append(step)
+                expected.append(step)
+            elif op == 1 and expected:
+                index = rng.randrange(len(expected))
+                self.assertEqual(queue.pop(index), expected.pop(index))
+            elif op == 2:
+                index = rng.randrange(len(expected) + 1)
+                queue.insert(index, step)
+                expected.insert(index, step)
+            elif op == 3 and expected:
+                from_index, to_index = rng.randrange(len(expected)), rng.randrange(len(expected))
+                queue.move(from_index, to_index)
+                expected.insert(to_index, expected.pop(from_index))
+            elif op == 4 and expected:
+                start = rng.randrange(len(expected))
+                stop = start + rng.randrange(20)
+                self.assertEqual(queue.remove_range(start, stop), expected[start:stop])
+                del expected[start:stop]
+            elif op == 5:
+                items = list(range(step, step + rng.randrange(30)))
+                queue.extend(items)
+                expected.extend(items)
+        self.check(queue, expected)
+
+    def test_popleft_and_slice(self):
+        queue = IndexedQueue(range(20), load=4)
+        self.assertEqual(queue.popleft(), 0)
+        self.assertEqual(queue.slice(3, 9), list(range(4, 10)))
+        self.assertEqual(queue.slice(15, 40), list(range(16, 20)))
+
+    def test_remove_if(self):
+        queue = IndexedQueue(range(30), load=4)
+        self.assertEqual(queue.remove_if(lambda item: item % 3 == 0), list(range(0, 30, 3)))
+        self.check(queue, [item for item in range(30) if item % 3])
+
+    def test_shuffle_is_a_permutation(self):
+        queue = IndexedQueue(range(100), load=8)
+        queue.shuffle(random.Random(1))
+        self.assertEqual(sorted(queue), list(range(100)))
+        self.assertNotEqual(list(queue), list(range(100)))
+
+    def test_shuffle_does_not_depend_on_block_layout(self):
+        fragmented = IndexedQueue(load=4)
+        for item in range(60):
+            fragmented.insert(0, item)
+        fragmented.shuffle(random.Random(42))
+
+        contiguous = IndexedQueue(range(59, -1, -1))
+        contiguous.shuffle(random.Random(42))
+        self.assertEqual(list(fragmented), list(contiguous))
+
+    def test_clear(self):
+        queue = IndexedQueue(range(10), load=4)
+        queue.clear()
+        self.check(queue, [])
+        queue.append('a')
+        self.check(queue, ['a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import os
+import tempfile
+import unittest
+from queue_journal import QueueJournal, replay
+from queue_manager import QueueManager
+from track import Track
+
+
+def titles(songs):
+    return [song['title'] for song in songs]
+
+def make_tracks(count, requested_by=None):
+    return [Track(f"Song {i}", webpage_url=f"https://www.youtube.com/watch?v=video{i:05d}", duration=60 + i,
+                  requested_by=requested_by) for i in range(count)]
+
+
+class ReplayTest(unittest.TestCase):
+    def test_records_apply_in_order(self):
+        songs = [{'title': str(i), 'requested_by': i % 2} for i in range(10)]
+        records = [
+            ['add', songs],
+            ['next'],
+            ['remove', 2],
+            ['move', 0, 4],
+            ['range', 1, 3],
+            ['user', 1],
+        ]
+        current, queued = replay(records)
+        self.assertEqual(current['title'], '0')
+        self.assertEqual(titles(queued), ['2', '6', '8'])
+
+    def test_finish_and_clear(self):
+        current, queued = replay([['add', [{'title': 'a'}]], ['next'], ['finish']])
+        self.assertIsNone(current)
+        self.assertEqual(queued, [])
+        current, queued = replay([['clear']], {'title': 'a'}, [{'title': 'b'}])
+        self.assertIsNone(current)
+        self.assertEqual(queued, [])
+
+    def test_shuffle_replays_the_queue_order(self):
+        manager = QueueManager()
+        manager.add_songs(make_tracks(200))
+        for index in range(0, 100, 3):
+            manager.move_song(index, 199 - index)
+        before = [track.to_dict() for track in manager.queue]
+
+        records = []
+        manager.record = lambda op, *args: records.append([op, *args])
+        manager.shuffle()
+        _, queued = replay(records, None, before)
+        self.assertEqual(titles(queued), titles(manager.queue))
+
+
+class QueueJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+        self.journals = []
+
+    def tearDown(self):
+        for journal in self.journals:
+            journal.close()
+        self.tmp.cleanup()
+
+    def open_journal(self, **options):
+        journal = QueueJournal(self.directory, commit_interval=0, **options)
+        self.journals.append(journal)
+        return journal
+
+    def mutate(self, manager):
+        manager.add_songs(make_tracks(30), requested_by=1)
+        manager.add_song(make_tracks(1, requested_by=2)[0])
+        manager.get_next_song()
+        manager.move_song(3, 10)
+        manager.remove_song(5)
+        manager.remove_range(0, 2)
+        manager.shuffle()
+        manager.remove_by_user(2)
+
+    def test_round_trip(self):
+        journal = self.open_journal()
+        manager = QueueManager(journal=journal.guild(1))
+        self.mutate(manager)
+        journal.close()
+
+        restored = QueueManager(journal=self.open_journal().guild(1))
+        self.assertEqual(restored.restore(), len(manager.queue) + 1)
+        self.assertEqual(titles(restored.queue), [manager.current_song['title']] + titles(manager.queue))
+
+    def test_compaction_keeps_the_state(self):
+        journal = self.open_journal(snapshot_every=4)
+        manager = QueueManager(journal=journal.guild(1))
+        self.mutate(manager)
+        journal.flush()
+        self.assertGreater(journal.snapshots, 0)
+        journal.close()
+
+        files = os.listdir(self.directory)
+        generation = journal.generations[1]
+        self.assertTrue(all(name.startswith(f"1-{generation}.") for name in files), files)
+
+        current, songs = self.open_journal().load(1)
+        self.assertEqual(current['title'], manager.current_song['title'])
+        self.assertEqual(titles(songs), titles(manager.queue))
+
+    def test_torn_final_line_is_ignored(self):
+        journal = self.open_journal()
+        manager = QueueManager(journal=journal.guild(1))
+        manager.add_songs(make_tracks(3))
+        journal.close()
+        with open(journal.path_for(1, 0, 'log'), 'a', encoding='utf-8') as f:
+            f.write('["remove",')
+
+        current, songs = self.open_journal().load(1)
+        self.assertIsNone(current)
+        self.assertEqual(titles(songs), ['Song 0', 'Song 1', 'Song 2'])
+
+    def test_state_is_handed_out_once(self):
+        journal = self.open_journal()
+        QueueManager(journal=journal.guild(1)).add_songs(make_tracks(2))
+        journal.close()
+
+        journal = self.open_journal()
+        self.assertEqual(len(journal.load(1)[1]), 2)
+        self.assertEqual(journal.load(1), (None, []))
+
+    def test_drop_removes_the_files(self):
+        journal = self.open_journal()
+        QueueManager(journal=journal.guild(1)).add_songs(make_tracks(2))
+        journal.flush()
+        journal.drop(1)
+        journal.close()
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+from spotify_matcher import plain_words, score_candidate, spotify_keys, video_gone
+
+TRACK = {
+    'name': 'Dancing Queen',
+    'artist': 'ABBA',
+    'album': 'Arrival',
+    'duration': 231,
+    'isrc': 'gbaya7600001',
+    'external_url': 'https://open.spotify.com/track/0GjEhVFGZW8afUYGChu3Rr'
+}
+
+
+class ScoreCandidateTest(unittest.TestCase):
+    def test_studio_upload_beats_other_versions(self):
+        studio = {'title': 'ABBA - Dancing Queen (Official Music Video)', 'channel': 'ABBAVEVO', 'duration': 232}
+        live = {'title': 'ABBA - Dancing Queen (Live)', 'channel': 'ABBAVEVO', 'duration': 240}
+        cover = {'title': 'Dancing Queen - Piano Cover', 'channel': 'Some Pianist', 'duration': 200}
+        scores = [score_candidate(TRACK, entry) for entry in (studio, live, cover)]
+        self.assertGreater(scores[0], 0.9)
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertLess(scores[2], 0.7)
+
+    def test_topic_channel_gets_a_bonus(self):
+        entry = {'title': 'Dancing Queen', 'channel': 'ABBA', 'duration': 231}
+        topic = dict(entry, channel='ABBA - Topic')
+        self.assertGreater(score_candidate(TRACK, topic), score_candidate(TRACK, entry))
+
+    def test_version_words_in_the_spotify_title_are_allowed(self):
+        track = dict(TRACK, name='Dancing Queen - Live')
+        entry = {'title': 'ABBA - Dancing Queen (Live)', 'channel': 'ABBA', 'duration': 231}
+        self.assertGreater(score_candidate(track, entry), 0.9)
+
+    def test_wrong_length_lowers_the_score(self):
+        entry = {'title': 'ABBA - Dancing Queen', 'channel': 'ABBA', 'duration': 231}
+        extended = dict(entry, duration=600)
+        self.assertLess(score_candidate(TRACK, extended), score_candidate(TRACK, entry))
+
+
+class HelpersTest(unittest.TestCase):
+    def test_plain_words_strips_accents(self):
+        self.assertEqual(plain_words('Beyoncé – Déjà Vu'), ['beyonce', 'deja', 'vu'])
+        self.assertEqual(plain_words(None), [])
+
+    def test_spotify_keys(self):
+        self.assertEqual(spotify_keys(TRACK), ['isrc:GBAYA7600001', 'spotify:0GjEhVFGZW8afUYGChu3Rr'])
+        self.assertEqual(spotify_keys({}), [])
+
+    def test_video_gone(self):
+        self.assertTrue(video_gone(Exception('ERROR: [youtube] abc: Video unavailable')))
+        self.assertTrue(video_gone('Private video. Sign in if you have been granted access'))
+        self.assertFalse(video_gone(Exception('HTTP Error 403: Forbidden')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import time
+import unittest
+from stream_cache import StreamUrlCache, get_stream_codec, get_stream_expiry
+
+WATCH_URL = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+
+def stream_url(expire, mime='audio/webm'):
+    return f"https://rr1---sn-abc.googlevideo.com/videoplayback?expire={expire}&mime={mime}&itag=251"
+
+
+class ExpiryParsingTest(unittest.TestCase):
+    def test_query_parameter(self):
+        self.assertEqual(get_stream_expiry(stream_url(1700000000)), 1700000000)
+
+    def test_path_segment(self):
+        url = 'https://manifest.googlevideo.com/api/manifest/hls_playlist/expire/1700000123/ei/abc/index.m3u8'
+        self.assertEqual(get_stream_expiry(url), 1700000123)
+
+    def test_missing_or_malformed(self):
+        self.assertIsNone(get_stream_expiry(None))
+        self.assertIsNone(get_stream_expiry('https://example.com/audio.mp3'))
+        self.assertIsNone(get_stream_expiry('https://example.com/a?expire=soon'))
+        self.assertIsNone(get_stream_expiry('http://[::1'))
+
+    def test_codec(self):
+        self.assertEqual(get_stream_codec(stream_url(1)), 'opus')
+        self.assertEqual(get_stream_codec(stream_url(1, mime='audio/mp4')), 'aac')
+        self.assertIsNone(get_stream_codec('https://example.com/audio.mp3'))
+
+
+class StreamUrlCacheTest(unittest.TestCase):
+    def test_fresh_url_is_kept_under_the_video_id(self):
+        cache = StreamUrlCache(margin=300)
+        url = stream_url(int(time.time()) + 3600)
+        cache.set(WATCH_URL, url)
+        self.assertEqual(cache.get('https://youtu.be/dQw4w9WgXcQ'), url)
+        self.assertTrue(cache.is_fresh(url))
+
+    def test_url_near_expiry_is_not_stored(self):
+        cache = StreamUrlCache(margin=300)
+        url = stream_url(int(time.time()) + 60)
+        self.assertFalse(cache.is_fresh(url))
+        cache.set(WATCH_URL, url)
+        self.assertIsNone(cache.get(WATCH_URL))
+
+    def test_invalidate(self):
+        cache = StreamUrlCache()
+        cache.set(WATCH_URL, stream_url(int(time.time()) + 3600))
+        cache.invalidate(WATCH_URL)
+        self.assertIsNone(cache.get(WATCH_URL))
+
+
+if __name__ == '__main__':
+    unittest.main()
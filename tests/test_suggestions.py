@@ -0,0 +1,59 @@
+import unittest
+from suggestions import SuggestionIndex
+
+
+class SuggestionIndexTest(unittest.TestCase):
+    def values(self, results):
+        return [value for _, value in results]
+
+    def test_prefix_matches_come_first_by_weight(self):
+        index = SuggestionIndex()
+        index.add('Bohemian Rhapsody', 'a')
+        index.add('Bohemian Like You', 'b', weight=5)
+        index.add('Under Pressure (Bohemian)', 'c')
+        self.assertEqual(self.values(index.search('bohem')), ['b', 'a', 'c'])
+
+    def test_typo_still_matches(self):
+        index = SuggestionIndex()
+        index.add('Stairway to Heaven', 'a')
+        index.add('Highway to Hell', 'b')
+        self.assertEqual(self.values(index.search('stairwya to heaven'))[0], 'a')
+
+    def test_adding_again_raises_the_weight(self):
+        index = SuggestionIndex()
+        index.add('Song One', 'a')
+        index.add('Song Two', 'b')
+        index.add('Song One', 'a', weight=3)
+        self.assertEqual(len(index), 2)
+        self.assertEqual(self.values(index.search('song')), ['a', 'b'])
+
+    def test_empty_query_offers_recent_entries(self):
+        index = SuggestionIndex()
+        for value in 'abc':
+            index.add(f"Track {value}", value)
+        index.add('Track a', 'a')
+        self.assertEqual(self.values(index.search('', limit=2)), ['a', 'c'])
+
+    def test_eviction_keeps_the_sorted_texts_in_sync(self):
+        index = SuggestionIndex(max_entries=3)
+        for value in 'abcde':
+            index.add('Same Title', value)
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.evictions, 2)
+        self.assertEqual(sorted(index.text_values), ['c', 'd', 'e'])
+        self.assertEqual(index.texts, ['same title'] * 3)
+        self.assertEqual(sorted(self.values(index.search('same'))), ['c', 'd', 'e'])
+
+    def test_remove(self):
+        index = SuggestionIndex()
+        index.add('Alpha', 'a')
+        index.add('Beta', 'b')
+        index.remove('a')
+        index.remove('missing')
+        self.assertEqual(self.values(index.search('alpha')), [])
+        self.assertEqual(index.texts, ['beta'])
+        self.assertNotIn('  a', index.postings)
+
+
+if __name__ == '__main__':
+    unittest.main()
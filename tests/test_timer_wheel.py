@@ -0,0 +1,62 @@
+import unittest
+from timer_wheel import TimerWheel
+
+
+class TimerWheelTest(unittest.TestCase):
+    def test_fires_after_whole_ticks(self):
+        wheel = TimerWheel(tick=1.0, slots=8)
+        fired = []
+        wheel.schedule('a', 2.5, lambda: fired.append('a'))
+        for _ in range(2):
+            wheel.advance()
+        self.assertEqual(fired, [])
+        wheel.advance()
+        self.assertEqual(fired, ['a'])
+        self.assertFalse(wheel.is_pending('a'))
+
+    def test_deadlines_past_one_turn_of_the_wheel(self):
+        wheel = TimerWheel(tick=1.0, slots=4)
+        fired = []
+        wheel.schedule('a', 10, lambda: fired.append(wheel.ticks))
+        for _ in range(12):
+            wheel.advance()
+        self.assertEqual(fired, [10])
+
+    def test_rescheduling_replaces_the_timer_without_counting_a_cancel(self):
+        wheel = TimerWheel(tick=1.0, slots=8)
+        fired = []
+        wheel.schedule('a', 1, lambda: fired.append('old'))
+        wheel.schedule('a', 3, lambda: fired.append('new'))
+        for _ in range(3):
+            wheel.advance()
+        self.assertEqual(fired, ['new'])
+        stats = wheel.stats()
+        self.assertEqual((stats['armed'], stats['fired'], stats['cancelled']), (2, 1, 0))
+
+    def test_cancel(self):
+        wheel = TimerWheel(tick=1.0, slots=8)
+        wheel.schedule((1, 'pause'), 1, lambda: None)
+        self.assertEqual(wheel.stats()['kinds'], {'pause': 1})
+        self.assertTrue(wheel.cancel((1, 'pause')))
+        self.assertFalse(wheel.cancel((1, 'pause')))
+        wheel.advance()
+        self.assertEqual(wheel.stats()['cancelled'], 1)
+        self.assertEqual(wheel.stats()['fired'], 0)
+
+    def test_callback_can_rearm_its_key(self):
+        wheel = TimerWheel(tick=1.0, slots=8)
+        fired = []
+
+        def tick():
+            fired.append(wheel.ticks)
+            if len(fired) < 3:
+                wheel.schedule('a', 1, tick)
+
+        wheel.schedule('a', 1, tick)
+        for _ in range(5):
+            wheel.advance()
+        self.assertEqual(fired, [1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
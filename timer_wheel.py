@@ -0,0 +1,118 @@
+import asyncio
+import inspect
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+class Timer:
+    """One armed deadline in a TimerWheel"""
+
+    __slots__ = ('key', 'callback', 'deadline', 'slot')
+
+    def __init__(self, key, callback, deadline, slot):
+        self.key = key
+        self.callback = callback
+        self.deadline = deadline  # Tick at which the timer fires
+        self.slot = slot
+
+
+class TimerWheel:
+    """Hashed timing wheel driving every per-guild deadline from one task.
+
+    Timers are keyed, typically by (guild_id, kind); arming a key replaces
+    its previous timer, and arming and cancelling are O(1). Each tick the
+    wheel only looks at the timers hashed to the current slot, firing the
+    ones whose deadline has come. Delays are rounded up to whole ticks.
+    Callbacks may be plain functions or coroutine functions.
+    """
+
+    def __init__(self, tick=1.0, slots=512):
+        self.tick = tick
+        self.slots = [{} for _ in range(slots)]  # Slot -> {key: Timer}
+        self.timers = {}  # Key -> Timer
+        self.ticks = 0
+        self.tasks = set()
+
+        self.armed = 0
+        self.fired = 0
+        self.cancelled = 0
+
+    def schedule(self, key, delay, callback):
+        """Arm a timer, replacing any pending timer with the same key"""
+        self.unlink(key)
+        deadline = self.ticks + max(1, math.ceil(delay / self.tick))
+        slot = deadline % len(self.slots)
+        timer = Timer(key, callback, deadline, slot)
+        self.slots[slot][key] = timer
+        self.timers[key] = timer
+        self.armed += 1
+        return timer
+
+    def cancel(self, key):
+        """Disarm a pending timer; returns True if there was one"""
+        if not self.unlink(key):
+            return False
+        self.cancelled += 1
+        return True
+
+    def unlink(self, key):
+        """Remove a pending timer without counting it as cancelled"""
+        timer = self.timers.pop(key, None)
+        if timer is None:
+            return False
+        del self.slots[timer.slot][key]
+        return True
+
+    def is_pending(self, key):
+        return key in self.timers
+
+    def advance(self):
+        """Move forward one tick and fire the timers that are due"""
+        self.ticks += 1
+        slot = self.slots[self.ticks % len(self.slots)]
+        due = [timer for timer in slot.values() if timer.deadline <= self.ticks]
+        for timer in due:
+            del slot[timer.key]
+            del self.timers[timer.key]
+
+        # Callbacks run after the slot is updated so they can re-arm their own key
+        for timer in due:
+            self.fired += 1
+            try:
+                result = timer.callback()
+            except Exception as e:
+                logger.error(f"Timer {timer.key} failed: {e}")
+                continue
+            if inspect.isawaitable(result):
+                task = asyncio.ensure_future(result)
+                self.tasks.add(task)
+                task.add_done_callback(self.finished)
+
+    def finished(self, task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Timer callback failed: {task.exception()}")
+
+    async def run(self):
+        """Tick until cancelled, catching up on ticks missed while the loop was busy"""
+        loop = asyncio.get_running_loop()
+        started = loop.time() - self.ticks * self.tick
+        while True:
+            await asyncio.sleep(max(0.0, started + (self.ticks + 1) * self.tick - loop.time()))
+            while loop.time() >= started + (self.ticks + 1) * self.tick:
+                self.advance()
+
+    def stats(self):
+        """Get pending timer counts by kind and lifetime counters"""
+        kinds = {}
+        for key in self.timers:
+            kind = key[1] if isinstance(key, tuple) else 'other'
+            kinds[kind] = kinds.get(kind, 0) + 1
+        return {
+            'pending': len(self.timers),
+            'kinds': kinds,
+            'armed': self.armed,
+            'fired': self.fired,
+            'cancelled': self.cancelled
+        }
@@ -0,0 +1,191 @@
+import sys
+from utils import format_duration, parse_time_string
+
+YOUTUBE_WATCH_URL = 'https://www.youtube.com/watch?v='
+SPOTIFY_TRACK_URL = 'https://open.spotify.com/track/'
+
+def intern_string(value):
+    """Share one copy of strings that repeat across many tracks"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+def is_local_file(song_info):
+    """Check whether an entry plays from a file on disk: an upload or a library track"""
+    return bool(song_info.get('temp_file')) or song_info.get('source') == 'library'
+
+def duration_seconds(duration):
+    """Convert a duration given as seconds or a formatted string to whole seconds"""
+    if isinstance(duration, str):
+        return parse_time_string(duration)
+    return int(duration) if duration and duration > 0 else 0
+
+
+class SlotRecord:
+    """Read-only dict interface over a slotted record, for callers written against dicts.
+
+    keys() lists the fields that are set, so dict(record) and `key in record`
+    behave like the dicts these records replaced.
+    """
+
+    __slots__ = ()
+    KEYS = ()
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in self.KEYS else None
+        return default if value is None else value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def keys(self):
+        return [key for key in self.KEYS if getattr(self, key) is not None]
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.keys()]
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{key}={value!r}' for key, value in self.items())})"
+
+
+class SpotifyInfo(SlotRecord):
+    """Spotify metadata kept with a queued track"""
+
+    __slots__ = ('name', 'artist', 'album', 'duration', 'track_id', 'isrc')
+    KEYS = ('name', 'artist', 'album', 'duration', 'external_url', 'isrc')
+
+    def __init__(self, name, artist=None, album=None, duration=0, external_url=None, isrc=None):
+        self.name = name
+        self.artist = intern_string(artist)  # Artists and albums repeat across a playlist
+        self.album = intern_string(album)
+        self.duration = duration_seconds(duration)
+        self.track_id = None
+        self.external_url = external_url
+        self.isrc = isrc
+
+    @property
+    def external_url(self):
+        if self.track_id is None or '/' in self.track_id:
+            return self.track_id
+        return SPOTIFY_TRACK_URL + self.track_id
+
+    @external_url.setter
+    def external_url(self, url):
+        # Only the track ID of a canonical track URL is stored
+        if url and url.startswith(SPOTIFY_TRACK_URL):
+            url = url[len(SPOTIFY_TRACK_URL):]
+        self.track_id = url
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build from a track dict as returned by SpotifyHandler"""
+        if data is None or isinstance(data, cls):
+            return data
+        return cls(data['name'], data.get('artist'), data.get('album'), data.get('duration'), data.get('external_url'),
+                   data.get('isrc'))
+
+    def to_dict(self):
+        """Get a plain dict for serialization"""
+        return dict(self.items())
+
+
+class Track(SlotRecord):
+    """One queue entry: a YouTube video, a lazy placeholder or an uploaded file.
+
+    Durations are stored in seconds and formatted when read, YouTube watch
+    URLs are stored as the video ID, and repeated strings are interned.
+    Reads through the dict interface (track['title'], track.get('duration'))
+    work as they did when queue entries were dicts, and so do writes to known
+    keys; to_dict()/from_dict() convert for caches and persistence.
+    """
+
+    __slots__ = ('title', '_url', '_webpage_url', 'duration_seconds', 'acodec', 'source',
+                 'temp_file', 'lazy', 'failed', 'query', 'requested_by', '_spotify_info')
+    KEYS = ('title', 'webpage_url', 'url', 'duration', 'acodec', 'source', 'temp_file',
+            'lazy', 'failed', 'query', 'requested_by', 'spotify_info')
+
+    def __init__(self, title, url=None, webpage_url=None, duration=0, acodec=None, source='youtube',
+                 temp_file=False, lazy=False, failed=False, query=None, requested_by=None, spotify_info=None):
+        self.title = title
+        self._webpage_url = None
+        self.webpage_url = webpage_url
+        self.url = url
+        self.duration = duration
+        self.acodec = intern_string(acodec)
+        self.source = intern_string(source)
+        self.temp_file = temp_file
+        self.lazy = lazy
+        self.failed = failed
+        self.query = query
+        self.requested_by = requested_by
+        self.spotify_info = spotify_info
+
+    def __setitem__(self, key, value):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def update(self, other):
+        """Copy fields from another track or dict, like dict.update"""
+        for key, value in other.items():
+            if key in self.KEYS:
+                self[key] = value
+
+    @property
+    def webpage_url(self):
+        url = self._webpage_url
+        if url is None or len(url) != 11 or '/' in url:
+            return url
+        return YOUTUBE_WATCH_URL + url
+
+    @webpage_url.setter
+    def webpage_url(self, url):
+        # Canonical watch URLs are stored as the 11 character video ID
+        if url and url.startswith(YOUTUBE_WATCH_URL) and len(url) == len(YOUTUBE_WATCH_URL) + 11:
+            url = url[len(YOUTUBE_WATCH_URL):]
+        self._webpage_url = url
+
+    @property
+    def url(self):
+        # Flat playlist entries have no stream yet and play from their watch URL
+        return self._url if self._url is not None else self.webpage_url
+
+    @url.setter
+    def url(self, url):
+        self._url = None if url == self.webpage_url else url
+
+    @property
+    def duration(self):
+        return format_duration(self.duration_seconds)
+
+    @duration.setter
+    def duration(self, duration):
+        self.duration_seconds = duration_seconds(duration)
+
+    @property
+    def spotify_info(self):
+        return self._spotify_info
+
+    @spotify_info.setter
+    def spotify_info(self, spotify_info):
+        self._spotify_info = SpotifyInfo.from_dict(spotify_info)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a track from a song dict, e.g. one loaded from a cache"""
+        if isinstance(data, cls):
+            return data
+        track = cls(data.get('title', 'Unknown'))
+        track.update(data)
+        return track
+
+    def to_dict(self):
+        """Get a plain, JSON-serializable dict with the duration in seconds"""
+        data = dict(self.items())
+        data['duration'] = self.duration_seconds
+        if self.spotify_info:
+            data['spotify_info'] = self.spotify_info.to_dict()
+        return data
@@ -0,0 +1,243 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import aiohttp
+from library import read_tags
+
+logger = logging.getLogger(__name__)
+
+# Formats ffmpeg plays that Discord users commonly upload
+UPLOAD_EXTENSIONS = ('.mp3', '.flac', '.ogg', '.opus', '.wav', '.m4a', '.aac', '.webm')
+
+def ffprobe_duration(path):
+    """Get a file's duration in seconds from ffprobe, or 0 if it is unavailable"""
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'json', path],
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=30
+        )
+        return round(float(json.loads(result.stdout or b'{}').get('format', {}).get('duration') or 0))
+    except (OSError, ValueError, subprocess.TimeoutExpired):
+        return 0
+
+def probe_file(path, file_size):
+    """Read tags and duration from a stored upload, dropping the fallbacks read_tags takes from its path"""
+    tags = read_tags(path, file_size)
+    if tags.get('title') == os.path.splitext(os.path.basename(path))[0]:
+        tags.pop('title')
+        tags.pop('artist', None)
+    if tags.get('album') == os.path.basename(os.path.dirname(path)):
+        tags.pop('album')
+    if not tags.get('duration'):
+        # Formats the tag readers do not cover (WAV, AAC, WebM) still get a length from ffprobe
+        tags['duration'] = ffprobe_duration(path)
+    return tags
+
+
+class UploadStore:
+    """Content-addressed, size-bounded store for uploaded audio files.
+
+    Uploads are hashed while they stream to disk and kept as {sha256}{ext},
+    so the same file uploaded twice is stored once. Every queued or playing
+    entry holds a reference; files nobody references are evicted, least
+    recently used first, once the total size exceeds max_bytes. Like the
+    audio cache, the index is rebuilt on startup by scanning the directory.
+    Tags and durations are read on a small thread pool off the event loop.
+    """
+
+    def __init__(self, directory='cache/uploads', max_bytes=1024 ** 3, max_file_bytes=100 * 1024 ** 2,
+                 probe_workers=2):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.probe_pool = ThreadPoolExecutor(max_workers=probe_workers, thread_name_prefix='upload-probe')
+        self.session = None
+
+        self.entries = {}  # Digest -> {'path', 'size', 'refs', 'tags'}
+        self.paths = {}  # Path -> digest
+        self.idle = OrderedDict()  # Digests with no references, least recently used first
+        self.total_bytes = 0
+        self.pinned_bytes = 0  # Size of referenced files, which cannot be evicted
+
+        self.uploads = 0
+        self.deduplicated = 0
+        self.bytes_received = 0
+        self.evictions = 0
+        self.rejected = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.rebuild_index()
+
+    def rebuild_index(self):
+        """Rebuild the index from the files on disk, dropping partial uploads"""
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.part'):
+                os.remove(path)
+                continue
+            stat = os.stat(path)
+            files.append((stat.st_mtime, name, stat.st_size))
+
+        self.entries.clear()
+        self.paths.clear()
+        self.idle.clear()
+        self.total_bytes = 0
+        self.pinned_bytes = 0
+        for _, name, size in sorted(files):
+            self.register(os.path.splitext(name)[0], os.path.join(self.directory, name), size)
+
+        logger.info(f"Upload store index rebuilt: {len(self.entries)} files, {self.total_bytes / 1024 ** 2:.1f} MiB")
+        self.evict()
+
+    def register(self, digest, path, size, tags=None):
+        """Add a stored file to the index, unreferenced"""
+        self.entries[digest] = {'path': path, 'size': size, 'refs': 0, 'tags': tags}
+        self.paths[path] = digest
+        self.idle[digest] = True
+        self.total_bytes += size
+
+    def accepts(self, filename):
+        """Check whether a file name has a supported audio extension"""
+        return os.path.splitext(filename)[1].lower() in UPLOAD_EXTENSIONS
+
+    async def get_session(self):
+        """Get the shared HTTP session, creating it inside the running loop"""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession()
+        return self.session
+
+    async def save(self, url, filename, size=None):
+        """Stream an upload into the store and take a reference to it; returns (path, tags)"""
+        if size is not None:
+            if size > self.max_file_bytes:
+                self.rejected += 1
+                raise ValueError(f"Files larger than {self.max_file_bytes // 1024 ** 2} MiB are not accepted")
+            if self.pinned_bytes + size > self.max_bytes:
+                self.rejected += 1
+                raise ValueError("Upload storage is full, try again once the queued uploads have played")
+
+        hasher = hashlib.sha256()
+        temp_path = os.path.join(self.directory, f"{uuid.uuid4().hex}.part")
+        received = 0
+        try:
+            session = await self.get_session()
+            async with session.get(url) as response:
+                response.raise_for_status()
+                with open(temp_path, 'wb') as f:
+                    async for chunk in response.content.iter_chunked(64 * 1024):
+                        received += len(chunk)
+                        if received > self.max_file_bytes:
+                            self.rejected += 1
+                            raise ValueError(f"Files larger than {self.max_file_bytes // 1024 ** 2} MiB are not accepted")
+                        hasher.update(chunk)
+                        f.write(chunk)
+
+            digest = hasher.hexdigest()
+            self.uploads += 1
+            self.bytes_received += received
+            entry = self.entries.get(digest)
+            if entry and os.path.exists(entry['path']):
+                self.deduplicated += 1
+            else:
+                if entry:
+                    self.discard(digest)
+                path = os.path.join(self.directory, digest + os.path.splitext(filename)[1].lower())
+                os.replace(temp_path, path)
+                self.register(digest, path, received)
+                entry = self.entries[digest]
+            # Referenced before probing, so an eviction while we wait cannot remove it
+            self.acquire(entry['path'])
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        if entry['tags'] is None:
+            loop = asyncio.get_running_loop()
+            entry['tags'] = await loop.run_in_executor(self.probe_pool, probe_file, entry['path'], entry['size'])
+        self.evict()
+        return entry['path'], entry['tags']
+
+    def contains(self, path):
+        """Check whether a path belongs to the store"""
+        return path in self.paths
+
+    def acquire(self, path):
+        """Take a reference to a stored file; returns False if it is gone"""
+        digest = self.paths.get(path)
+        if digest is None or not os.path.exists(path):
+            if digest is not None:
+                self.discard(digest)
+            return False
+        entry = self.entries[digest]
+        if not entry['refs']:
+            self.idle.pop(digest, None)
+            self.pinned_bytes += entry['size']
+        entry['refs'] += 1
+        return True
+
+    def release(self, path):
+        """Drop a reference to a stored file, making it evictable once nothing uses it"""
+        digest = self.paths.get(path)
+        if digest is None:
+            return
+        entry = self.entries[digest]
+        entry['refs'] = max(0, entry['refs'] - 1)
+        if entry['refs']:
+            return
+        self.pinned_bytes -= entry['size']
+        self.idle[digest] = True
+        try:
+            os.utime(path)  # Keeps the recency order for the next rebuild
+        except OSError:
+            pass
+        self.evict()
+
+    def evict(self):
+        """Remove unreferenced files until the total size is within max_bytes"""
+        while self.total_bytes > self.max_bytes and self.idle:
+            digest, _ = self.idle.popitem(last=False)
+            self.discard(digest)
+            self.evictions += 1
+
+    def discard(self, digest):
+        """Drop a file from the store"""
+        entry = self.entries.pop(digest, None)
+        if entry is None:
+            return
+        self.paths.pop(entry['path'], None)
+        self.idle.pop(digest, None)
+        self.total_bytes -= entry['size']
+        if entry['refs']:
+            self.pinned_bytes -= entry['size']
+        try:
+            os.remove(entry['path'])
+        except FileNotFoundError:
+            pass
+
+    async def close(self):
+        """Close the HTTP session and the probe pool"""
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.probe_pool.shutdown(wait=False)
+
+    def stats(self):
+        """Get the size of the store and how much deduplication saved"""
+        return {
+            'files': len(self.entries),
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'referenced': len(self.entries) - len(self.idle),
+            'pinned_bytes': self.pinned_bytes,
+            'uploads': self.uploads,
+            'deduplicated': self.deduplicated,
+            'bytes_received': self.bytes_received,
+            'evictions': self.evictions,
+            'rejected': self.rejected
+        }
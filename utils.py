@@ -21,7 +21,7 @@ def is_url(string):
 
 def is_youtube_url(url):
     """Check if URL is a YouTube URL"""
-    youtube_domains = ['youtube.com', 'youtu.be', 'www.youtube.com', 'www.youtu.be']
+    youtube_domains = ['youtube.com', 'youtu.be', 'www.youtube.com', 'www.youtu.be', 'm.youtube.com', 'music.youtube.com']
     try:
         parsed = urlparse(url)
         return parsed.netloc.lower() in youtube_domains
@@ -39,9 +39,8 @@ def extract_video_id(url):
     
     # Handle different YouTube URL formats
     patterns = [
-        r'(?:youtube\.com\/watch\?v=|youtu\.be\/)([a-zA-Z0-9_-]{11})',
-        r'youtube\.com\/embed\/([a-zA-Z0-9_-]{11})',
-        r'youtube\.com\/v\/([a-zA-Z0-9_-]{11})'
+        r'(?:youtube\.com\/watch\?(?:[^#]*&)?v=|youtu\.be\/)([a-zA-Z0-9_-]{11})(?![a-zA-Z0-9_-])',
+        r'youtube\.com\/(?:embed|v|shorts|live)\/([a-zA-Z0-9_-]{11})(?![a-zA-Z0-9_-])'
     ]
     
     for pattern in patterns:
@@ -1,7 +1,9 @@
 import discord
-import yt_dlp
 import asyncio
 import logging
+from extraction_scheduler import ExtractionScheduler, PRIORITY_STREAM
+from ytdl_pool import extract_source
+from ffmpeg_supervisor import SupervisedPCMAudio, get_supervisor
 
 # Test audio streaming with a minimal working implementation
 logger = logging.getLogger(__name__)
@@ -14,52 +16,33 @@ class WorkingAudioSource(discord.PCMVolumeTransformer):
         self.url = data.get('url')
 
     @classmethod
-    async def from_url(cls, url, *, loop=None, stream=False):
-        loop = loop or asyncio.get_event_loop()
-        
-        ytdl_format_options = {
-            'format': 'bestaudio/best',
-            'outtmpl': '%(extractor)s-%(id)s-%(title)s.%(ext)s',
-            'restrictfilenames': True,
-            'noplaylist': True,
-            'nocheckcertificate': True,
-            'ignoreerrors': False,
-            'logtostderr': False,
-            'quiet': True,
-            'no_warnings': True,
-            'default_search': 'auto',
-            'source_address': '0.0.0.0'
-        }
-
+    async def from_url(cls, url, *, scheduler, stream=False, guild_id=None):
         ffmpeg_options = {
             'before_options': '-nostdin',
             'options': '-vn'
         }
 
-        ytdl = yt_dlp.YoutubeDL(ytdl_format_options)
-
         try:
-            data = await loop.run_in_executor(None, lambda: ytdl.extract_info(url, download=not stream))
+            data, filename = await scheduler.run(
+                extract_source, 'stream', url, not stream, priority=PRIORITY_STREAM, guild_id=guild_id
+            )
         except Exception as e:
             logger.error(f"Error extracting info: {e}")
             raise
-
-        if 'entries' in data:
-            # take first item from a playlist
-            data = data['entries'][0]
-
-        filename = data['url'] if stream else ytdl.prepare_filename(data)
-        return cls(discord.FFmpegPCMAudio(filename, **ffmpeg_options), data=data)
+        return await get_supervisor().open(lambda: cls(SupervisedPCMAudio(filename, **ffmpeg_options), data=data))
 
 # Test function
 async def test_audio_creation(url):
+    scheduler = ExtractionScheduler(workers=1)
     try:
-        player = await WorkingAudioSource.from_url(url, stream=True)
+        player = await WorkingAudioSource.from_url(url, scheduler=scheduler, stream=True)
         print(f"Successfully created audio source for: {player.title}")
         return player
     except Exception as e:
         print(f"Failed to create audio source: {e}")
         return None
+    finally:
+        scheduler.shutdown()
 
 if __name__ == "__main__":
     # Test with a simple URL
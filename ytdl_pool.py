@@ -0,0 +1,160 @@
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+import yt_dlp
+
+logger = logging.getLogger(__name__)
+
+# Shared yt-dlp configuration for better compatibility
+BASE_OPTIONS = {
+    'format': 'bestaudio/best',
+    'restrictfilenames': True,
+    'noplaylist': True,
+    'nocheckcertificate': True,
+    'ignoreerrors': False,
+    'logtostderr': False,
+    'quiet': True,
+    'no_warnings': True,
+    'source_address': '0.0.0.0'
+}
+
+# Option profiles: each pooled instance is built for exactly one of these
+PROFILES = {
+    'search': {**BASE_OPTIONS, 'default_search': 'ytsearch'},
+    'stream': {
+        **BASE_OPTIONS,
+        'default_search': 'auto',
+        'outtmpl': '%(extractor)s-%(id)s-%(title)s.%(ext)s'
+    },
+    'playlist': {**BASE_OPTIONS, 'default_search': 'ytsearch', 'extract_flat': True}
+}
+
+class YTDLPool:
+    """Process-wide pool of pre-built YoutubeDL instances, one set per option profile"""
+
+    def __init__(self, size=4, profiles=None):
+        self.size = max(1, size)
+        self.profiles = profiles or PROFILES
+        self.idle = {name: queue.LifoQueue() for name in self.profiles}
+        self.created = {name: 0 for name in self.profiles}
+        self.lock = threading.Lock()
+
+        self.checkouts = 0
+        self.build_time = 0.0
+        self.wait_time = 0.0
+
+    def build(self, profile):
+        """Construct a new YoutubeDL instance for a profile"""
+        start = time.perf_counter()
+        ytdl = yt_dlp.YoutubeDL(dict(self.profiles[profile]))
+        self.build_time += time.perf_counter() - start
+        return ytdl
+
+    def warm(self, profiles=None):
+        """Pre-build instances so the first jobs do not pay for construction"""
+        for profile in profiles or self.profiles:
+            while True:
+                with self.lock:
+                    if self.created[profile] >= self.size:
+                        break
+                    self.created[profile] += 1
+                self.idle[profile].put(self.build(profile))
+
+    def acquire(self, profile):
+        """Take an instance for a profile, building one if the pool is not full yet"""
+        if profile not in self.profiles:
+            raise ValueError(f"Unknown yt-dlp profile '{profile}'")
+
+        start = time.perf_counter()
+        try:
+            return self.idle[profile].get_nowait()
+        except queue.Empty:
+            pass
+
+        with self.lock:
+            can_build = self.created[profile] < self.size
+            if can_build:
+                self.created[profile] += 1
+        if can_build:
+            return self.build(profile)
+
+        ytdl = self.idle[profile].get()
+        self.wait_time += time.perf_counter() - start
+        return ytdl
+
+    def release(self, profile, ytdl):
+        """Return an instance to the pool"""
+        self.idle[profile].put(ytdl)
+
+    @contextmanager
+    def checkout(self, profile):
+        """Borrow an instance for the duration of one job"""
+        ytdl = self.acquire(profile)
+        self.checkouts += 1
+        try:
+            yield ytdl
+        finally:
+            self.release(profile, ytdl)
+
+    def extract_info(self, profile, query, download=False):
+        """Run extract_info on a pooled instance"""
+        with self.checkout(profile) as ytdl:
+            return ytdl.extract_info(query, download=download)
+
+    def extract_source(self, profile, query, download=False):
+        """Extract the first playable entry and its media location (stream URL or downloaded file)"""
+        with self.checkout(profile) as ytdl:
+            data = ytdl.extract_info(query, download=download)
+            if 'entries' in data:
+                data = data['entries'][0]
+            return data, ytdl.prepare_filename(data) if download else data['url']
+
+    def stats(self):
+        """Get instance counts and setup cost for the pool"""
+        return {
+            'size': self.size,
+            'instances': sum(self.created.values()),
+            'checkouts': self.checkouts,
+            'build_time': self.build_time,
+            'wait_time': self.wait_time
+        }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def configure_pool(size=4, warm=False):
+    """Create the process-wide pool, sized to the extraction worker count"""
+    global _pool
+    with _pool_lock:
+        _pool = YTDLPool(size=size)
+    if warm:
+        _pool.warm()
+    return _pool
+
+def get_pool():
+    """Get the process-wide pool, creating a default one on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = YTDLPool()
+    return _pool
+
+def extract_info(profile, query, download=False):
+    """Extract with the process-wide pool.
+
+    This is a module-level function so process-based extraction workers can
+    pickle it; each worker process then keeps its own pool.
+    """
+    return get_pool().extract_info(profile, query, download)
+
+def extract_source(profile, query, download=False):
+    """Extract a playable entry with the process-wide pool; returns (data, filename).
+
+    The instance is checked out inside the job, so a busy pool makes the
+    worker wait rather than the event loop.
+    """
+    return get_pool().extract_source(profile, query, download)